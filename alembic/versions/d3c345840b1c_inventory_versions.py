@@ -0,0 +1,45 @@
+"""Inventory and item versions for delta syncs
+
+Revision ID: d3c345840b1c
+Revises: c8ba7c7e553e
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3c345840b1c"
+down_revision: Union[str, None] = "c8ba7c7e553e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows start at version 0, which every client has already seen
+    op.add_column(
+        "inventories",
+        sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "items",
+        sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_index(
+        "ix_items_inventory_id_version",
+        "items",
+        ["inventory_id", "version"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_items_inventory_id_version", table_name="items")
+    op.drop_column("items", "version")
+    op.drop_column("inventories", "version")
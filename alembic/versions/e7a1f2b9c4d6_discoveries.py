@@ -0,0 +1,35 @@
+"""Compact per-user discovered recipe ids
+
+Revision ID: e7a1f2b9c4d6
+Revises: d3c345840b1c
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a1f2b9c4d6"
+down_revision: Union[str, None] = "d3c345840b1c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows are built from `progress` on a user's first load, no backfill needed
+    op.create_table(
+        "discoveries",
+        sa.Column("user_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("recipe_ids", sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("discoveries")
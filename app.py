@@ -15,6 +15,7 @@ from src.containers import create_container, init_service, init_service_and_regi
 from src.now_the_game.game.game_registry import get_game_registry
 from src.now_the_game.telegram.telegram_registry import get_telegram_registry
 from src.shared.config import shared_config
+from src.shared.observability.http_metrics import HTTPMetricsMiddleware
 from src.shared.observability.utils import with_observability
 
 logger = logging.getLogger("deus-vult.main-app-component")
@@ -90,6 +91,8 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
             get_game_registry(),
             telegram_object.start(),
             container.elements_service().init_elements(),
+            container.recipes_service().load_graph(),
+            container.model_object().warmup(),
         ]
 
         async_tasks = [
@@ -104,12 +107,27 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
         logger.exception("Error initializing services")
         raise e
 
+    counter_aggregator = container.counter_aggregator()
+    counter_aggregator.start()
+
     async with with_observability():
         logger.info("Application initialized")
         yield
 
-    # Shutdown events
-    logger.info("Shutting down the application")
+        # Shutdown events
+        logger.info("Shutting down the application")
+        # --- Pending counters must land before the pool is closed ---
+        try:
+            await counter_aggregator.shutdown()
+        except Exception:
+            logger.exception("Error flushing counters")
+
+    # --- LLM Clients Shutdown ---
+    try:
+        await container.model_object().close()
+    except Exception:
+        logger.exception("Error closing LLM clients")
+
     # --- Database Shutdown ---
     try:
         await db_instance.close()
@@ -141,8 +159,11 @@ app.add_middleware(
         "If-None-Match",
         "Vary",
         "CDN-Cache-Control",
+        "Server-Timing",
     ],
 )
+# Added last, so it wraps CORS and measures the whole request
+app.add_middleware(HTTPMetricsMiddleware)
 
 app.include_router(api_router)
 
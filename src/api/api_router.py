@@ -3,11 +3,13 @@ import logging
 from fastapi import APIRouter
 
 from src.api.craft.craft_router import craft_router
+from src.api.inventory.inventory_router import inventory_router
+from src.api.profiles.profiles_router import profiles_router
 from src.api.users.users_router import users_router
 
 logger = logging.getLogger("deus-vult.api")
 
-imported_routers = [craft_router, users_router]
+imported_routers = [craft_router, inventory_router, profiles_router, users_router]
 
 api_router = APIRouter(prefix="/api")
 
@@ -1 +1,9 @@
 CHANCE_FOR_REPEAT_ELEMENT = 0.3
+
+# --- Pagination ---
+DEFAULT_RECIPES_PAGE = 100
+MAX_RECIPES_PAGE = 500
+
+# --- Crafting ---
+MAX_CRAFT_QUANTITY = 1000
+MAX_BULK_CRAFT_RECIPES = 100
@@ -2,23 +2,34 @@ import logging
 from typing import Annotated
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
 from src import Container
 from src.api.core.dependencies import get_user
+from src.api.craft.craft_constants import DEFAULT_RECIPES_PAGE, MAX_RECIPES_PAGE
 from src.api.craft.elements.elements_schemas import (
+    BulkCraftRequest,
+    BulkCraftResponse,
     CraftFromRecipeRequest,
     CraftRequest,
+    Element,
+    ElementCatalogResponse,
     ElementResponse,
 )
 from src.api.craft.elements.elements_service import ElementsService
 from src.api.craft.progress.progress_service import ProgressService
+from src.api.craft.recipes.recipes_graph import RecipeGraph
 from src.api.craft.recipes.recipes_schemas import (
+    CompactRecipesListResponse,
+    CraftableRecipesResponse,
     RecipesListResponse,
     RecipeWithElementsPublic,
 )
+from src.api.craft.recipes.recipes_service import RecipesService
+from src.api.inventory.inventory_schemas import InventoryItemTable
 from src.api.users.users_schemas import UserTable
 from src.shared.observability.traces import async_traced_function
+from src.shared.uow import UnitOfWork
 
 logger = logging.getLogger("deus-vult.api.craft")
 
@@ -59,11 +70,31 @@ async def combine_elements(
     return result
 
 
+@craft_router.get(
+    "/elements/catalog",
+    name="Elements by ids",
+    tags=["Elements"],
+    response_model=ElementCatalogResponse,
+)
+@async_traced_function
+@inject
+async def elements_catalog(
+    elements_service: Annotated[
+        ElementsService, Depends(Provide[Container.elements_service])
+    ],
+    ids: Annotated[list[int], Query(min_length=1, max_length=500)],
+) -> ElementCatalogResponse:
+    """
+    Resolves element ids, e.g. from an inventory snapshot, to names and emojis.
+    """
+    return await elements_service.get_catalog(ids)
+
+
 @craft_router.get(
     "/recipes/all",
     name="All open recipes by user",
     tags=["Elements"],
-    response_model=RecipesListResponse,
+    response_model=RecipesListResponse | CompactRecipesListResponse,
 )
 @async_traced_function
 @inject
@@ -72,13 +103,98 @@ async def open_recipes(
     progress_service: Annotated[
         ProgressService, Depends(Provide[Container.progress_service])
     ],
-) -> RecipesListResponse:
-    recipes = await progress_service.get_open_recipies(user)
+    uow: Annotated[UnitOfWork, Depends(Provide[Container.uow_factory])],
+    after_recipe_id: Annotated[int | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_RECIPES_PAGE)] = DEFAULT_RECIPES_PAGE,
+    compact: bool = False,
+) -> RecipesListResponse | CompactRecipesListResponse:
+    """
+    Lists discovered recipes by ascending id. Pass the returned
+    `next_after_recipe_id` as `after_recipe_id` to get the next page.
+    `compact` returns element ids only, see `/elements/catalog`.
+    """
+    async with uow.start(readonly=True):
+        # One extra row tells whether there is a next page
+        rows = await progress_service.get_open_recipes_page(
+            user, after_recipe_id, limit + 1, compact
+        )
+
+    next_after_recipe_id = rows[limit - 1].object_id if len(rows) > limit else None
+    rows = rows[:limit]
+
+    if compact:
+        return CompactRecipesListResponse(
+            recipes=[
+                (row.object_id, row.element_a_id, row.element_b_id, row.result_id)
+                for row in rows
+            ],
+            next_after_recipe_id=next_after_recipe_id,
+        )
+
+    # Elements were validated on insert, so rows skip re-validation
     return RecipesListResponse(
         recipes=[
-            RecipeWithElementsPublic.model_validate(recipe, from_attributes=True)
-            for recipe in recipes
+            RecipeWithElementsPublic(
+                object_id=row.object_id,
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+                element_a_id=row.element_a_id,
+                element_b_id=row.element_b_id,
+                result_id=row.result_id,
+                resources_cost=row.resources_cost,
+                discovered_count=row.discovered_count,
+                element_a=Element.model_construct(
+                    name=row.element_a_name, emoji=row.element_a_emoji
+                ),
+                element_b=Element.model_construct(
+                    name=row.element_b_name, emoji=row.element_b_emoji
+                ),
+                result=Element.model_construct(
+                    name=row.result_name, emoji=row.result_emoji
+                ),
+            )
+            for row in rows
         ],
+        next_after_recipe_id=next_after_recipe_id,
+    )
+
+
+@craft_router.get(
+    "/recipes/craftable",
+    name="Recipes craftable from the inventory",
+    tags=["Elements"],
+    response_model=CraftableRecipesResponse,
+)
+@async_traced_function
+@inject
+async def craftable_recipes(
+    user: Annotated[UserTable, Depends(get_user)],
+    progress_service: Annotated[
+        ProgressService, Depends(Provide[Container.progress_service])
+    ],
+    recipes_service: Annotated[
+        RecipesService, Depends(Provide[Container.recipes_service])
+    ],
+    recipe_graph: Annotated[RecipeGraph, Depends(Provide[Container.recipe_graph])],
+) -> CraftableRecipesResponse:
+    """
+    Discovered recipes the user can craft right now, with how many times.
+    """
+    # Usually served from the in-process discovery cache
+    recipe_ids = await progress_service.get_discovered_recipe_ids(user)
+    await recipes_service.load_missing(recipe_ids)
+
+    inventory = {
+        item.sub_type_id: item.amount
+        for item in user.inventory.items
+        if item.type == InventoryItemTable.ItemType.ELEMENT
+    }
+    return CraftableRecipesResponse(
+        recipes=[
+            (recipe_id, count)
+            for recipe_id, count in recipe_graph.max_crafts(recipe_ids, inventory)
+            if count > 0
+        ]
     )
 
 
@@ -97,4 +213,30 @@ async def craft_from_recipe(
     ],
     craft_request: CraftFromRecipeRequest,
 ) -> ElementResponse:
-    return await elements_service.craft_from_recipe(user, craft_request.recipe_id)
+    return await elements_service.craft_from_recipe(
+        user, craft_request.recipe_id, craft_request.quantity
+    )
+
+
+@craft_router.post(
+    "/recipes/craft/bulk",
+    name="Craft from several recipes",
+    tags=["Elements"],
+    response_model=BulkCraftResponse,
+)
+@async_traced_function
+@inject
+async def craft_from_recipes(
+    user: Annotated[UserTable, Depends(get_user)],
+    elements_service: Annotated[
+        ElementsService, Depends(Provide[Container.elements_service])
+    ],
+    craft_request: BulkCraftRequest,
+) -> BulkCraftResponse:
+    """
+    Crafts every `(recipe_id, quantity)` pair in one transaction; nothing is
+    crafted if the inventory cannot cover the combined cost.
+    """
+    return BulkCraftResponse(
+        elements=await elements_service.craft_from_recipes(user, craft_request.recipes)
+    )
@@ -15,6 +15,7 @@ from src.api.craft.elements.elements_prompts import (
 from src.api.craft.elements.elements_schemas import Element, ElementInput, ElementOutput
 from src.shared.base import BaseService
 from src.shared.base_llm import VertexLLM
+from src.shared.observability.timing import timed
 from src.shared.observability.traces import async_traced_function
 
 logger = logging.getLogger("deus-vult.api.craft")
@@ -50,7 +51,8 @@ class ElementsAgent(BaseService):
 
             {input_string}
             """
-            response = await self.agent_object.run(query_string)
+            with timed("llm"):
+                response = await self.agent_object.run(query_string)
             return_value = response.data
 
             logger.debug("Elements combination agent response: %s", return_value)
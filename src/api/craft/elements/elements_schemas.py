@@ -5,6 +5,7 @@ import emoji
 from pydantic import BaseModel, field_validator
 from sqlmodel import Field, Relationship
 
+from src.api.craft.craft_constants import MAX_BULK_CRAFT_RECIPES, MAX_CRAFT_QUANTITY
 from src.api.craft.recipes.recipes_schemas import (
     RecipePublic,
     RecipeTable,
@@ -60,6 +61,7 @@ class ElementResponse(BaseModel):
         description="Whether the element was discovered by this user before"
     )
     is_new: bool = Field(description="Whether the element was discovered before")
+    quantity: int = Field(default=1, description="How many elements were crafted")
 
 
 class CraftRequest(BaseModel):
@@ -71,6 +73,37 @@ class CraftFromRecipeRequest(BaseModel):
     recipe_id: int = Field(
         description="The id of the recipe that should be used for craft"
     )
+    quantity: int = Field(
+        default=1, ge=1, le=MAX_CRAFT_QUANTITY, description="How many times to craft"
+    )
+
+
+class BulkCraftRequest(BaseModel):
+    recipes: list[tuple[int, int]] = Field(
+        min_length=1,
+        max_length=MAX_BULK_CRAFT_RECIPES,
+        description="`(recipe_id, quantity)` pairs crafted in one transaction",
+    )
+
+    # noinspection PyNestedDecorators
+    @field_validator("recipes")
+    @classmethod
+    def validate_quantities(cls, v: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        if any(quantity < 1 for _, quantity in v):
+            raise ValueError("Quantities must be positive")
+        if sum(quantity for _, quantity in v) > MAX_CRAFT_QUANTITY:
+            raise ValueError(f"Cannot craft more than {MAX_CRAFT_QUANTITY} at once")
+        return v
+
+
+class BulkCraftResponse(BaseModel):
+    elements: list[ElementResponse]
+
+
+class ElementCatalogResponse(BaseModel):
+    elements: list[tuple[int, str, str]] = Field(
+        description="`(object_id, name, emoji)` for every requested element"
+    )
 
 
 """
@@ -1,15 +1,18 @@
 import asyncio
+import collections
 import logging
+from collections.abc import Iterable
 
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from sqlmodel import col, select
 
 from src.api.craft.elements.elements_agent import ElementsAgent
 from src.api.craft.elements.elements_constants import INIT_ELEMENTS, VOID
 from src.api.craft.elements.elements_exceptions import NoRecipeExistsException
 from src.api.craft.elements.elements_schemas import (
     Element,
+    ElementCatalogResponse,
     ElementInput,
     ElementResponse,
     ElementTable,
@@ -17,7 +20,8 @@ from src.api.craft.elements.elements_schemas import (
 from src.api.craft.progress.progress_service import ProgressService
 from src.api.craft.recipes.recipes_schemas import RecipePublic
 from src.api.craft.recipes.recipes_service import RecipesService
-from src.api.inventory.inventory_schemas import InventoryItemTable
+from src.api.inventory.inventory_exceptions import InventoryNotEnoughItemsException
+from src.api.inventory.inventory_schemas import InventoryItemTable, LockMode
 from src.api.users.users_schemas import UserTable
 from src.shared.base import BaseService
 from src.shared.observability.traces import async_traced_function
@@ -53,45 +57,95 @@ class ElementsService(BaseService):
                 )
                 await session.execute(stmt)
 
+    @async_traced_function
+    async def get_catalog(self, element_ids: list[int]) -> ElementCatalogResponse:
+        async with self.uow.start(readonly=True) as uow:
+            session = await uow.get_session()
+
+            stmt = (
+                select(ElementTable.object_id, ElementTable.name, ElementTable.emoji)
+                .where(col(ElementTable.object_id).in_(element_ids))
+                .order_by(col(ElementTable.object_id))
+            )
+            rows = (await session.execute(stmt)).all()
+
+        return ElementCatalogResponse(elements=[tuple(row) for row in rows])
+
     @async_traced_function
     async def craft_from_recipe(
-        self, user: UserTable, recipe_id: int
+        self, user: UserTable, recipe_id: int, quantity: int = 1
     ) -> ElementResponse:
-        recipe = await self.recipes_service.get_recipe(recipe_id)
-        if (
-            recipe is None
-            or recipe.result is None
-            or not await self.progress_service.is_discovered_recipe(user, recipe)
-        ):
-            raise NoRecipeExistsException(f"Recipe with id {recipe_id} is not found")
-
-        base_items = []
-        for base_item_id, amount in recipe.resources_cost.items():
-            base_items.append(
+        (response,) = await self.craft_from_recipes(user, [(recipe_id, quantity)])
+        return response
+
+    @async_traced_function
+    async def craft_from_recipes(
+        self, user: UserTable, orders: Iterable[tuple[int, int]]
+    ) -> list[ElementResponse]:
+        """
+        Crafts `(recipe_id, quantity)` orders at once: recipes and discovery are
+        checked with one query each and the summed cost is applied as a single
+        inventory transfer.
+        """
+        quantities: collections.Counter[int] = collections.Counter()
+        for recipe_id, quantity in orders:
+            quantities[recipe_id] += quantity
+
+        recipes = {
+            recipe.object_id: recipe
+            for recipe in await self.recipes_service.get_recipes(quantities.keys())
+        }
+        discovered = await self.progress_service.filter_discovered(user, recipes.keys())
+        for recipe_id in quantities:
+            recipe = recipes.get(recipe_id)
+            if recipe is None or recipe.result is None or recipe_id not in discovered:
+                raise NoRecipeExistsException(
+                    f"Recipe with id {recipe_id} is not found"
+                )
+
+        cost: collections.Counter[int] = collections.Counter()
+        produced: collections.Counter[int] = collections.Counter()
+        for recipe_id, quantity in quantities.items():
+            recipe = recipes[recipe_id]
+            for base_item_id, amount in recipe.resources_cost.items():
+                cost[int(base_item_id)] += int(amount) * quantity
+            produced[recipe.result_id] += quantity
+
+        await user.inventory.transfer(
+            consume=[
                 InventoryItemTable(
                     type=InventoryItemTable.ItemType.ELEMENT,
-                    sub_type_id=int(base_item_id),
-                    amount=int(amount),
-                ),
-            )
-
-        await user.inventory.remove_items(*base_items)
-        await user.inventory.add_items(
-            InventoryItemTable(
-                type=InventoryItemTable.ItemType.ELEMENT,
-                sub_type_id=recipe.result.object_id,
-                amount=1,
-            ),
+                    sub_type_id=element_id,
+                    amount=amount,
+                )
+                for element_id, amount in cost.items()
+            ],
+            produce=[
+                InventoryItemTable(
+                    type=InventoryItemTable.ItemType.ELEMENT,
+                    sub_type_id=element_id,
+                    amount=amount,
+                )
+                for element_id, amount in produced.items()
+            ],
+            # Crafts are interactive: retry briefly rather than queue on a lock
+            lock=LockMode.NOWAIT,
         )
 
-        return ElementResponse(
-            object_id=recipe.result.object_id,
-            name=recipe.result.name,
-            emoji=recipe.result.emoji,
-            recipe=RecipePublic.model_validate(recipe, from_attributes=True),
-            is_first_discovered=False,
-            is_new=False,
-        )
+        return [
+            ElementResponse(
+                object_id=recipes[recipe_id].result.object_id,
+                name=recipes[recipe_id].result.name,
+                emoji=recipes[recipe_id].result.emoji,
+                recipe=RecipePublic.model_validate(
+                    recipes[recipe_id], from_attributes=True
+                ),
+                is_first_discovered=False,
+                is_new=False,
+                quantity=quantity,
+            )
+            for recipe_id, quantity in quantities.items()
+        ]
 
     @async_traced_function
     async def combine_elements(
@@ -104,18 +158,18 @@ class ElementsService(BaseService):
         uow = current_uow.get()
         session = await uow.get_session()
 
-        await user.inventory.remove_items(
-            InventoryItemTable(
-                type=InventoryItemTable.ItemType.ELEMENT,
-                sub_type_id=element_a_id,
-                amount=1,
-            ),
+        ingredients = [
             InventoryItemTable(
                 type=InventoryItemTable.ItemType.ELEMENT,
-                sub_type_id=element_b_id,
+                sub_type_id=element_id,
                 amount=1,
-            ),
-        )
+            )
+            for element_id in (element_a_id, element_b_id)
+        ]
+        # Checked without locking: the inventory is only locked by the final
+        # transfer, never across the LLM call, and that transfer checks again
+        if not user.inventory.holds(*ingredients):
+            raise InventoryNotEnoughItemsException("Not enough items to combine.")
 
         element_a, element_b = await asyncio.gather(
             session.get_one(ElementTable, element_a_id),
@@ -156,11 +210,15 @@ class ElementsService(BaseService):
         if recipe.result_id == VOID.object_id:
             raise NoRecipeExistsException("No recipe to combine.")
 
-        await user.inventory.add_items(
-            InventoryItemTable(
-                type=InventoryItemTable.ItemType.ELEMENT,
-                sub_type_id=recipe.result.object_id,
-            )
+        await user.inventory.transfer(
+            consume=ingredients,
+            produce=[
+                InventoryItemTable(
+                    type=InventoryItemTable.ItemType.ELEMENT,
+                    sub_type_id=recipe.result.object_id,
+                )
+            ],
+            lock=LockMode.NOWAIT,
         )
 
         return ElementResponse(
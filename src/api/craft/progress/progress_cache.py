@@ -0,0 +1,79 @@
+"""
+Per-user sets of discovered recipe ids.
+
+A set is a sorted `array("q")`, so membership is a binary search over
+8 bytes per recipe, and it round-trips to the `discoveries.recipe_ids` bytea.
+"""
+
+import bisect
+import collections
+import sys
+import time
+from array import array
+from collections.abc import Iterable
+
+from src.shared.observability.metrics import MetricsStorage
+
+
+def encode_recipe_ids(recipe_ids: Iterable[int]) -> bytes:
+    ids = array("q", recipe_ids)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def decode_recipe_ids(data: bytes) -> array[int]:
+    """Decodes stored ids into a sorted, de-duplicated array."""
+    ids = array("q")
+    ids.frombytes(data)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return array("q", sorted(set(ids)))
+
+
+def contains(recipe_ids: array[int], recipe_id: int) -> bool:
+    index = bisect.bisect_left(recipe_ids, recipe_id)
+    return index < len(recipe_ids) and recipe_ids[index] == recipe_id
+
+
+class DiscoveryCache:
+    """In-process LRU of discovery sets with a TTL per entry."""
+
+    TTL = 300.0
+    MAX_USERS = 10_000
+
+    metrics = MetricsStorage("progress.discoveries")
+
+    def __init__(self) -> None:
+        self._entries: collections.OrderedDict[int, tuple[float, array[int]]] = (
+            collections.OrderedDict()
+        )
+
+    def get(self, user_id: int) -> array[int] | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(user_id, None)
+            self.metrics.increment("miss")
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.metrics.increment("hit")
+        return entry[1]
+
+    def put(self, user_id: int, recipe_ids: array[int]) -> None:
+        self._entries[user_id] = (time.monotonic() + self.TTL, recipe_ids)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.MAX_USERS:
+            self._entries.popitem(last=False)
+
+    def add(self, user_id: int, recipe_id: int) -> None:
+        """Adds a discovery to a cached set; uncached users load it later."""
+        entry = self._entries.get(user_id)
+        if entry is not None and not contains(entry[1], recipe_id):
+            bisect.insort(entry[1], recipe_id)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,7 +1,9 @@
-from sqlmodel import Field, Relationship
+from sqlalchemy import LargeBinary
+from sqlmodel import Column, Field, Relationship, SQLModel
 
 from src.api.craft.recipes.recipes_schemas import RecipeTable
 from src.shared.base import BaseSchema
+from src.shared.events import EventPayload
 
 """
 MODELS
@@ -22,3 +24,25 @@ class ProgressTable(BaseSchema, table=True):
             "lazy": "selectin",
         }
     )
+
+
+class DiscoveryTable(SQLModel, table=True):
+    """Compact copy of a user's `progress` recipe ids, loaded in one fetch."""
+
+    __tablename__ = "discoveries"  # type: ignore
+
+    user_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    # Little-endian int64 recipe ids, appended as discovered; readers sort them
+    recipe_ids: bytes = Field(
+        default=b"", sa_column=Column(LargeBinary, nullable=False)
+    )
+
+
+"""
+PAYLOADS
+"""
+
+
+class NewProgressPayload(EventPayload):
+    user_id: int
+    recipe_id: int
@@ -1,13 +1,35 @@
+import asyncio
+import functools
 import logging
+from array import array
+from collections.abc import Collection, Sequence
+from typing import Any
 
-from sqlmodel import col, select, update
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+from sqlmodel import col, select
 
+from src.api.craft.elements.elements_schemas import ElementTable
+from src.api.craft.progress.progress_cache import (
+    DiscoveryCache,
+    contains,
+    decode_recipe_ids,
+    encode_recipe_ids,
+)
 from src.api.craft.progress.progress_schemas import (
+    DiscoveryTable,
+    NewProgressPayload,
     ProgressTable,
 )
 from src.api.craft.recipes.recipes_schemas import RecipeTable
 from src.api.users.users_schemas import UserTable
 from src.shared.base import BaseService
+from src.shared.counters import CounterAggregator
+from src.shared.database import call_after_commit
+from src.shared.event_bus import EventBus
+from src.shared.event_registry import ProgressTopics
+from src.shared.events import Event
 from src.shared.observability.traces import async_traced_function
 from src.shared.uow import UnitOfWork, current_uow
 
@@ -15,61 +37,194 @@ logger = logging.getLogger("deus-vult.api.craft")
 
 
 class ProgressService(BaseService):
-    def __init__(self, uow: UnitOfWork) -> None:
+    def __init__(
+        self,
+        uow: UnitOfWork,
+        counters: CounterAggregator,
+        discoveries: DiscoveryCache,
+        event_bus: EventBus,
+    ) -> None:
         super().__init__()
         self.uow = uow
+        self.counters = counters
+        self.discoveries = discoveries
+        self.event_bus = event_bus
+        self._publish_tasks: set[asyncio.Task[None]] = set()
 
     @async_traced_function
-    async def is_discovered_recipe(self, user: UserTable, recipe: RecipeTable) -> bool:
+    async def get_discoveries(self, user: UserTable) -> array[int]:
+        """Sorted ids of the user's discovered recipes, cached in-process."""
+        if (recipe_ids := self.discoveries.get(user.object_id)) is not None:
+            return recipe_ids
+
         uow = current_uow.get()
         session = await uow.get_session()
 
-        stmt = select(
-            select(ProgressTable)
-            .where(
-                ProgressTable.object_id == user.object_id,
-                ProgressTable.recipe_id == recipe.object_id,
-            )
-            .exists()
+        stmt = select(DiscoveryTable.recipe_ids).where(
+            DiscoveryTable.user_id == user.object_id
         )
-        return bool((await session.execute(stmt)).scalar())
+        data = (await session.execute(stmt)).scalar_one_or_none()
+        if data is None:
+            # First load for this user, built once from the progress rows
+            progress_stmt = select(ProgressTable.recipe_id).where(
+                ProgressTable.object_id == user.object_id
+            )
+            data = encode_recipe_ids((await session.execute(progress_stmt)).scalars())
+            await session.execute(
+                insert(DiscoveryTable)
+                .values(user_id=user.object_id, recipe_ids=data)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+            )
+
+        recipe_ids = decode_recipe_ids(data)
+        self.discoveries.put(user.object_id, recipe_ids)
+        return recipe_ids
+
+    @async_traced_function
+    async def is_discovered_recipe(self, user: UserTable, recipe: RecipeTable) -> bool:
+        return bool(await self.filter_discovered(user, [recipe.object_id]))
 
     @async_traced_function
     async def discover_recipe(self, user: UserTable, recipe: RecipeTable) -> bool:
+        """Records the discovery, returns False if the user already had it."""
+        if contains(await self.get_discoveries(user), recipe.object_id):
+            return False
+
         uow = current_uow.get()
         session = await uow.get_session()
 
-        exits = await self.is_discovered_recipe(user, recipe)
-        if exits:
+        # The primary key decides, so concurrent discoveries count once
+        progress = ProgressTable(object_id=user.object_id, recipe_id=recipe.object_id)
+        inserted = (
+            await session.execute(
+                insert(ProgressTable)
+                .values(**progress.model_dump())
+                .on_conflict_do_nothing()
+                .returning(col(ProgressTable.recipe_id))
+            )
+        ).scalar_one_or_none()
+        if inserted is None:
+            self.discoveries.add(user.object_id, recipe.object_id)
             return False
 
-        session.add(
-            ProgressTable(
-                object_id=user.object_id,
-                recipe_id=recipe.object_id,
+        appended = insert(DiscoveryTable).values(
+            user_id=user.object_id, recipe_ids=encode_recipe_ids([recipe.object_id])
+        )
+        stored_ids = DiscoveryTable.__table__.c.recipe_ids  # type: ignore
+        await session.execute(
+            appended.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"recipe_ids": stored_ids.concat(appended.excluded.recipe_ids)},
             )
         )
 
-        async with self.uow.start() as inner_uow:
-            inner_session = await inner_uow.get_session()
-            inner_stmt = (
-                update(RecipeTable)
-                .where(
-                    col(RecipeTable.object_id) == recipe.object_id,
+        # Cached sets and counters only ever see committed discoveries
+        call_after_commit(
+            session, functools.partial(self._on_discovered, user.object_id, recipe)
+        )
+        return True
+
+    def _on_discovered(self, user_id: int, recipe: RecipeTable) -> None:
+        self.discoveries.add(user_id, recipe.object_id)
+        # Applied in batches by the aggregator, off the request's transaction
+        self.counters.increment(RecipeTable, recipe.object_id, "discovered_count")
+        task = asyncio.create_task(
+            self.event_bus.publish(
+                Event.from_dict(
+                    ProgressTopics.PROGRESS_CREATE,
+                    NewProgressPayload(user_id=user_id, recipe_id=recipe.object_id),
                 )
-                .values(discovered_count=RecipeTable.discovered_count + 1)
             )
-            await inner_session.execute(inner_stmt)
-
-        return True
+        )
+        self._publish_tasks.add(task)
+        task.add_done_callback(self._publish_tasks.discard)
 
     @async_traced_function
-    async def get_open_recipies(self, user: UserTable) -> list[RecipeTable]:
+    async def filter_discovered(
+        self, user: UserTable, recipe_ids: Collection[int]
+    ) -> set[int]:
+        """Returns the subset of `recipe_ids` the user has discovered."""
+        discoveries = await self.get_discoveries(user)
+        found = {
+            recipe_id for recipe_id in recipe_ids if contains(discoveries, recipe_id)
+        }
+        if len(found) == len(recipe_ids):
+            return found
+
+        # Misses are confirmed against the database: another instance may have
+        # recorded a discovery after this set was cached.
         uow = current_uow.get()
         session = await uow.get_session()
 
-        stmt = select(ProgressTable).where(
+        stmt = select(ProgressTable.recipe_id).where(
             ProgressTable.object_id == user.object_id,
+            col(ProgressTable.recipe_id).in_(set(recipe_ids) - found),
+        )
+        for recipe_id in (await session.execute(stmt)).scalars():
+            self.discoveries.add(user.object_id, recipe_id)
+            found.add(recipe_id)
+        return found
+
+    @async_traced_function
+    async def get_discovered_recipe_ids(self, user: UserTable) -> list[int]:
+        return (await self.get_discoveries(user)).tolist()
+
+    @async_traced_function
+    async def get_open_recipes_page(
+        self,
+        user: UserTable,
+        after_recipe_id: int | None = None,
+        limit: int = 100,
+        compact: bool = False,
+    ) -> Sequence[Row[Any]]:
+        """
+        Returns up to `limit` discovered recipes with ids above `after_recipe_id`,
+        ordered by id, as plain rows from a single keyset query.
+
+        Compact rows hold only ids; full rows also carry the recipe columns and
+        `{element_a,element_b,result}_{name,emoji}` of its elements.
+        """
+        uow = current_uow.get()
+        session = await uow.get_session()
+
+        columns: list[Any] = [
+            RecipeTable.object_id,
+            RecipeTable.element_a_id,
+            RecipeTable.element_b_id,
+            RecipeTable.result_id,
+        ]
+        elements: list[tuple[Any, Any]] = []
+        if not compact:
+            columns += [
+                RecipeTable.created_at,
+                RecipeTable.updated_at,
+                RecipeTable.resources_cost,
+                RecipeTable.discovered_count,
+            ]
+            for name, element_id in (
+                ("element_a", RecipeTable.element_a_id),
+                ("element_b", RecipeTable.element_b_id),
+                ("result", RecipeTable.result_id),
+            ):
+                element = aliased(ElementTable, name=name)
+                elements.append((element, element.object_id == element_id))
+                columns += [
+                    col(element.name).label(f"{name}_name"),
+                    col(element.emoji).label(f"{name}_emoji"),
+                ]
+
+        stmt = (
+            select(*columns)
+            .select_from(ProgressTable)
+            .join(RecipeTable, col(RecipeTable.object_id) == ProgressTable.recipe_id)
         )
-        result = (await session.execute(stmt)).scalars().all()
-        return [progress.recipe for progress in result]
+        for element, on_clause in elements:
+            stmt = stmt.join(element, on_clause)
+
+        stmt = stmt.where(ProgressTable.object_id == user.object_id)
+        if after_recipe_id is not None:
+            stmt = stmt.where(ProgressTable.recipe_id > after_recipe_id)
+
+        stmt = stmt.order_by(ProgressTable.recipe_id).limit(limit)
+        rows: Sequence[Row[Any]] = (await session.execute(stmt)).all()
+        return rows
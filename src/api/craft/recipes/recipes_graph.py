@@ -0,0 +1,377 @@
+"""
+In-memory recipe graph.
+
+Elements are mapped to dense node indices and recipes are kept in parallel
+integer arrays, so traversals touch plain ints instead of ORM objects.
+"""
+
+import bisect
+import collections
+import logging
+from array import array
+from collections.abc import Iterable, Mapping
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger("deus-vult.api.craft.graph")
+
+
+class RecipeGraph:
+    """
+    Directed graph of `element_a + element_b -> result` recipes.
+
+    Base elements (never produced by a recipe) cost one of themselves; every
+    other element costs the sum of the inputs of its recipe with the lowest
+    id, whatever order recipes are added in. Computed costs are memoized and
+    dropped when a recipe changes which one is canonical.
+
+    Example usage:
+
+    graph.add_recipe(recipe.object_id, recipe.element_a_id, ...)
+    graph.cost(element_id)  # {base_element_id: amount}
+    """
+
+    def __init__(self, base_element_ids: Iterable[int] = ()) -> None:
+        self._base = set(base_element_ids)
+        self._node_ids = array("q")
+        self._nodes: dict[int, int] = {}
+
+        # Recipe index -> recipe id / input nodes / result node
+        self._recipe_ids = array("q")
+        self._inputs_a = array("l")
+        self._inputs_b = array("l")
+        self._results = array("l")
+        self._recipes: dict[int, int] = {}
+        # Recipe index -> stored resources cost, when known
+        self._charged: dict[int, dict[int, int]] = {}
+
+        # Node -> recipe indices producing / consuming it
+        self._produced_by: list[array[int]] = []
+        self._used_in: list[array[int]] = []
+
+        self._costs: dict[int, collections.Counter[int]] = {}
+        # Sparse (CSR) recipe costs: row r spans cost_ptr[r]:cost_ptr[r + 1]
+        # of cost_nodes / cost_amounts
+        self._cost_ptr = array("q", [0])
+        self._cost_nodes = array("q")
+        self._cost_amounts = array("q")
+
+    def __len__(self) -> int:
+        return len(self._recipe_ids)
+
+    def __contains__(self, recipe_id: object) -> bool:
+        return recipe_id in self._recipes
+
+    def _node(self, element_id: int) -> int:
+        node = self._nodes.get(element_id)
+        if node is None:
+            node = self._nodes[element_id] = len(self._node_ids)
+            self._node_ids.append(element_id)
+            self._produced_by.append(array("l"))
+            self._used_in.append(array("l"))
+        return node
+
+    def add_recipe(
+        self,
+        recipe_id: int,
+        element_a_id: int,
+        element_b_id: int,
+        result_id: int,
+        resources_cost: Mapping[int, int] | None = None,
+    ) -> bool:
+        """
+        Adds a recipe, returns False if it is already known. `resources_cost`
+        is what crafting the recipe charges (its stored `resources_cost`);
+        `max_crafts` uses it instead of the graph cost when given.
+        """
+        if recipe_id in self._recipes:
+            return False
+
+        index = len(self._recipe_ids)
+        a, b, result = (
+            self._node(element_a_id),
+            self._node(element_b_id),
+            self._node(result_id),
+        )
+
+        self._recipes[recipe_id] = index
+        self._recipe_ids.append(recipe_id)
+        self._inputs_a.append(a)
+        self._inputs_b.append(b)
+        self._results.append(result)
+        if resources_cost is not None:
+            self._charged[index] = dict(resources_cost)
+
+        # Producers are kept by recipe id, the first one is canonical
+        producers = self._produced_by[result]
+        position = bisect.bisect(producers, recipe_id, key=self._recipe_ids.__getitem__)
+        if position == 0 and result in self._costs:
+            # Costed through another recipe (or as a base element); its
+            # dependants are stale as well
+            self._costs.clear()
+            del self._cost_ptr[1:]
+            del self._cost_nodes[:]
+            del self._cost_amounts[:]
+        producers.insert(position, index)
+        self._used_in[a].append(index)
+        if b != a:
+            self._used_in[b].append(index)
+        return True
+
+    def is_resolved(self, element_id: int) -> bool:
+        """Whether the cost of the element is known from the graph alone."""
+        node = self._nodes.get(element_id)
+        return element_id in self._base or (
+            node is not None and len(self._produced_by[node]) > 0
+        )
+
+    """
+    COSTS
+    """
+
+    def _node_cost(self, node: int) -> collections.Counter[int]:
+        # Iterative post-order, recipe chains can be deeper than the stack
+        stack = [node]
+        on_stack = {node}
+        while stack:
+            current = stack[-1]
+            if current in self._costs:
+                on_stack.discard(stack.pop())
+                continue
+
+            producers = self._produced_by[current]
+            if not producers or self._node_ids[current] in self._base:
+                self._costs[current] = collections.Counter({self._node_ids[current]: 1})
+                on_stack.discard(stack.pop())
+                continue
+
+            recipe = producers[0]
+            pending = [
+                parent
+                for parent in (self._inputs_a[recipe], self._inputs_b[recipe])
+                if parent not in self._costs
+            ]
+            if pending:
+                if on_stack.intersection(pending):
+                    raise ValueError(
+                        f"Recipe cycle through element {self._node_ids[current]}"
+                    )
+                stack.extend(pending)
+                on_stack.update(pending)
+                continue
+
+            cost = self._costs[self._inputs_a[recipe]].copy()
+            cost.update(self._costs[self._inputs_b[recipe]])
+            self._costs[current] = cost
+            on_stack.discard(stack.pop())
+
+        return self._costs[node]
+
+    def cost(self, element_id: int) -> dict[int, int]:
+        """Base elements needed to craft the element from scratch."""
+        if element_id not in self._nodes:
+            return {element_id: 1}
+        return dict(self._node_cost(self._nodes[element_id]))
+
+    def pair_cost(self, element_a_id: int, element_b_id: int) -> dict[int, int]:
+        """Resources cost of a recipe combining the two elements."""
+        cost = collections.Counter(self.cost(element_a_id))
+        cost.update(self.cost(element_b_id))
+        return dict(cost)
+
+    def _extend_cost_matrix(self) -> None:
+        """Appends the sparse cost rows of recipes added since the last call."""
+        for recipe in range(len(self._cost_ptr) - 1, len(self._recipe_ids)):
+            cost = self._charged.get(recipe)
+            if cost is None:
+                cost = self._node_cost(self._inputs_a[recipe]).copy()
+                cost.update(self._node_cost(self._inputs_b[recipe]))
+            for element_id, amount in cost.items():
+                if amount <= 0:
+                    # Can't bound the count, and would be divided by below
+                    continue
+                self._cost_nodes.append(self._node(element_id))
+                self._cost_amounts.append(amount)
+            self._cost_ptr.append(len(self._cost_nodes))
+
+    def max_crafts(
+        self, recipe_ids: Iterable[int], inventory: Mapping[int, int]
+    ) -> list[tuple[int, int]]:
+        """
+        How many times each recipe can be crafted from the inventory
+        (`element_id -> amount`), as `(recipe_id, count)` pairs. Recipes are
+        costed as crafting charges them, see `add_recipe`. Unknown recipes
+        and recipes that cost nothing, so have no bound, are left out.
+        """
+        self._extend_cost_matrix()
+        rows = np.fromiter(
+            (self._recipes[r] for r in recipe_ids if r in self._recipes), np.int64
+        )
+        if not rows.size:
+            return []
+
+        have = np.zeros(len(self._node_ids), np.int64)
+        for element_id, amount in inventory.items():
+            if (node := self._nodes.get(element_id)) is not None:
+                have[node] = max(amount, 0)
+
+        ptr: npt.NDArray[np.int64] = np.frombuffer(self._cost_ptr, np.int64)
+        # `reduceat` can't reduce empty segments, drop the free recipes
+        rows = rows[ptr[rows + 1] > ptr[rows]]
+        if not rows.size:
+            return []
+        starts = ptr[rows]
+        lengths = ptr[rows + 1] - starts
+        segments = np.cumsum(lengths) - lengths
+        # Positions of every selected row's entries in the flat cost arrays
+        positions = np.repeat(starts - segments, lengths) + np.arange(lengths.sum())
+
+        nodes = np.frombuffer(self._cost_nodes, np.int64)[positions]
+        amounts = np.frombuffer(self._cost_amounts, np.int64)[positions]
+        counts = np.minimum.reduceat(have[nodes] // amounts, segments)
+
+        ids = np.frombuffer(self._recipe_ids, np.int64)[rows]
+        return [
+            (int(recipe_id), int(count))
+            for recipe_id, count in zip(ids, counts, strict=True)
+        ]
+
+    """
+    QUERIES
+    """
+
+    def reachable(
+        self,
+        available: Iterable[int],
+        recipe_ids: Iterable[int] | None = None,
+    ) -> set[int]:
+        """
+        Elements craftable, directly or transitively, from `available` ones
+        with unlimited amounts, optionally only through the given recipes.
+        """
+        allowed: set[int] | None = None
+        if recipe_ids is not None:
+            allowed = {
+                self._recipes[recipe_id]
+                for recipe_id in recipe_ids
+                if recipe_id in self._recipes
+            }
+
+        # Number of distinct inputs still missing per recipe
+        missing = array(
+            "b",
+            (
+                1 if a == b else 2
+                for a, b in zip(self._inputs_a, self._inputs_b, strict=True)
+            ),
+        )
+        seen = bytearray(len(self._node_ids))
+        queue = collections.deque[int]()
+        for element_id in available:
+            node = self._nodes.get(element_id)
+            if node is not None and not seen[node]:
+                seen[node] = 1
+                queue.append(node)
+
+        while queue:
+            node = queue.popleft()
+            for recipe in self._used_in[node]:
+                missing[recipe] -= 1
+                if missing[recipe] or (allowed is not None and recipe not in allowed):
+                    continue
+
+                result = self._results[recipe]
+                if not seen[result]:
+                    seen[result] = 1
+                    queue.append(result)
+
+        return {self._node_ids[node] for node, flag in enumerate(seen) if flag}
+
+    def shortest_path(self, element_id: int, available: Iterable[int]) -> list[int]:
+        """
+        Recipe ids to craft, in order, to get the element from `available`
+        ones with the fewest crafts. Shared intermediates are counted once per
+        use, so the result is minimal per branch. Raises `ValueError` if the
+        element cannot be crafted.
+        """
+        available = set(available)
+        if element_id in available:
+            return []
+
+        target = self._nodes.get(element_id)
+        if target is None:
+            raise ValueError(f"Element {element_id} is not reachable")
+
+        best = self._fewest_crafts(
+            target, (self._nodes[e] for e in available if e in self._nodes)
+        )
+        if best[target][0] == float("inf"):
+            raise ValueError(f"Element {element_id} is not reachable")
+        return self._crafting_order(target, best)
+
+    def _fewest_crafts(
+        self, target: int, available: Iterable[int]
+    ) -> dict[int, tuple[float, int]]:
+        """
+        Fewest crafts per node needed for `target` from the `available` nodes,
+        with the recipe achieving it (-1 for none).
+        """
+        best: dict[int, tuple[float, int]] = dict.fromkeys(available, (0, -1))
+        stack = [target]
+        on_stack = {target}
+        while stack:
+            current = stack[-1]
+            if current in best:
+                on_stack.discard(stack.pop())
+                continue
+
+            pending = {
+                parent
+                for recipe in self._produced_by[current]
+                for parent in (self._inputs_a[recipe], self._inputs_b[recipe])
+                if parent not in best and parent not in on_stack
+            }
+            if pending:
+                stack.extend(pending)
+                on_stack.update(pending)
+                continue
+
+            choice: tuple[float, int] = (float("inf"), -1)
+            for recipe in self._produced_by[current]:
+                a, b = self._inputs_a[recipe], self._inputs_b[recipe]
+                crafts = 1 + best.get(a, (float("inf"), -1))[0]
+                if b != a:
+                    crafts += best.get(b, (float("inf"), -1))[0]
+                choice = min(choice, (crafts, recipe))
+            best[current] = choice
+            on_stack.discard(stack.pop())
+
+        return best
+
+    def _crafting_order(
+        self, target: int, best: Mapping[int, tuple[float, int]]
+    ) -> list[int]:
+        """Post-order over the chosen recipes gives a valid crafting order."""
+        path: list[int] = []
+        done: set[int] = set()
+        todo = [(target, False)]
+        while todo:
+            current, expanded = todo.pop()
+            recipe = best[current][1]
+            if recipe < 0 or current in done:
+                continue
+
+            if expanded:
+                done.add(current)
+                path.append(self._recipe_ids[recipe])
+                continue
+
+            todo.append((current, True))
+            todo.extend(
+                (parent, False)
+                for parent in (self._inputs_b[recipe], self._inputs_a[recipe])
+                if parent not in done
+            )
+
+        return path
@@ -7,6 +7,7 @@ from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Column, Field, Relationship
 
 from src.shared.base import BaseSchema
+from src.shared.events import EventPayload
 
 # Forward reference for type hints
 if TYPE_CHECKING:
@@ -36,6 +37,39 @@ class RecipeWithElementsPublic(RecipeBase):
 
 class RecipesListResponse(BaseModel):
     recipes: list[RecipeWithElementsPublic]
+    next_after_recipe_id: int | None = Field(
+        default=None, description="Cursor for the next page, None on the last one"
+    )
+
+
+class CompactRecipesListResponse(BaseModel):
+    recipes: list[tuple[int, int, int, int]] = Field(
+        description="`(object_id, element_a_id, element_b_id, result_id)` tuples"
+    )
+    next_after_recipe_id: int | None = Field(
+        default=None, description="Cursor for the next page, None on the last one"
+    )
+
+
+class CraftableRecipesResponse(BaseModel):
+    recipes: list[tuple[int, int]] = Field(
+        description="`(recipe_id, max_count)` for discovered recipes the inventory "
+        "can afford at least once"
+    )
+
+
+"""
+PAYLOADS
+"""
+
+
+class NewRecipePayload(EventPayload):
+    recipe_id: int
+    element_a_id: int
+    element_b_id: int
+    result_id: int
+    # element_id -> count, as stored on the recipe
+    resources_cost: dict[str, int] = {}
 
 
 class RecipeTable(RecipeBase, table=True):
@@ -1,11 +1,18 @@
 import logging
+from collections.abc import Collection
+from typing import Any, cast
 
-from sqlmodel import select
+from sqlalchemy import Row, Select
+from sqlmodel import col, select
 
 from src.api.craft.elements.elements_constants import VOID
 from src.api.craft.elements.elements_schemas import Element, ElementTable
-from src.api.craft.recipes.recipes_schemas import RecipeTable
+from src.api.craft.recipes.recipes_graph import RecipeGraph
+from src.api.craft.recipes.recipes_schemas import NewRecipePayload, RecipeTable
 from src.shared.base import BaseService
+from src.shared.event_bus import EventBus
+from src.shared.event_registry import RecipeTopics
+from src.shared.events import Event
 from src.shared.observability.traces import async_traced_function
 from src.shared.uow import UnitOfWork, current_uow
 
@@ -13,9 +20,100 @@ logger = logging.getLogger("deus-vult.api.craft")
 
 
 class RecipesService(BaseService):
-    def __init__(self, uow: UnitOfWork) -> None:
+    def __init__(
+        self, uow: UnitOfWork, event_bus: EventBus, graph: RecipeGraph
+    ) -> None:
         super().__init__()
         self.uow = uow
+        self.event_bus = event_bus
+        self.graph = graph
+        # Recipe ids known to stay out of the graph, see `load_missing`
+        self._excluded: set[int] = set()
+
+    @staticmethod
+    def _graph_rows() -> Select[Any]:
+        """Recipe rows the graph is built from, VOID recipes excluded."""
+        columns: list[Any] = [
+            RecipeTable.object_id,
+            RecipeTable.element_a_id,
+            RecipeTable.element_b_id,
+            RecipeTable.result_id,
+            RecipeTable.resources_cost,
+        ]
+        stmt: Select[Any] = (
+            select(*columns)
+            .where(RecipeTable.result_id != VOID.object_id)
+            # The graph treats an element's lowest-id recipe as canonical
+            .order_by(col(RecipeTable.object_id))
+        )
+        return stmt
+
+    def _add_to_graph(self, row: Row[Any]) -> None:
+        recipe_id, element_a_id, element_b_id, result_id, cost = row
+        self.graph.add_recipe(
+            recipe_id,
+            element_a_id,
+            element_b_id,
+            result_id,
+            # What crafting charges, so affordability matches it
+            {int(element_id): amount for element_id, amount in cost.items()},
+        )
+
+    @async_traced_function
+    async def load_graph(self) -> None:
+        """Fills the recipe graph from the database, VOID recipes excluded."""
+        async with self.uow.start(readonly=True) as uow:
+            session = await uow.get_session()
+
+            stmt = self._graph_rows().execution_options(yield_per=5000)
+            async for row in await session.stream(stmt):
+                self._add_to_graph(row)
+
+        logger.info("Recipe graph loaded: %s recipes", len(self.graph))
+
+    @async_traced_function
+    async def load_missing(self, recipe_ids: Collection[int]) -> None:
+        """
+        Adds the given recipes the graph doesn't know yet. Recipes created by
+        other instances never reach this one's RECIPE_CREATE subscriber.
+        """
+        missing = {
+            recipe_id
+            for recipe_id in recipe_ids
+            if recipe_id not in self.graph and recipe_id not in self._excluded
+        }
+        if not missing:
+            return
+
+        async with self.uow.start(readonly=True) as uow:
+            session = await uow.get_session()
+            stmt = self._graph_rows().where(col(RecipeTable.object_id).in_(missing))
+            for row in await session.execute(stmt):
+                self._add_to_graph(row)
+
+        # VOID (or deleted) recipes, recipes never change so don't ask again
+        self._excluded.update(
+            recipe_id for recipe_id in missing if recipe_id not in self.graph
+        )
+
+    @EventBus.subscribe(RecipeTopics.RECIPE_CREATE)
+    @async_traced_function
+    async def on_recipe_create(self, event: Event) -> None:
+        payload = cast(
+            NewRecipePayload,
+            event.extract_payload(event, NewRecipePayload),
+        )
+        if payload.result_id != VOID.object_id:
+            self.graph.add_recipe(
+                payload.recipe_id,
+                payload.element_a_id,
+                payload.element_b_id,
+                payload.result_id,
+                {
+                    int(element_id): amount
+                    for element_id, amount in payload.resources_cost.items()
+                },
+            )
 
     @async_traced_function
     async def save_new_recipe(
@@ -24,7 +122,9 @@ class RecipesService(BaseService):
         element_b: ElementTable,
         new_element: Element | None,
     ) -> RecipeTable:
-        async with self.uow.start() as uow:
+        # Independent on purpose: a recipe (VOID included) must persist even
+        # when the crafting request that discovered it rolls back.
+        async with self.uow.start(independent=True) as uow:
             session = await uow.get_session()
             if new_element is not None:
                 created_element = ElementTable.model_validate(new_element)
@@ -47,13 +147,41 @@ class RecipesService(BaseService):
                 element_b_id=element_b.object_id,
                 result_id=created_element.object_id,
             )
-            new_recipe.update_resources_cost(element_a, element_b)
+            if all(
+                self.graph.is_resolved(element.object_id)
+                for element in (element_a, element_b)
+            ):
+                new_recipe.resources_cost = {
+                    str(element_id): amount
+                    for element_id, amount in self.graph.pair_cost(
+                        element_a.object_id, element_b.object_id
+                    ).items()
+                }
+            else:
+                # Not (yet) in the graph, fall back to the parents' recipes
+                new_recipe.update_resources_cost(element_a, element_b)
             session.add(new_recipe)
             await session.commit()
             await session.refresh(new_recipe)
 
+        await self._publish_created(new_recipe)
         return new_recipe
 
+    async def _publish_created(self, recipe: RecipeTable) -> None:
+        """Notifies subscribers (e.g. the recipe graph) about a new recipe."""
+        await self.event_bus.publish(
+            Event.from_dict(
+                RecipeTopics.RECIPE_CREATE,
+                NewRecipePayload(
+                    recipe_id=recipe.object_id,
+                    element_a_id=recipe.element_a_id,
+                    element_b_id=recipe.element_b_id,
+                    result_id=recipe.result_id,
+                    resources_cost=recipe.resources_cost,
+                ),
+            )
+        )
+
     @async_traced_function
     async def fetch_recipe(
         self,
@@ -82,3 +210,11 @@ class RecipesService(BaseService):
 
         stmt = select(RecipeTable).where(RecipeTable.object_id == recipe_id)
         return (await session.execute(stmt)).scalars().one_or_none()
+
+    @async_traced_function
+    async def get_recipes(self, recipe_ids: Collection[int]) -> list[RecipeTable]:
+        active_uow = current_uow.get()
+        session = await active_uow.get_session()
+
+        stmt = select(RecipeTable).where(col(RecipeTable.object_id).in_(recipe_ids))
+        return list((await session.execute(stmt)).scalars().all())
@@ -1,4 +1,4 @@
-from src.shared.exceptions import BadRequestError
+from src.shared.exceptions import BadRequestError, ConflictError
 
 
 class BaseInventoryException(BadRequestError):
@@ -7,3 +7,7 @@ class BaseInventoryException(BadRequestError):
 
 class InventoryNotEnoughItemsException(BaseInventoryException):
     pass
+
+
+class InventoryBusyException(ConflictError):
+    pass
@@ -0,0 +1,39 @@
+import logging
+from typing import Annotated
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends, Query
+
+from src import Container
+from src.api.core.dependencies import validate_init_data
+from src.api.inventory.inventory_schemas import InventorySnapshot
+from src.api.inventory.inventory_service import InventoryService
+from src.api.users.users_schemas import UserTable
+from src.shared.observability.traces import async_traced_function
+
+logger = logging.getLogger("deus-vult.api.inventory")
+
+inventory_router = APIRouter(prefix="/inventory")
+
+
+@inventory_router.get(
+    "",
+    name="User's inventory",
+    tags=["Inventory"],
+    response_model=InventorySnapshot,
+)
+@async_traced_function
+@inject
+async def get_inventory(
+    # Only the id is needed, so the user graph isn't loaded
+    user_data: Annotated[UserTable, Depends(validate_init_data)],
+    inventory_service: Annotated[
+        InventoryService, Depends(Provide[Container.inventory_service])
+    ],
+    since_version: Annotated[int | None, Query(ge=0)] = None,
+) -> InventorySnapshot:
+    """
+    Returns `(sub_type_id, amount)` pairs per item type. With `since_version`,
+    only items changed after that version are returned, emptied ones with 0.
+    """
+    return await inventory_service.get_snapshot(user_data.object_id, since_version)
@@ -1,19 +1,38 @@
 import enum
-from typing import TYPE_CHECKING, Any
+import functools
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, Any, cast
 
+from pydantic import field_validator
+from sqlalchemy import TextClause, text
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlmodel import Column, Field, Relationship, SQLModel, select, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Column, Field, Index, Relationship, SQLModel, col, select
 
 from src.api.craft.elements.elements_schemas import ElementBase, ElementTable
 from src.api.inventory.inventory_exceptions import (
+    InventoryBusyException,
     InventoryNotEnoughItemsException,
 )
+from src.shared.database import (
+    WRITES_INFO_KEY,
+    contention_error,
+    retry_on_contention,
+)
+from src.shared.exceptions import NotFoundError
+from src.shared.observability.metrics import MetricsStorage
 from src.shared.observability.traces import async_traced_function
+from src.shared.time import Timer
 from src.shared.uow import current_uow
 
 if TYPE_CHECKING:
     from src.api.users.users_schemas import UserTable
 
+# Untyped in SQLAlchemy
+_set_committed_value = cast(Callable[[Any, str, Any], None], set_committed_value)
+
 
 class InventoryItemBase(SQLModel):
     # We don't have polymorphic types, so let's use enums at least
@@ -40,6 +59,13 @@ class InventoryItemPublic(InventoryItemBase):
 
 class InventoryItemTable(InventoryItemBase, table=True):
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_inventory_id_version", "inventory_id", "version"),
+    )
+
+    # Inventory version of the last change; emptied rows stay as amount 0
+    # tombstones so delta syncs can see them.
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     inventory: "InventoryTable" = Relationship(
         back_populates="items",
@@ -57,6 +83,39 @@ class InventoryItemTable(InventoryItemBase, table=True):
 class InventoryPublic(SQLModel):
     items: list[InventoryItemPublic] = []
 
+    # noinspection PyNestedDecorators
+    @field_validator("items")
+    @classmethod
+    def drop_tombstones(
+        cls, items: list[InventoryItemPublic]
+    ) -> list[InventoryItemPublic]:
+        return [item for item in items if item.amount > 0]
+
+
+class InventorySnapshot(SQLModel):
+    """
+    Compact inventory state: `(sub_type_id, amount)` pairs per item type.
+
+    A delta (`full=False`) lists only items changed after the requested
+    version; emptied items are sent with amount 0.
+    """
+
+    version: int
+    full: bool
+    items: dict[InventoryItemBase.ItemType, list[tuple[int, int]]] = {}
+
+
+class LockMode(enum.StrEnum):
+    """How an inventory transfer treats rows locked by other transactions."""
+
+    WAIT = ""
+    # Fails at once on a locked row; the transfer retries with backoff instead
+    # of queueing behind the lock holder
+    NOWAIT = "NOWAIT"
+
+
+lock_metrics = MetricsStorage("inventory.locks")
+
 
 class InventoryTable(SQLModel, table=True):
     __tablename__ = "inventories"
@@ -69,6 +128,8 @@ class InventoryTable(SQLModel, table=True):
     )
 
     user_id: int = Field(foreign_key="users.object_id", primary_key=True)
+    # Bumped by every transfer, which also stamps it on the changed items
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     user: "UserTable" = Relationship(
         back_populates="inventory",
         sa_relationship_kwargs={"lazy": "selectin"},
@@ -80,84 +141,221 @@ class InventoryTable(SQLModel, table=True):
     )
 
     @async_traced_function
-    async def remove_items(
+    async def transfer(
         self,
-        *orders: InventoryItemTable,
+        consume: Sequence[InventoryItemTable] = (),
+        produce: Sequence[InventoryItemTable] = (),
+        lock: LockMode = LockMode.WAIT,
     ) -> None:
-        items = list(orders)
+        """
+        Atomically consumes and produces items in a single statement.
+
+        Rows are locked in `(inventory_id, type, sub_type_id)` order, amounts
+        are checked in SQL and the inventory version is bumped, so clients can
+        sync deltas. If any consumed item is short, nothing is applied
+        and `InventoryNotEnoughItemsException` lists exactly the missing items;
+        `NotFoundError` is raised if the inventory row itself doesn't exist.
+        Deadlocks and lock conflicts are retried; `InventoryBusyException` is
+        raised once retries run out.
+        """
+        orders = _merge_orders(consume, produce)
+        if not orders:
+            return
 
         uow = current_uow.get()
         session = await uow.get_session()
 
-        stmt = (
-            select(InventoryItemTable)
-            .where(
-                tuple_(  # type: ignore
-                    InventoryItemTable.inventory_id,
-                    InventoryItemTable.type,
-                    InventoryItemTable.sub_type_id,
-                ).in_([(self.object_id, item.type, item.sub_type_id) for item in items])
-            )
-            .with_for_update()
+        keys = sorted(orders)
+        params = {
+            "inventory_id": self.object_id,
+            "types": [item_type.name for item_type, _ in keys],
+            "sub_type_ids": [sub_type_id for _, sub_type_id in keys],
+            "required": [orders[key][0] for key in keys],
+            "deltas": [orders[key][1] for key in keys],
+        }
+
+        async def apply() -> dict[tuple[Any, int], Any]:
+            rows = (await session.execute(_transfer_statement(lock), params)).all()
+            if not rows and not await self._exists(session):
+                # Nothing to lock or bump: produced items would vanish silently
+                raise NotFoundError("inventory")
+            # Textual DML is invisible to the ORM write tracking
+            session.info[WRITES_INFO_KEY] = True
+            applied = {
+                (InventoryItemBase.ItemType[row.type], row.sub_type_id): row
+                for row in rows
+            }
+
+            missing = [
+                (key, required)
+                for key, (required, _) in orders.items()
+                if required and key not in applied
+            ]
+            if missing:
+                raise InventoryNotEnoughItemsException(
+                    "Not enough items: "
+                    + ", ".join(
+                        f"{item_type} {sub_type_id} x{required}"
+                        for (item_type, sub_type_id), required in missing
+                    )
+                )
+            return applied
+
+        try:
+            with Timer() as t:
+                applied = await retry_on_contention(
+                    session, apply, metrics=lock_metrics, label=lock.name
+                )
+        except DBAPIError as e:
+            if contention_error(e) is None:
+                raise
+            raise InventoryBusyException("Inventory is busy, try again.") from e
+        finally:
+            lock_metrics.observe("transfer_time", t.current, label=lock.name)
+
+        self._sync_loaded_items(session, applied)
+
+    async def _exists(self, session: AsyncSession) -> bool:
+        stmt = select(InventoryTable.object_id).where(
+            col(InventoryTable.object_id) == self.object_id
         )
+        return (await session.execute(stmt)).first() is not None
 
-        items_to_remove: list[InventoryItemTable] = list(
-            (await session.execute(stmt)).scalars().all()
+    def _sync_loaded_items(
+        self, session: AsyncSession, applied: dict[tuple[Any, int], Any]
+    ) -> None:
+        """Mirrors a transfer onto the already loaded inventory state."""
+        if applied:
+            version = next(iter(applied.values())).version
+            _set_committed_value(self, "version", version)
+
+        if "items" not in self.__dict__:
+            return
+
+        known = set[tuple[Any, int]]()
+        for item in self.items:
+            key = (item.type, item.sub_type_id)
+            known.add(key)
+            if (row := applied.get(key)) is not None:
+                _set_committed_value(item, "amount", row.amount)
+                _set_committed_value(item, "version", row.version)
+
+        if any(key not in known for key in applied):
+            # New rows were inserted behind the ORM's back; reload on next access
+            session.expire(self, ["items"])
+
+    def holds(self, *orders: InventoryItemTable) -> bool:
+        """Checks the loaded amounts, without locking; `transfer` checks again."""
+        held = {(item.type, item.sub_type_id): item.amount for item in self.items}
+        return all(
+            held.get(key, 0) >= required
+            for key, (required, _) in _merge_orders(orders, ()).items()
         )
-        if len(items_to_remove) != len(items):
-            raise InventoryNotEnoughItemsException("Not enough items.")
 
-        items_to_remove.sort(key=lambda item: (item.type, item.sub_type_id))
-        items.sort(key=lambda item: (item.type, item.sub_type_id))
+    async def remove_items(
+        self, *orders: InventoryItemTable, lock: LockMode = LockMode.WAIT
+    ) -> None:
+        await self.transfer(consume=orders, lock=lock)
 
-        for item, order in zip(items_to_remove, items, strict=True):
-            if item.amount < order.amount:
-                raise InventoryNotEnoughItemsException("Not enough items.")
+    async def add_items(
+        self, *orders: InventoryItemTable, lock: LockMode = LockMode.WAIT
+    ) -> None:
+        await self.transfer(produce=orders, lock=lock)
 
-            elif item.amount > order.amount:
-                item.amount -= order.amount
 
-            else:
-                await session.delete(item)
+# (item type, sub_type_id) -> (amount required up front, net amount change)
+TransferOrders = dict[tuple[InventoryItemBase.ItemType, int], tuple[int, int]]
 
-    @async_traced_function
-    async def add_items(self, *orders: InventoryItemTable) -> None:
-        uow = current_uow.get()
-        session = await uow.get_session()
 
-        for order in orders:
-            order.inventory_id = self.object_id
-
-        stmt = (
-            select(InventoryItemTable)
-            .where(
-                tuple_(  # type: ignore
-                    InventoryItemTable.inventory_id,
-                    InventoryItemTable.type,
-                    InventoryItemTable.sub_type_id,
-                ).in_(
-                    [
-                        (item.inventory_id, item.type, item.sub_type_id)
-                        for item in orders
-                    ]
-                )
-            )
-            .with_for_update()
+def _merge_orders(
+    consume: Sequence[InventoryItemTable], produce: Sequence[InventoryItemTable]
+) -> TransferOrders:
+    # A row may be touched only once per statement, so an item that is both
+    # consumed and produced is folded into one net change.
+    orders: TransferOrders = {}
+    for item in consume:
+        required, delta = orders.get((item.type, item.sub_type_id), (0, 0))
+        orders[(item.type, item.sub_type_id)] = (
+            required + item.amount,
+            delta - item.amount,
         )
-
-        fetched_items: list[InventoryItemTable] = list(
-            (await session.execute(stmt)).scalars().all()
+    for item in produce:
+        required, delta = orders.get((item.type, item.sub_type_id), (0, 0))
+        orders[(item.type, item.sub_type_id)] = (required, delta + item.amount)
+    return orders
+
+
+@functools.cache
+def _transfer_statement(lock: LockMode) -> TextClause:
+    """
+    Locks the inventory row, then its existing requested items in canonical
+    order, and bumps the inventory version. Consumes every item with
+    `required > 0` and, only if all of them had enough, upserts the purely
+    produced items. Changed items are stamped with the new version; emptied
+    ones are kept as amount 0 tombstones.
+
+    Returns one `(type, sub_type_id, amount, version)` row per applied change.
+    """
+    inventories = InventoryTable.__tablename__
+    table = InventoryItemTable.__tablename__
+    item_type = InventoryItemTable.__table__.c.type.type.name  # type: ignore
+    return text(
+        f"""
+        WITH req AS (
+            SELECT * FROM unnest(
+                CAST(:types AS {item_type}[]),
+                CAST(:sub_type_ids AS integer[]),
+                CAST(:required AS integer[]),
+                CAST(:deltas AS integer[])
+            ) AS r(type, sub_type_id, required, delta)
+        ),
+        inventory AS (
+            SELECT object_id FROM {inventories}
+            WHERE object_id = :inventory_id
+            FOR UPDATE {lock.value}
+        ),
+        bumped AS (
+            UPDATE {inventories} AS inv SET version = inv.version + 1
+            FROM inventory
+            WHERE inv.object_id = inventory.object_id
+            RETURNING inv.object_id, inv.version
+        ),
+        locked AS (
+            SELECT i.type, i.sub_type_id
+            FROM {table} AS i JOIN req USING (type, sub_type_id)
+            WHERE i.inventory_id = (SELECT object_id FROM bumped)
+            ORDER BY i.inventory_id, i.type, i.sub_type_id
+            FOR UPDATE OF i {lock.value}
+        ),
+        updated AS (
+            UPDATE {table} AS i
+            SET amount = i.amount + req.delta,
+                version = (SELECT version FROM bumped)
+            FROM req JOIN locked USING (type, sub_type_id)
+            WHERE i.inventory_id = :inventory_id
+              AND i.type = req.type AND i.sub_type_id = req.sub_type_id
+              AND req.required > 0
+              AND i.amount >= req.required AND i.amount + req.delta >= 0
+            RETURNING i.type, i.sub_type_id, i.amount, i.version
+        ),
+        produced AS (
+            INSERT INTO {table} AS i
+                (inventory_id, type, sub_type_id, amount, version, meta)
+            SELECT bumped.object_id, req.type, req.sub_type_id, req.delta,
+                   bumped.version, CAST('{{}}' AS jsonb)
+            FROM req CROSS JOIN bumped
+            WHERE req.required = 0
+              AND (SELECT count(*) FROM updated)
+                  = (SELECT count(*) FROM req WHERE req.required > 0)
+            ON CONFLICT (inventory_id, type, sub_type_id)
+            DO UPDATE SET amount = i.amount + EXCLUDED.amount,
+                          version = EXCLUDED.version
+            RETURNING i.type, i.sub_type_id, i.amount, i.version
         )
-
-        existing_items = {
-            (item.inventory_id, item.type, item.sub_type_id): item
-            for item in fetched_items
-        }
-
-        for order in orders:
-            if item := existing_items.get(
-                (order.inventory_id, order.type, order.sub_type_id)
-            ):
-                item.amount += order.amount
-            else:
-                session.add(order)
+        SELECT CAST(type AS text) AS type, sub_type_id, amount, version
+        FROM updated
+        UNION ALL
+        SELECT CAST(type AS text), sub_type_id, amount, version
+        FROM produced
+        """
+    )
@@ -1,20 +1,98 @@
+import collections
 import logging
 from typing import cast
 
+from sqlalchemy import and_
+from sqlmodel import col, select
+
 from src.api.craft.elements.elements_constants import STARTING_ELEMENTS
-from src.api.inventory.inventory_schemas import InventoryItemTable, InventoryTable
+from src.api.inventory.inventory_schemas import (
+    InventoryItemTable,
+    InventorySnapshot,
+    InventoryTable,
+)
 from src.api.users.users_schemas import NewUserPayload
 from src.shared.base import BaseService
 from src.shared.event_bus import EventBus
 from src.shared.event_registry import UserTopics
 from src.shared.events import Event
+from src.shared.exceptions import NotFoundError
 from src.shared.observability.traces import async_traced_function
-from src.shared.uow import current_uow
+from src.shared.uow import UnitOfWork, current_uow
 
 logger = logging.getLogger("deus-vult.api.craft")
 
 
 class InventoryService(BaseService):
+    def __init__(self, uow: UnitOfWork) -> None:
+        super().__init__()
+        self.uow = uow
+
+    @async_traced_function
+    async def get_snapshot(
+        self, user_id: int, since_version: int | None = None
+    ) -> InventorySnapshot:
+        """
+        Returns the whole inventory, or only items changed after `since_version`.
+        """
+        async with self.uow.start(readonly=True):
+            snapshot = await self._read_snapshot(user_id, since_version)
+
+        if since_version is not None and snapshot.version < since_version:
+            # The replica lags behind a version the client has already seen
+            async with self.uow.start():
+                snapshot = await self._read_snapshot(user_id, since_version)
+
+        return snapshot
+
+    @staticmethod
+    async def _read_snapshot(
+        user_id: int, since_version: int | None
+    ) -> InventorySnapshot:
+        uow = current_uow.get()
+        session = await uow.get_session()
+
+        if since_version is None:
+            changed = col(InventoryItemTable.amount) > 0
+        else:
+            changed = col(InventoryItemTable.version) > since_version
+
+        # One statement, so the version and the items come from one snapshot
+        stmt = (
+            select(
+                InventoryTable.version,
+                InventoryItemTable.type,
+                InventoryItemTable.sub_type_id,
+                InventoryItemTable.amount,
+            )
+            .select_from(InventoryTable)
+            .outerjoin(
+                InventoryItemTable,
+                and_(
+                    col(InventoryItemTable.inventory_id) == InventoryTable.object_id,
+                    changed,
+                ),
+            )
+            .where(InventoryTable.user_id == user_id)
+            .order_by(col(InventoryItemTable.type), col(InventoryItemTable.sub_type_id))
+        )
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            raise NotFoundError("inventory")
+
+        items: dict[InventoryItemTable.ItemType, list[tuple[int, int]]] = (
+            collections.defaultdict(list)
+        )
+        for _, item_type, sub_type_id, amount in rows:
+            if item_type is not None:
+                items[item_type].append((sub_type_id, amount))
+
+        return InventorySnapshot(
+            version=rows[0].version,
+            full=since_version is None,
+            items=items,
+        )
+
     @EventBus.subscribe(UserTopics.USER_INIT)
     @async_traced_function
     async def on_user_init(self, event: Event) -> None:
@@ -0,0 +1,90 @@
+import hmac
+import logging
+from datetime import UTC, datetime, timedelta
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from src.shared.config import profiling_config, shared_config
+from src.shared.exceptions import BadRequestError
+from src.shared.observability.ch_utils import db_fetchall
+from src.shared.observability.profiler import build_flamegraph
+from src.shared.observability.schemas import ProfileStack
+from src.shared.observability.traces import async_traced_function
+
+logger = logging.getLogger("deus-vult.api.profiles")
+
+profiles_router = APIRouter(prefix="/profiles")
+
+MAX_WINDOW = timedelta(days=1)
+
+PROFILE_STACKS_QUERY = """
+SELECT stack, toUInt64(sum(samples)) AS samples
+FROM operation.profiles
+WHERE app_env = {app_env:String}
+  AND stage = {stage:String}
+  AND date >= {start:DateTime64(3)}
+  AND date < {end:DateTime64(3)}
+  AND ({thread_name:String} = '' OR thread_name = {thread_name:String})
+GROUP BY stack
+"""
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def validate_profiler_token(
+    x_profiler_token: Annotated[str | None, Header()] = None,
+) -> None:
+    """Profiles expose code internals, the endpoint needs its own token."""
+    token = profiling_config.token
+    if not token or not x_profiler_token:
+        raise HTTPException(status_code=403, detail="Profiler access denied")
+    if not hmac.compare_digest(token, x_profiler_token):
+        raise HTTPException(status_code=403, detail="Profiler access denied")
+
+
+@profiles_router.get(
+    "/flamegraph",
+    name="Flamegraph",
+    tags=["Observability"],
+    dependencies=[Depends(validate_profiler_token)],
+    response_model=None,
+)
+@async_traced_function
+async def get_flamegraph(
+    start: datetime,
+    end: datetime | None = None,
+    thread_name: Annotated[str, Query(max_length=128)] = "",
+    folded: bool = False,
+) -> dict[str, Any] | PlainTextResponse:
+    """
+    Profiler samples of a time window (at most a day) merged into a flamegraph
+    tree, or with `folded` as `stack count` lines for flamegraph.pl/speedscope.
+    """
+    # Naive timestamps are UTC, like the `date` column they are compared with
+    start = _as_utc(start)
+    end = _as_utc(end) if end else datetime.now(UTC)
+    if not start < end <= start + MAX_WINDOW:
+        raise BadRequestError("Window must be non-empty and at most a day long")
+
+    rows = await db_fetchall(
+        ProfileStack,
+        PROFILE_STACKS_QUERY,
+        {
+            "app_env": shared_config.app_env,
+            "stage": shared_config.stage,
+            "start": start,
+            "end": end,
+            "thread_name": thread_name,
+        },
+        raise_not_found=False,
+    )
+
+    if folded:
+        return PlainTextResponse(
+            "\n".join(f"{row.stack} {row.samples}" for row in rows)
+        )
+    return build_flamegraph(rows)
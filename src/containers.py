@@ -9,8 +9,11 @@ from pyrogram.client import Client
 
 from src.agents.glif.glif_service import GlifConfig, GlifService
 from src.api.craft.elements.elements_agent import ElementsAgent
+from src.api.craft.elements.elements_constants import STARTING_ELEMENTS
 from src.api.craft.elements.elements_service import ElementsService
+from src.api.craft.progress.progress_cache import DiscoveryCache
 from src.api.craft.progress.progress_service import ProgressService
+from src.api.craft.recipes.recipes_graph import RecipeGraph
 from src.api.craft.recipes.recipes_service import RecipesService
 from src.api.inventory.inventory_service import InventoryService
 from src.api.users.users_service import UsersService
@@ -25,6 +28,7 @@ from src.shared.base import BaseService
 from src.shared.base_llm import VertexConfig, VertexLLM
 from src.shared.cache import get_disk_cache
 from src.shared.config import PostgresConfig
+from src.shared.counters import CounterAggregator
 from src.shared.database import Database
 from src.shared.event_bus import EventBus
 from src.shared.observability.utils import configure_logging
@@ -49,10 +53,26 @@ class Container(containers.DeclarativeContainer):
         lambda db_instance: db_instance.session,  # type: ignore
         db_instance=db,
     )
+    # -- Replica Session (None without replicas, reads then join the primary) --
+    db_readonly_session_provider = providers.Factory[SessionFactory | None](
+        lambda db_instance: (  # type: ignore
+            db_instance.readonly_session  # type: ignore
+            if db_instance.replicas  # type: ignore
+            else None
+        ),
+        db_instance=db,
+    )
     # -- Unit of Work --
     uow_factory = providers.Factory(
         UnitOfWork,
         session_factory=db_session_provider,
+        readonly_session_factory=db_readonly_session_provider,
+    )
+
+    # -- Write-behind Counters --
+    counter_aggregator = providers.Singleton(
+        CounterAggregator,
+        session_factory=db_session_provider,
     )
 
     # -- Disk Cache --
@@ -66,10 +86,25 @@ class Container(containers.DeclarativeContainer):
     model_object = providers.Singleton(VertexLLM, config=model_config)
     elements_agent = providers.Singleton(ElementsAgent, provider=model_object)
 
+    # -- Recipe Graph --
+    recipe_graph = providers.Singleton(
+        RecipeGraph,
+        base_element_ids=[element.object_id for element in STARTING_ELEMENTS],
+    )
+
     # -- API Services --
-    recipes_service = providers.Singleton(RecipesService, uow=uow_factory)
-    progress_service = providers.Singleton(ProgressService, uow=uow_factory)
-    inventory_service = providers.Singleton(InventoryService)
+    recipes_service = providers.Singleton(
+        RecipesService, uow=uow_factory, event_bus=event_bus, graph=recipe_graph
+    )
+    discovery_cache = providers.Singleton(DiscoveryCache)
+    progress_service = providers.Singleton(
+        ProgressService,
+        uow=uow_factory,
+        counters=counter_aggregator,
+        discoveries=discovery_cache,
+        event_bus=event_bus,
+    )
+    inventory_service = providers.Singleton(InventoryService, uow=uow_factory)
     elements_service = providers.Singleton(
         ElementsService,
         uow=uow_factory,
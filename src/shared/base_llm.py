@@ -1,9 +1,13 @@
+import asyncio
 import logging
+import time
 from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
 from enum import Enum
 from typing import Any, Self
 
 import google.generativeai as genai
+import httpx
 import vertexai  # type: ignore
 import vertexai.generative_models  # type: ignore
 from google.generativeai.embedding import EmbeddingTaskType
@@ -20,6 +24,9 @@ from vertexai.language_models import (  # type: ignore
 )
 from vertexai.language_models._language_models import TextEmbedding  # type: ignore
 
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.timing import timed
+
 logger = logging.getLogger("deus-vult.base_llm")
 
 try:
@@ -34,6 +41,13 @@ except ImportError:
         "`google-auth` library not found. Google Cloud Project ID auto-detection will be disabled."  # noqa: E501
     )
 
+try:
+    import h2  # type: ignore # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 """
 ENUMS
@@ -63,6 +77,14 @@ class ProviderConfigBase(BaseSettings):
     default_temperature: float = Field(default=1.0, gt=0, lt=1.5)
     default_retries: int = Field(default=2, gt=0)
 
+    # Direct SDK calls (embeddings, raw generation)
+    max_concurrency: int = Field(default=8, gt=0)
+    request_timeout: float = Field(default=30.0, gt=0)
+    # Shared HTTP client of the agent model
+    max_connections: int = Field(default=32, gt=0)
+    # Warmup also connects the SDK client with a (billable) embedding call
+    warmup_embedding: bool = False
+
     class Config:
         extra = "ignore"
         env_file = ".env"
@@ -88,6 +110,13 @@ class VertexConfig(BaseSettings):
     region: str = Field(default="", description="The region")
     # constants
     dimensionality: int = Field(default=768, ge=1, le=768)
+    # Direct SDK calls (embeddings, raw generation)
+    max_concurrency: int = Field(default=8, gt=0)
+    request_timeout: float = Field(default=30.0, gt=0)
+    # Shared HTTP client of the agent model
+    max_connections: int = Field(default=32, gt=0)
+    # Warmup also connects the SDK client with a (billable) embedding call
+    warmup_embedding: bool = False
 
     class Config:
         env_prefix = "VERTEX_"
@@ -160,6 +189,78 @@ LLM PROVIDERS
 class ProviderBase(ABC):
     """Abstract base class for all provider implementations"""
 
+    kind: SupportedModels
+    metrics = MetricsStorage("llm")
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        request_timeout: float,
+        max_connections: int,
+        warmup_embedding: bool = False,
+    ) -> None:
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._timeout = request_timeout
+        self._warmup_embedding = warmup_embedding
+        # One pooled client for the provider's lifetime: connections, TLS
+        # sessions and (for Vertex) the auth token are reused across requests
+        self.http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(600, connect=5),
+        )
+
+    async def warmup(self) -> None:
+        """
+        Opens a connection to the model API and fetches credentials, so the
+        first request doesn't pay for them. The SDK client is only warmed up
+        with `warmup_embedding`, as it takes a real request. Never raises.
+        """
+        try:
+            async with asyncio.timeout(self._timeout):
+                # Any status will do, only the connection matters
+                await self.provider.client.head(self.provider.base_url)
+                if self._warmup_embedding:
+                    await self._warmup_sdk()
+        except Exception as e:
+            logger.warning("%s warmup failed: %s", self.kind.value, e)
+        else:
+            logger.info("%s warmed up", self.kind.value)
+
+    @abstractmethod
+    async def _warmup_sdk(self) -> None:
+        """Makes the SDK clients connect"""
+        pass
+
+    async def close(self) -> None:
+        await self.http_client.aclose()
+
+    async def _call[T](self, operation: str, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs an async SDK call under the provider's concurrency limit. The
+        timeout covers waiting for a slot as well as the call itself.
+        """
+        label = f".{self.kind.value}.{operation}"
+        start = time.perf_counter()
+        try:
+            with timed("llm"):
+                async with asyncio.timeout(self._timeout), self._limit:
+                    self.metrics.observe(
+                        "queue_time", time.perf_counter() - start, label=label
+                    )
+                    return await call()
+        except TimeoutError:
+            self.metrics.increment("timeouts", label=label)
+            raise
+        except Exception:
+            self.metrics.increment("errors", label=label)
+            raise
+        finally:
+            self.metrics.observe("time", time.perf_counter() - start, label=label)
+
     @property
     @abstractmethod
     def provider_name(self) -> KnownModelName:
@@ -192,8 +293,16 @@ class ProviderBase(ABC):
 class VertexLLM(ProviderBase):
     """Vertex LLM provider"""
 
+    kind = SupportedModels.VERTEX
+
     def __init__(self, config: VertexConfig):
         logger.debug("Initializing VertexLLM")
+        super().__init__(
+            config.max_concurrency,
+            config.request_timeout,
+            config.max_connections,
+            config.warmup_embedding,
+        )
         self.config = config
 
         self.embedding_model = TextEmbeddingModel.from_pretrained(
@@ -201,9 +310,17 @@ class VertexLLM(ProviderBase):
         )
         vertexai.init(project=self.config.project_id, location=self.config.region)
 
+        self._provider = GoogleVertexProvider(
+            project_id=self.config.project_id, http_client=self.http_client
+        )
+        self._model = GeminiModel("gemini-2.0-flash", provider=self._provider)
+        self.generative_model = vertexai.generative_models.GenerativeModel(
+            model_name="gemini-2.0-flash",
+        )
+
     @property
     def provider(self) -> Provider[Any]:
-        return GoogleVertexProvider(project_id=self.config.project_id)
+        return self._provider
 
     @property
     def provider_name(self) -> KnownModelName:
@@ -211,12 +328,12 @@ class VertexLLM(ProviderBase):
 
     @property
     def model(self) -> Model:
-        return GeminiModel("gemini-2.0-flash", provider=self.provider)
+        return self._model
+
+    async def _warmup_sdk(self) -> None:
+        await self.embed_content(["warmup"], "RETRIEVAL_QUERY")
 
     async def generate_multimodal(self, prompt: str, image: bytes):  # type: ignore
-        client = vertexai.generative_models.GenerativeModel(
-            model_name="gemini-2.0-flash",
-        )
         part_1_bytes = vertexai.generative_models.Image.from_bytes(image)
         part_1 = vertexai.generative_models.Part.from_image(part_1_bytes)
         part_2 = vertexai.generative_models.Part.from_text(prompt)
@@ -226,22 +343,20 @@ class VertexLLM(ProviderBase):
             parts=[part_1, part_2],
         )
 
-        response = client.generate_content(
-            contents=[content],
+        response = await self._call(
+            "generate_multimodal",
+            lambda: self.generative_model.generate_content_async(contents=[content]),
         )
         return response
 
     async def generate_text(self, prompt: str):
-        client = vertexai.generative_models.GenerativeModel(
-            model_name="gemini-2.0-flash",
+        content = vertexai.generative_models.Content(
+            role="user",
+            parts=[vertexai.generative_models.Part.from_text(prompt)],
         )
-        response = client.generate_content(
-            contents=[
-                vertexai.generative_models.Content(
-                    role="user",
-                    parts=[vertexai.generative_models.Part.from_text(prompt)],
-                )
-            ],
+        response = await self._call(
+            "generate_text",
+            lambda: self.generative_model.generate_content_async(contents=[content]),
         )
         return response
 
@@ -263,8 +378,11 @@ class VertexLLM(ProviderBase):
             TextEmbeddingInput(text, task_type) for text in content
         ]
 
-        embeddings = self.embedding_model.get_embeddings(
-            texts=inputs, output_dimensionality=self.config.dimensionality
+        embeddings = await self._call(
+            "embed_content",
+            lambda: self.embedding_model.get_embeddings_async(
+                texts=inputs, output_dimensionality=self.config.dimensionality
+            ),
         )
         try:
             assert embeddings
@@ -286,19 +404,37 @@ class VertexLLM(ProviderBase):
 class GeminiLLM(ProviderBase):
     """Gemini LLM provider"""
 
+    kind = SupportedModels.GEMINI
+
     def __init__(self, config: GeminiConfig):
+        super().__init__(
+            config.max_concurrency,
+            config.request_timeout,
+            config.max_connections,
+            config.warmup_embedding,
+        )
         self.config = config
 
         self.embedding_model = f"models/{config.embedding_model_name}"
         genai.configure(api_key=config.api_key)  # type: ignore
 
+        self._provider = GoogleGLAProvider(
+            api_key=self.config.api_key, http_client=self.http_client
+        )
+        self._model = GeminiModel(
+            model_name=self.config.model_name, provider=self._provider
+        )
+
     @property
     def provider(self) -> Provider[Any]:
-        return GoogleGLAProvider(api_key=self.config.api_key)
+        return self._provider
 
     @property
     def model(self) -> Model:
-        return GeminiModel(model_name=self.config.model_name, provider=self.provider)
+        return self._model
+
+    async def _warmup_sdk(self) -> None:
+        await self.embed_content("warmup", "RETRIEVAL_QUERY")
 
     async def embed_content(
         self, content: str | list[str], task_type: EmbeddingTaskType | str | None = None
@@ -309,10 +445,13 @@ class GeminiLLM(ProviderBase):
             except ValueError as e:
                 raise ValueError(f"Invalid task type: {task_type}") from e
 
-        response = genai.embed_content(  # type: ignore
-            model=self.embedding_model,
-            content=content,
-            task_type=task_type,
+        response = await self._call(
+            "embed_content",
+            lambda: genai.embed_content_async(  # type: ignore
+                model=self.embedding_model,
+                content=content,
+                task_type=task_type,
+            ),
         )
         return response["embedding"]
 
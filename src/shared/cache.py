@@ -11,6 +11,7 @@ import orjson
 from diskcache import Cache  # type: ignore
 
 from src.shared.config import shared_config
+from src.shared.observability.timing import timed
 
 logger = logging.getLogger("deus-vult.cache")
 
@@ -44,7 +45,8 @@ def get_disk_cache() -> Cache:
             )
             raise  # Re-raise the exception as caching won't work
 
-        _cache_instance = Cache(str(cache_dir))
+        # Tag index makes `evict(tag)` an indexed lookup instead of a full scan
+        _cache_instance = Cache(str(cache_dir), tag_index=True)
         assert _cache_instance is not None, "Failed to create disk cache instance"
         logger.info("Disk cache instance created successfully.")
     return _cache_instance
@@ -201,24 +203,13 @@ def generate_cache_key(  # noqa: C901
         AttributeError: If a nested attribute in a key_param path doesn't exist.
     """
     # Base key includes module and function name
-    base_key_parts = [func.__module__, func.__name__]
+    base_key_parts = [cache_key_prefix(func)]
 
     if not key_params:  # Handle None or empty list
-        return ":".join(base_key_parts)
+        return base_key_parts[0]
 
     # --- Combine args and kwargs into a single arguments dictionary ---
-    try:
-        sig = inspect.signature(func)  # type: ignore
-        bound_args = sig.bind(*args, **kwargs)  # type: ignore
-        bound_args.apply_defaults()  # type: ignore
-        all_args = bound_args.arguments  # type: ignore
-    except TypeError as e:
-        logger.error(
-            f"Failed to bind arguments for {func.__name__}: {e}. "
-            + "Caching might be unreliable."
-        )
-        # Fallback: Use only kwargs (less robust but might work for simple cases)
-        all_args = kwargs.copy()
+    all_args = _bind_arguments(func, args, kwargs)
 
     # --- Process specified key parameters ---
     param_key_parts: list[str] = []
@@ -301,6 +292,109 @@ def generate_cache_key(  # noqa: C901
     return full_key
 
 
+def _bind_arguments(
+    func: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> dict[str, Any]:
+    """Combine positional and keyword arguments into a single name -> value dict."""
+    try:
+        sig = inspect.signature(func)  # type: ignore
+        bound_args = sig.bind(*args, **kwargs)  # type: ignore
+        bound_args.apply_defaults()  # type: ignore
+        return dict(bound_args.arguments)  # type: ignore
+    except TypeError as e:
+        logger.error(
+            f"Failed to bind arguments for {func.__name__}: {e}. "
+            + "Caching might be unreliable."
+        )
+        # Fallback: Use only kwargs (less robust but might work for simple cases)
+        return kwargs.copy()
+
+
+def generate_cache_tag(
+    func: Callable[..., Any],
+    tag: str | None,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> str | None:
+    """
+    Resolve a tag template against the function arguments.
+
+    Templates use `str.format` syntax, so nested attributes are supported:
+    `"user:{user.object_id}"` resolves to `"user:1234"`.
+
+    Raises:
+        ValueError: If the template references a missing argument or attribute.
+    """
+    if not tag:
+        return None
+
+    all_args = _bind_arguments(func, args, kwargs)
+    try:
+        return tag.format(**all_args)
+    except (KeyError, AttributeError, IndexError) as e:
+        raise ValueError(
+            f"Failed to resolve cache tag '{tag}' for {func.__name__}: {e}"
+        ) from e
+
+
+def cache_key_prefix(func: Callable[..., Any]) -> str:
+    """Returns the key prefix shared by all cache entries of a function."""
+    return ":".join([func.__module__, func.__name__])
+
+
+def invalidate(tag: str) -> int:
+    """
+    Evicts every cache entry carrying the given tag.
+
+    Returns:
+        The number of evicted entries.
+    """
+    if not shared_config.use_disk_cache:
+        return 0
+
+    evicted = int(get_disk_cache().evict(tag))  # type: ignore
+    logger.debug("Evicted %s cache entries with tag: %s", evicted, tag)
+    return evicted
+
+
+def invalidate_prefix(prefix: str | Callable[..., Any]) -> int:
+    """
+    Evicts every cache entry whose key starts with the given prefix.
+
+    Scans every key in the cache, so keep it off request paths and prefer
+    `invalidate` with a tag where entries can carry one.
+
+    Args:
+        prefix: A raw key prefix (e.g. `module:func:param=value`) or a cached
+                function, in which case all of its entries are evicted.
+
+    Returns:
+        The number of evicted entries.
+    """
+    if not shared_config.use_disk_cache:
+        return 0
+
+    if callable(prefix):
+        prefix = cache_key_prefix(prefix)
+
+    cache = get_disk_cache()
+    evicted = 0
+    # Snapshot keys first, deleting while iterating is not safe in diskcache
+    keys = [
+        key
+        for key in cache.iterkeys()  # type: ignore
+        if str(key).startswith(prefix)  # type: ignore
+    ]
+    for key in keys:
+        if cache.delete(key):  # type: ignore
+            evicted += 1
+
+    logger.debug("Evicted %s cache entries with prefix: %s", evicted, prefix)
+    return evicted
+
+
 def _get_nested_attr(obj: Any, attr_path: str) -> Any:
     """Safely retrieve a nested attribute using dot notation."""
     attributes = attr_path.split(".")
@@ -322,6 +416,7 @@ def _get_nested_attr(obj: Any, attr_path: str) -> Any:
 def disk_cache(  # noqa: C901
     key_params: list[str] | None = None,
     ttl: int = 3600,
+    tag: str | None = None,
 ) -> Callable[[F], F]:
     """
     Cache decorator using diskcache, supporting multiple key parameters.
@@ -331,6 +426,8 @@ def disk_cache(  # noqa: C901
                     to include in the cache key. If None or empty, only the
                     function name/module is used. Order doesn't matter.
         ttl: Time to live for cache entries in seconds.
+        tag: Optional tag template (e.g. `"user:{user.object_id}"`) attached
+             to every entry, so related entries can be dropped with `invalidate`.
 
     Returns:
         Decorated function with caching.
@@ -352,10 +449,12 @@ def disk_cache(  # noqa: C901
                 cache_key = generate_cache_key(
                     func, key_params, args, kwargs
                 )  # Pass args/kwargs
+                cache_tag = generate_cache_tag(func, tag, args, kwargs)
                 cache = get_disk_cache()
 
                 # --- Cache Read ---
-                cached_data = cache.get(cache_key)  # type: ignore
+                with timed("cache"):
+                    cached_data = cache.get(cache_key)  # type: ignore
                 if cached_data is not None:
                     logger.debug("Cache hit for key: %s", cache_key)
                     try:
@@ -379,7 +478,11 @@ def disk_cache(  # noqa: C901
                 # --- Cache Write ---
                 try:
                     serialized_result = serialize_value(result)
-                    if not cache.set(cache_key, serialized_result, expire=ttl):  # type: ignore
+                    with timed("cache"):
+                        stored = cache.set(  # type: ignore
+                            cache_key, serialized_result, expire=ttl, tag=cache_tag
+                        )
+                    if not stored:
                         logger.warning("Failed to set cache for key: %s", cache_key)
                 except Exception as ser_err:
                     logger.error(
@@ -414,10 +517,12 @@ def disk_cache(  # noqa: C901
             # --- Sync version: Logic mirrors async_wrapper ---
             try:
                 cache_key = generate_cache_key(func, key_params, args, kwargs)
+                cache_tag = generate_cache_tag(func, tag, args, kwargs)
                 cache = get_disk_cache()
 
                 # Cache Read
-                cached_data = cache.get(cache_key)  # type: ignore
+                with timed("cache"):
+                    cached_data = cache.get(cache_key)  # type: ignore
                 if cached_data is not None:
                     logger.debug("Cache hit for key: %s", cache_key)
                     try:
@@ -437,7 +542,11 @@ def disk_cache(  # noqa: C901
                 # Cache Write
                 try:
                     serialized_result = serialize_value(result)
-                    if not cache.set(cache_key, serialized_result, expire=ttl):  # type: ignore
+                    with timed("cache"):
+                        stored = cache.set(  # type: ignore
+                            cache_key, serialized_result, expire=ttl, tag=cache_tag
+                        )
+                    if not stored:
                         logger.warning("Failed to set cache for key: %s", cache_key)
                 except Exception as ser_err:
                     logger.error(
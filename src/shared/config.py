@@ -169,11 +169,18 @@ class SharedConfig(BaseConfig):
     debug_mode: bool = True
     use_disk_cache: bool = True
 
-    log_level: int = logging.DEBUG if debug_mode else logging.INFO
+    # Defaults to DEBUG in debug mode and INFO otherwise
+    log_level: int | None = None
 
     class Config(BaseConfig.Config):
         env_prefix = "GLOBAL_"
 
+    @property
+    def effective_log_level(self) -> int:
+        if self.log_level is not None:
+            return self.log_level
+        return logging.DEBUG if self.debug_mode else logging.INFO
+
     @property
     def root_path(self) -> str:
         # Local dev
@@ -221,6 +228,50 @@ class PostgresConfig(BaseConfig):
         "local", validation_alias="POSTGRES_APP_ENGINE"
     )
 
+    # --- Connection pool ---
+    pool_size: int = Field(10, ge=1, validation_alias="POSTGRES_POOL_SIZE")
+    max_overflow: int = Field(10, ge=0, validation_alias="POSTGRES_MAX_OVERFLOW")
+    pool_timeout: float = Field(10.0, gt=0, validation_alias="POSTGRES_POOL_TIMEOUT")
+    pool_recycle: int = Field(3600, validation_alias="POSTGRES_POOL_RECYCLE")
+    # Pings on every checkout; costs one round-trip per session
+    pool_pre_ping: bool = Field(False, validation_alias="POSTGRES_POOL_PRE_PING")
+    # Pings only connections idle for longer than N seconds (None to disable)
+    pool_pre_ping_idle: float | None = Field(
+        30.0, validation_alias="POSTGRES_POOL_PRE_PING_IDLE"
+    )
+    # asyncpg statement caches (SQLAlchemy adapter + asyncpg driver)
+    prepared_statement_cache_size: int = Field(
+        500, ge=0, validation_alias="POSTGRES_PREPARED_STATEMENT_CACHE_SIZE"
+    )
+    statement_cache_size: int = Field(
+        500, ge=0, validation_alias="POSTGRES_STATEMENT_CACHE_SIZE"
+    )
+
+    # --- Query accounting ---
+    # Identical statements per unit of work from which an N+1 is reported
+    n_plus_one_threshold: int = Field(
+        10, ge=2, validation_alias="POSTGRES_N_PLUS_ONE_THRESHOLD"
+    )
+    # Raise instead of reporting, for tests
+    query_strict_mode: bool = Field(False, validation_alias="POSTGRES_QUERY_STRICT")
+
+    # --- Read replicas ---
+    # "host[:port]" entries for TCP, Cloud SQL instance connection names on Google
+    replica_hosts: list[str] = Field(
+        default_factory=list, validation_alias="POSTGRES_REPLICA_HOSTS"
+    )
+    # Replicas lagging behind by more than this are skipped
+    replica_max_lag: float = Field(
+        5.0, ge=0, validation_alias="POSTGRES_REPLICA_MAX_LAG"
+    )
+    replica_lag_check_interval: float = Field(
+        5.0, gt=0, validation_alias="POSTGRES_REPLICA_LAG_CHECK_INTERVAL"
+    )
+    # The lag probe runs on the request path; a slower replica counts as lagging
+    replica_lag_probe_timeout: float = Field(
+        0.5, gt=0, validation_alias="POSTGRES_REPLICA_LAG_PROBE_TIMEOUT"
+    )
+
     class Config(BaseConfig.Config):
         env_prefix = "POSTGRES_"
 
@@ -230,14 +281,17 @@ class PostgresConfig(BaseConfig):
         """Fetches the password from Secret Manager or local environment."""
         return self._resolve_secret(self.password_local, self.password_secret_id)
 
-    def _build_sqlalchemy_url(self, use_placeholder_password: bool = False) -> URL:
+    def _build_sqlalchemy_url(
+        self, use_placeholder_password: bool = False, replica: str | None = None
+    ) -> URL:
         """Internal helper to construct the SQLAlchemy URL object."""
 
         password_to_use = "XXXXXX" if use_placeholder_password else self.password
+        instance_connection_name = replica or self.instance_connection_name
 
-        if self.app_engine == "google" and self.instance_connection_name:
+        if self.app_engine == "google" and instance_connection_name:
             # App Engine Standard: Connect via Unix socket
-            socket_dir = f"/cloudsql/{self.instance_connection_name}"
+            socket_dir = f"/cloudsql/{instance_connection_name}"
             if not use_placeholder_password:
                 logger.debug(
                     f"App Engine. Configuring connection via Unix socket: {socket_dir}"
@@ -252,15 +306,20 @@ class PostgresConfig(BaseConfig):
             )
         else:
             # Local Development or other environments: Connect via TCP/IP
+            host, port = self.host, self.port
+            if replica is not None:
+                host, _, replica_port = replica.partition(":")
+                port = int(replica_port) if replica_port else self.port
+
             if not use_placeholder_password:
-                logger.debug("Local. Using TCP: %s:%s", self.host, self.port)
+                logger.debug("Local. Using TCP: %s:%s", host, port)
 
             sqlalchemy_url = URL.create(
                 drivername="postgresql+asyncpg",
                 username=self.user,
                 password=password_to_use,  # Use determined password
-                host=self.host,
-                port=self.port,
+                host=host,
+                port=port,
                 database=self.db_name,
             )
         return sqlalchemy_url
@@ -278,6 +337,21 @@ class PostgresConfig(BaseConfig):
         url_obj = self._build_sqlalchemy_url(use_placeholder_password=True)
         return url_obj.render_as_string(hide_password=False)
 
+    @property
+    def replica_db_urls(self) -> list[tuple[str, str]]:
+        """Generates `(url, safe_url)` pairs for every configured read replica."""
+        return [
+            (
+                self._build_sqlalchemy_url(replica=replica).render_as_string(
+                    hide_password=False
+                ),
+                self._build_sqlalchemy_url(
+                    use_placeholder_password=True, replica=replica
+                ).render_as_string(hide_password=False),
+            )
+            for replica in self.replica_hosts
+        ]
+
 
 class ClickHouseConfig(BaseConfig):
     """ClickHouse configuration, required for observability."""
@@ -297,6 +371,22 @@ class ClickHouseConfig(BaseConfig):
     )
     http_num_pools: int = Field(4, validation_alias="CLICKHOUSE_HTTP_NUM_POOLS")
 
+    # Inserter: a flush starts early once a table has this many rows / bytes
+    inserter_flush_rows: int = Field(
+        20_000, validation_alias="CLICKHOUSE_INSERTER_FLUSH_ROWS"
+    )
+    inserter_flush_bytes: int = Field(
+        8 * 1024 * 1024, validation_alias="CLICKHOUSE_INSERTER_FLUSH_BYTES"
+    )
+    # Failed batches are spilled here and replayed once ClickHouse is back;
+    # created owner-only, spilling is disabled if other users can write to it
+    inserter_spill_dir: str = Field(
+        "/tmp/deus-vult/ch-spill", validation_alias="CLICKHOUSE_INSERTER_SPILL_DIR"
+    )
+    inserter_spill_max_bytes: int = Field(
+        256 * 1024 * 1024, validation_alias="CLICKHOUSE_INSERTER_SPILL_MAX_BYTES"
+    )
+
     # --- Access ---
 
     # For local dev
@@ -318,3 +408,84 @@ class ClickHouseConfig(BaseConfig):
 
 # noinspection PyArgumentList
 clickhouse_config = ClickHouseConfig()  # type: ignore
+
+
+class TracingConfig(BaseConfig):
+    """Span sampling, applied when traces are exported to ClickHouse."""
+
+    # Off turns every traced function into a plain call
+    enabled: bool = Field(True, validation_alias="TRACING_ENABLED")
+    # Share of traces kept, decided once per trace at its root span
+    sample_ratio: float = Field(0.1, validation_alias="TRACING_SAMPLE_RATIO")
+    # Root span name prefix -> ratio, e.g. `{"Inserter.flush": 0}`
+    sample_overrides: dict[str, float] = Field(
+        default_factory=dict, validation_alias="TRACING_SAMPLE_OVERRIDES"
+    )
+    # Unsampled traces are still kept when they fail or are slower than this
+    sample_errors: bool = Field(True, validation_alias="TRACING_SAMPLE_ERRORS")
+    slow_trace_ms: int = Field(1000, validation_alias="TRACING_SLOW_TRACE_MS")
+    max_pending_traces: int = Field(
+        10_000, validation_alias="TRACING_MAX_PENDING_TRACES"
+    )
+
+    class Config(BaseConfig.Config):
+        env_prefix = "TRACING_"
+
+
+# noinspection PyArgumentList
+tracing_config = TracingConfig()  # type: ignore
+
+
+class LoggingConfig(BaseConfig):
+    """Log pipeline limits, applied before records are queued."""
+
+    # Logger name prefix -> share of records below WARNING that are kept
+    sample_rates: dict[str, float] = Field(
+        default_factory=dict, validation_alias="LOGGING_SAMPLE_RATES"
+    )
+    # Token bucket per logger, applied to every level
+    rate_limit_per_second: float = Field(
+        200.0, validation_alias="LOGGING_RATE_LIMIT_PER_SECOND"
+    )
+    rate_limit_burst: int = Field(1000, validation_alias="LOGGING_RATE_LIMIT_BURST")
+    queue_size: int = Field(100_000, validation_alias="LOGGING_QUEUE_SIZE")
+
+    class Config(BaseConfig.Config):
+        env_prefix = "LOGGING_"
+
+
+# noinspection PyArgumentList
+logging_config = LoggingConfig()  # type: ignore
+
+
+class ProfilingConfig(BaseConfig):
+    """In-process sampling profiler, off unless enabled."""
+
+    enabled: bool = Field(False, validation_alias="PROFILER_ENABLED")
+    # Samples per second; 19 Hz avoids lockstep with periodic work
+    sample_rate: float = Field(19.0, gt=0, validation_alias="PROFILER_SAMPLE_RATE")
+    # Seconds aggregated into one row per distinct stack
+    flush_interval: int = Field(60, validation_alias="PROFILER_FLUSH_INTERVAL")
+    max_depth: int = Field(96, validation_alias="PROFILER_MAX_DEPTH")
+
+    # --- Access to the flamegraph endpoint, disabled without a token ---
+
+    # For local dev
+    token_local: str = Field("", validation_alias="PROFILER_TOKEN_LOCAL")
+    # For Google App Engine
+    token_secret_id: str | None = Field(
+        None, validation_alias="PROFILER_TOKEN_SECRET_ID"
+    )
+
+    class Config(BaseConfig.Config):
+        env_prefix = "PROFILER_"
+
+    @computed_field(return_type=str)  # type: ignore
+    @property
+    def token(self) -> str:
+        """Fetches the endpoint token from Secret Manager or local environment."""
+        return self._resolve_secret(self.token_local, self.token_secret_id)
+
+
+# noinspection PyArgumentList
+profiling_config = ProfilingConfig()  # type: ignore
@@ -0,0 +1,175 @@
+"""
+Write-behind aggregation for hot counters.
+
+Increments are accumulated in memory and applied to the database in batches,
+so hot rows are not updated (and locked) once per request.
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+
+from sqlalchemy import BigInteger, Integer, Table, column, update, values
+from sqlmodel import SQLModel
+
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.time import Timer
+from src.shared.types import SessionFactory
+from src.shared.worker import BaseWorker
+
+# (table name, row object_id, column name)
+CounterKey = tuple[str, int, str]
+
+
+class CounterAggregator(BaseWorker):
+    """
+    Accumulates counter deltas keyed by `(table, object_id, column)` and
+    periodically applies them, one `UPDATE ... FROM (VALUES ...)` per table.
+
+    Example usage:
+
+    counters.increment(RecipeTable, recipe.object_id, "discovered_count")
+    """
+
+    INTERVAL = 5
+    # Upper bound of the delay between failed flushes
+    MAX_BACKOFF = 60
+    SHUTDOWN_ATTEMPTS = 3
+
+    logger = logging.getLogger("deus-vult.counters")
+    metrics = MetricsStorage("counters")
+
+    def __init__(self, session_factory: SessionFactory) -> None:
+        super().__init__()
+        self._session_factory = session_factory
+        self._deltas: collections.Counter[CounterKey] = collections.Counter()
+        self._lock = asyncio.Lock()
+        self._failures = 0
+
+    def increment(
+        self,
+        table: type[SQLModel] | str,
+        object_id: int,
+        column: str,
+        delta: int = 1,
+    ) -> None:
+        """Schedules `column += delta` for the row with the given object_id."""
+        table_name = table if isinstance(table, str) else str(table.__tablename__)
+        self._deltas[(table_name, object_id, column)] += delta
+
+    @property
+    def pending(self) -> int:
+        return len(self._deltas)
+
+    @staticmethod
+    def _group_deltas(
+        deltas: collections.Counter[CounterKey],
+    ) -> list[tuple[Table, list[str], list[tuple[int, ...]]]]:
+        """Groups deltas per table into `(table, columns, rows)` batches."""
+        per_table: dict[str, dict[int, dict[str, int]]] = collections.defaultdict(
+            lambda: collections.defaultdict(dict)
+        )
+        for (table_name, object_id, column_name), delta in deltas.items():
+            if delta:
+                per_table[table_name][object_id][column_name] = delta
+
+        batches: list[tuple[Table, list[str], list[tuple[int, ...]]]] = []
+        for table_name, rows in per_table.items():
+            table = SQLModel.metadata.tables[table_name]
+            columns = sorted({name for row in rows.values() for name in row})
+            # Sorted ids give every instance the same row lock order
+            data = [
+                (object_id, *(row.get(name, 0) for name in columns))
+                for object_id, row in sorted(rows.items())
+            ]
+            batches.append((table, columns, data))
+
+        return batches
+
+    async def _apply(self, deltas: collections.Counter[CounterKey]) -> None:
+        async with self._session_factory() as session:
+            for table, columns, data in self._group_deltas(deltas):
+                deltas_table = values(
+                    column("object_id", Integer),
+                    *(column(f"delta_{name}", BigInteger) for name in columns),
+                    name="deltas",
+                ).data(data)
+
+                stmt = (
+                    update(table)
+                    .where(table.c.object_id == deltas_table.c.object_id)
+                    .values(
+                        {
+                            name: table.c[name] + deltas_table.c[f"delta_{name}"]
+                            for name in columns
+                        }
+                    )
+                )
+                await session.execute(stmt)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._deltas:
+                return
+
+            deltas, self._deltas = self._deltas, collections.Counter()
+            try:
+                with Timer() as t:
+                    await self._apply(deltas)
+            except BaseException:
+                # Keep the deltas for the next attempt, cancellation included
+                self._deltas.update(deltas)
+                raise
+
+        if self.metrics:
+            self.metrics.increment("flushed", len(deltas))
+            self.metrics.observe("flush_time", t.total)
+
+    async def run_once(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            # Deltas are kept by `flush`; back off instead of hammering the
+            # database while it is unavailable
+            self._failures += 1
+            backoff = min(self.INTERVAL * 2**self._failures, self.MAX_BACKOFF)
+            self.logger.exception(
+                "Counter flush failed, keeping %s deltas, retrying in %ss",
+                self.pending,
+                backoff,
+            )
+            if self.metrics:
+                self.metrics.increment("failed")
+            await asyncio.sleep(backoff)
+        else:
+            self._failures = 0
+        finally:
+            if self.metrics:
+                self.metrics.set("pending", self.pending)
+
+    async def shutdown(self) -> None:
+        """Stops the loop and makes a last, retried attempt to flush."""
+        self.stop()
+        if self._task is not None:
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+        for attempt in range(1, self.SHUTDOWN_ATTEMPTS + 1):
+            try:
+                await self.flush()
+                return
+            except Exception:
+                self.logger.exception(
+                    "Counter flush on shutdown failed (attempt %s)", attempt
+                )
+                await asyncio.sleep(0.5 * attempt)
+
+        if self._deltas:
+            self.logger.error(
+                "Dropping %s pending counter deltas: %s",
+                len(self._deltas),
+                dict(self._deltas),
+            )
+            if self.metrics:
+                self.metrics.increment("lost", len(self._deltas))
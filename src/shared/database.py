@@ -1,17 +1,339 @@
+import asyncio
+import itertools
 import logging
-from collections.abc import AsyncGenerator
+import random
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from contextlib import asynccontextmanager
+from typing import Any
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPIConnection
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    ConnectionPoolEntry,
+    PoolProxiedConnection,
+)
 from sqlalchemy.sql import text
 from sqlmodel import SQLModel
 
 from src.shared.config import PostgresConfig
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.queries import current_query_stats
+from src.shared.observability.timing import add_timing
 
 logger = logging.getLogger("deus-vult.database")
 
+_CHECKED_IN_AT = "checked_in_at"
+# `Session.info` flag set once a session issued INSERT/UPDATE/DELETE
+WRITES_INFO_KEY = "has_writes"
+# `Session.info` list of callbacks to run once the transaction commits
+AFTER_COMMIT_INFO_KEY = "after_commit"
+
+# SQLSTATEs after which the failed statement can simply be run again
+CONTENTION_ERRORS = {
+    "40P01": "deadlock",
+    "40001": "serialization_failure",
+    "55P03": "lock_not_available",
+}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports checkout wait time and timeouts."""
+
+    metrics = MetricsStorage("database.pool")
+    # Distinguishes the primary pool ("") from replica pools in metrics
+    label = ""
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.increment("timeout", label=self.label)
+            raise
+        finally:
+            self.metrics.observe(
+                "checkout_wait", time.perf_counter() - start, label=self.label
+            )
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        # Once the pool kept or discarded the connection, so overflow is current
+        self.report_usage()
+
+    def report_usage(self) -> None:
+        self.metrics.set("in_use", self.checkedout(), label=self.label)
+        self.metrics.set("overflow", max(self.overflow(), 0), label=self.label)
+        capacity = self.size() + max(self._max_overflow, 0)
+        self.metrics.set(
+            "utilization", self.checkedout() / max(capacity, 1), label=self.label
+        )
+
+
+def _install_pool_listeners(
+    engine: AsyncEngine, pre_ping_idle: float | None, label: str = ""
+) -> None:
+    """Attaches telemetry and (optionally) idle-only pre-ping to the pool."""
+    pool = engine.sync_engine.pool
+    dialect = engine.sync_engine.dialect
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.label = label
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(  # pyright: ignore[reportUnusedFunction]
+        dbapi_connection: DBAPIConnection,
+        connection_record: ConnectionPoolEntry,
+        _connection_proxy: PoolProxiedConnection,
+    ) -> None:
+        checked_in_at: float | None = connection_record.info.get(_CHECKED_IN_AT)
+        if (
+            pre_ping_idle is not None
+            and checked_in_at is not None
+            and time.monotonic() - checked_in_at > pre_ping_idle
+        ):
+            try:
+                dialect.do_ping(dbapi_connection)
+            except Exception as e:
+                InstrumentedQueuePool.metrics.increment("stale", label=label)
+                logger.warning("Discarding stale pooled connection: %s", e)
+                # Tells the pool to retry the checkout with a fresh connection
+                raise exc.DisconnectionError() from e
+
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.report_usage()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(  # pyright: ignore[reportUnusedFunction]
+        _dbapi_connection: DBAPIConnection | None,
+        connection_record: ConnectionPoolEntry,
+    ) -> None:
+        connection_record.info[_CHECKED_IN_AT] = time.monotonic()
+
+
+def _install_query_listeners(
+    engine: AsyncEngine, n_plus_one_threshold: int, strict: bool
+) -> None:
+    """Counts statements, rows and time into the context's `QueryStats`."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _on_before_cursor_execute(  # pyright: ignore[reportUnusedFunction]
+        _conn: Connection,
+        _cursor: Any,
+        _statement: str,
+        _parameters: Any,
+        context: ExecutionContext,
+        _executemany: bool,
+    ) -> None:
+        context._query_started_at = time.perf_counter()  # type: ignore
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _on_after_cursor_execute(  # pyright: ignore[reportUnusedFunction]
+        _conn: Connection,
+        cursor: Any,
+        statement: str,
+        _parameters: Any,
+        context: ExecutionContext,
+        _executemany: bool,
+    ) -> None:
+        elapsed = time.perf_counter() - context._query_started_at  # type: ignore
+        # Greenlets inherit the task's context, so these land on the request
+        add_timing("db", elapsed)
+
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(
+                statement,
+                max(cursor.rowcount, 0),
+                elapsed,
+                threshold=n_plus_one_threshold,
+                strict=strict,
+            )
+
+
+def _engine_kwargs(db_config: PostgresConfig) -> dict[str, Any]:
+    """Translates `PostgresConfig` into `create_async_engine` arguments."""
+    return {
+        "echo": False,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": db_config.pool_size,
+        "max_overflow": db_config.max_overflow,
+        "pool_timeout": db_config.pool_timeout,
+        "pool_recycle": db_config.pool_recycle,
+        "pool_pre_ping": db_config.pool_pre_ping,
+        "connect_args": {
+            "prepared_statement_cache_size": db_config.prepared_statement_cache_size,
+            "statement_cache_size": db_config.statement_cache_size,
+        },
+    }
+
+
+class TrackedSession(Session):
+    """Session that remembers whether it has written anything."""
+
+
+@event.listens_for(TrackedSession, "after_flush")
+def _on_after_flush(  # pyright: ignore[reportUnusedFunction]
+    session: Session, _flush_context: Any
+) -> None:
+    if (
+        session.new
+        or session.deleted
+        or any(session.is_modified(obj) for obj in session.dirty)
+    ):
+        session.info[WRITES_INFO_KEY] = True
+
+
+@event.listens_for(TrackedSession, "do_orm_execute")
+def _on_orm_execute(  # pyright: ignore[reportUnusedFunction]
+    orm_execute_state: ORMExecuteState,
+) -> None:
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info[WRITES_INFO_KEY] = True
+
+
+def call_after_commit(
+    session: AsyncSession | Session, callback: Callable[[], None]
+) -> None:
+    """
+    Runs `callback` once the session's outermost transaction commits; it is
+    dropped if the transaction rolls back.
+    """
+    session.info.setdefault(AFTER_COMMIT_INFO_KEY, []).append(callback)
+
+
+@event.listens_for(TrackedSession, "after_commit")
+def _on_after_commit(  # pyright: ignore[reportUnusedFunction]
+    session: Session,
+) -> None:
+    for callback in session.info.pop(AFTER_COMMIT_INFO_KEY, ()):
+        try:
+            callback()
+        except Exception:
+            logger.exception("After-commit callback %s failed", callback)
+
+
+@event.listens_for(TrackedSession, "after_transaction_end")
+def _on_after_transaction_end(  # pyright: ignore[reportUnusedFunction]
+    session: Session, transaction: SessionTransaction
+) -> None:
+    if transaction.parent is None:
+        session.info.pop(AFTER_COMMIT_INFO_KEY, None)
+
+
+def contention_error(error: BaseException) -> str | None:
+    """Returns the kind of lock contention behind a database error, if any."""
+    if not isinstance(error, exc.DBAPIError):
+        return None
+
+    sqlstate = getattr(error.orig, "sqlstate", None) or getattr(
+        error.orig, "pgcode", None
+    )
+    return CONTENTION_ERRORS.get(sqlstate)  # type: ignore
+
+
+async def retry_on_contention[T](
+    session: AsyncSession,
+    operation: Callable[[], Awaitable[T]],
+    *,
+    attempts: int = 4,
+    base_delay: float = 0.02,
+    max_delay: float = 0.5,
+    metrics: MetricsStorage | None = None,
+    label: str = "",
+) -> T:
+    """
+    Runs `operation` inside a SAVEPOINT, re-running it after deadlocks,
+    serialization failures and NOWAIT lock conflicts with full-jitter
+    exponential backoff. The last error is re-raised once attempts run out.
+
+    Any other exception rolls the savepoint back and propagates, so the
+    operation either applies completely or not at all. Under SERIALIZABLE,
+    serialization failures can only be fixed by retrying the whole transaction.
+    """
+    attempt = 1
+    while True:
+        try:
+            async with session.begin_nested():
+                return await operation()
+        except exc.DBAPIError as e:
+            kind = contention_error(e)
+            if kind is None:
+                raise
+
+            if metrics:
+                metrics.increment(kind, label=label)
+            if attempt >= attempts:
+                if metrics:
+                    metrics.increment("exhausted", label=label)
+                raise
+
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            logger.info("Retrying after %s in %.3fs (attempt %s)", kind, delay, attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class ReplicaPool:
+    """A read replica engine with a cached replication lag."""
+
+    LAG_QUERY = text(
+        "SELECT CASE "
+        "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE("
+        "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0"
+        ") END"
+    )
+
+    def __init__(self, engine: AsyncEngine, safe_url: str) -> None:
+        self.engine = engine
+        self.safe_url = safe_url
+        self.async_session = async_sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.lag: float = 0.0
+        self.lag_checked_at: float | None = None
+
+    async def refresh_lag(self, check_interval: float, timeout: float) -> float:
+        """
+        Re-reads replication lag if the cached value is older than interval.
+
+        A replica that doesn't answer within `timeout` is treated as lagging
+        until the next check, so reads fall back to the primary.
+        """
+        checked_at = self.lag_checked_at
+        if checked_at is not None and time.monotonic() - checked_at < check_interval:
+            return self.lag
+
+        self.lag_checked_at = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout), self.engine.connect() as conn:
+                self.lag = float((await conn.execute(self.LAG_QUERY)).scalar() or 0)
+        except TimeoutError:
+            logger.warning("Replica %s lag probe timed out", self.safe_url)
+            self.lag = float("inf")
+        except Exception as e:
+            logger.warning("Replica %s is unreachable: %s", self.safe_url, e)
+            self.lag = float("inf")
+
+        return self.lag
+
 
 class Database:
+    metrics = MetricsStorage("database.replica")
+
     def __init__(self, db_config: PostgresConfig):
         self.user = db_config.user
         self.host = db_config.host
@@ -24,17 +346,45 @@ class Database:
         logger.debug("Attempting to connect using effective URL: %s", self.safe_url)
 
         try:
-            self.engine = create_async_engine(
-                self.url,
-                echo=False,
-                pool_pre_ping=True,
-                pool_recycle=3600,
+            self.engine = create_async_engine(self.url, **_engine_kwargs(db_config))
+            # Full pre-ping already validates every checkout
+            _install_pool_listeners(
+                self.engine,
+                None if db_config.pool_pre_ping else db_config.pool_pre_ping_idle,
+            )
+            _install_query_listeners(
+                self.engine,
+                db_config.n_plus_one_threshold,
+                strict=db_config.query_strict_mode,
             )
 
             self.async_session = async_sessionmaker(
-                bind=self.engine, class_=AsyncSession, expire_on_commit=False
+                bind=self.engine,
+                class_=AsyncSession,
+                sync_session_class=TrackedSession,
+                expire_on_commit=False,
             )
             logger.info("Async Database engine initialized for %s", self.safe_url)
+
+            self.replica_max_lag = db_config.replica_max_lag
+            self.replica_lag_check_interval = db_config.replica_lag_check_interval
+            self.replica_lag_probe_timeout = db_config.replica_lag_probe_timeout
+            self.replicas: list[ReplicaPool] = []
+            for index, (url, safe_url) in enumerate(db_config.replica_db_urls):
+                replica_engine = create_async_engine(url, **_engine_kwargs(db_config))
+                _install_pool_listeners(
+                    replica_engine,
+                    None if db_config.pool_pre_ping else db_config.pool_pre_ping_idle,
+                    label=f".replica{index}",
+                )
+                _install_query_listeners(
+                    replica_engine,
+                    db_config.n_plus_one_threshold,
+                    strict=db_config.query_strict_mode,
+                )
+                self.replicas.append(ReplicaPool(replica_engine, safe_url))
+                logger.info("Read replica engine initialized for %s", safe_url)
+            self._replica_cursor = itertools.count()
         except Exception as e:
             logger.error(
                 "Failed to initialize database engine for %s: %s",
@@ -89,7 +439,53 @@ class Database:
                 await session.rollback()
                 raise
 
+    async def pick_replica(self) -> ReplicaPool | None:
+        """
+        Round-robins over replicas, skipping the ones lagging behind.
+
+        Returns:
+            A healthy replica, or None if reads should go to the primary.
+        """
+        if not self.replicas:
+            return None
+
+        start = next(self._replica_cursor)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            lag = await replica.refresh_lag(
+                self.replica_lag_check_interval, self.replica_lag_probe_timeout
+            )
+            if lag <= self.replica_max_lag:
+                return replica
+
+            self.metrics.increment("lagging")
+
+        self.metrics.increment("fallback")
+        return None
+
+    @asynccontextmanager
+    async def readonly_session(self) -> AsyncGenerator[AsyncSession]:
+        """
+        Provides a session for read-only work, routed to a replica if possible.
+
+        Nothing is committed; the transaction is always rolled back on exit.
+        """
+        replica = await self.pick_replica()
+        session_factory = (
+            replica.async_session if replica is not None else self.async_session
+        )
+
+        async with session_factory() as session:
+            try:
+                yield session
+            finally:
+                await session.rollback()
+
     async def close(self):
         """Closes the database connection pool."""
         logger.info("Closing database connection pool for %s", self.safe_url)
         await self.engine.dispose()
+
+        for replica in self.replicas:
+            logger.info("Closing replica connection pool for %s", replica.safe_url)
+            await replica.engine.dispose()
@@ -12,3 +12,8 @@ class NotFoundError(HTTPException):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=name.capitalize() + " not found"
         )
+
+
+class ConflictError(HTTPException):
+    def __init__(self, msg: str) -> None:
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=msg)
@@ -1,11 +1,14 @@
 import asyncio
 import contextlib
+import functools
 import json
 import logging
+import operator
 import threading
 import typing
 import typing as tp
 import uuid
+from enum import StrEnum
 from functools import partial
 
 import clickhouse_connect
@@ -17,6 +20,7 @@ from clickhouse_connect.driver.asyncclient import AsyncClient
 from src.shared.config import clickhouse_config
 from src.shared.exceptions import NotFoundError
 from src.shared.observability import schemas
+from src.shared.observability.spill import SpillLog
 from src.shared.observability.traces import async_traced_function, tracer
 from src.shared.singleton import Singleton
 from src.shared.time import Timer
@@ -38,8 +42,97 @@ GLOBAL_SETTINGS: dict[str, tp.Any] = {
 }
 
 
+@functools.cache
+def column_layout(
+    schema: type[schemas.BaseStructure],
+) -> tuple[list[str], tp.Callable[[tp.Any], tuple[tp.Any, ...]]]:
+    """
+    ClickHouse column names of a schema (serialization aliases, in field order)
+    and a getter returning a record's values as a tuple. Computed once per class.
+    """
+    fields = list(schema.model_fields)
+    column_names = [
+        info.serialization_alias or name for name, info in schema.model_fields.items()
+    ]
+    getter: tp.Callable[[tp.Any], tuple[tp.Any, ...]] = operator.attrgetter(*fields)
+    if len(fields) == 1:
+        single = operator.attrgetter(fields[0])
+        getter = lambda record: (single(record),)  # noqa: E731
+    return column_names, getter
+
+
+class ColumnarBatch:
+    """
+    Records of one schema, kept as value tuples and handed to ClickHouse as
+    columns. Enqueueing is a single C-level attrgetter call per record, the
+    transposition into columns happens once per flush.
+    """
+
+    # Row sizes are measured on every n-th row only
+    SIZE_SAMPLE_EVERY = 32
+
+    def __init__(self, schema: type[schemas.BaseStructure]) -> None:
+        self.schema = schema
+        self.column_names, self._getter = column_layout(schema)
+        self.rows: list[tuple[tp.Any, ...]] = []
+        self._row_bytes = 8 * len(self.column_names)
+
+    @classmethod
+    def from_records(cls, *records: schemas.BaseStructure) -> "ColumnarBatch":
+        batch = cls(type(records[0]))
+        for record in records:
+            batch.append(record)
+        return batch
+
+    def append(self, record: schemas.BaseStructure) -> None:
+        self.append_row(self._getter(record))
+
+    def append_row(self, row: tuple[tp.Any, ...]) -> None:
+        """Appends values already ordered as `column_names`."""
+        if not len(self.rows) % self.SIZE_SAMPLE_EVERY:
+            size = sum(
+                len(value) if isinstance(value, str | bytes) else 8 for value in row
+            )
+            self._row_bytes = (self._row_bytes + size) // 2
+        self.rows.append(row)
+
+    def extend(self, other: "ColumnarBatch") -> None:
+        self.rows.extend(other.rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated payload size, from a running average of sampled rows."""
+        return len(self.rows) * self._row_bytes
+
+    def columns(self) -> list[tuple[tp.Any, ...]]:
+        return list(zip(*self.rows, strict=True))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class OverflowPolicy(StrEnum):
+    """What `Inserter.insert` does once `max_size` records are pending."""
+
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+
+
 class Inserter(BaseWorker, metaclass=Singleton["Inserter"]):  # type: ignore
+    """
+    Buffers records per table and sends them to ClickHouse in columnar
+    batches. A flush runs every `INTERVAL` seconds, or earlier once the buffer
+    reaches `flush_rows` rows or `flush_bytes` estimated bytes.
+
+    Batches that fail to send are spilled to a local segment log and replayed
+    after the next successful flush. `insert` never raises: when the buffer is
+    full records are dropped according to the overflow policy and counted, so
+    observability cannot take the request path down with it.
+    """
+
     INTERVAL = 15
+    # Share of the buffer evicted at once under `DROP_OLDEST`
+    DROP_OLDEST_SHARE = 0.1
 
     metrics: tp.Optional["MetricsStorage"] = None  # round imports
 
@@ -49,16 +142,37 @@ class Inserter(BaseWorker, metaclass=Singleton["Inserter"]):  # type: ignore
         max_size: int = 150_000,
         no_logging: bool = False,
         update_interval: int | None = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_NEWEST,
     ) -> None:
         super().__init__()
-        self.queue = asyncio.Queue[schemas.BaseStructure](max_size)
-        self.priority_queue = asyncio.Queue[schemas.BaseStructure]()
+        self.max_size = max_size
+        self.flush_rows = min(clickhouse_config.inserter_flush_rows, max_size)
+        self.flush_bytes = clickhouse_config.inserter_flush_bytes
+        self.overflow = overflow
+        # Pending records per schema class, usually exactly one per table
+        self.batches: dict[type[schemas.BaseStructure], ColumnarBatch] = {}
+        self.size = 0
+        self.dropped = 0
         self.table_name = table_name
 
+        self.spill = SpillLog(
+            clickhouse_config.inserter_spill_dir,
+            table_name,
+            max_bytes=clickhouse_config.inserter_spill_max_bytes,
+        )
+
         self.logger = logging.getLogger(f"deus-vult.ch.inserter.{table_name}")
         self.no_logging = no_logging
 
         self.lock = asyncio.Lock()
+        # Records may come from other threads (the log listener, spans ended
+        # off the loop): the buffer is only changed or swapped under this lock
+        self._buffer_lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        # Other threads can't touch the events directly
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
 
         if update_interval is not None:
             self.INTERVAL = update_interval
@@ -67,21 +181,100 @@ class Inserter(BaseWorker, metaclass=Singleton["Inserter"]):  # type: ignore
     def instance_key(self) -> str:
         return self.table_name
 
+    def _batch(self, schema: type[schemas.BaseStructure]) -> ColumnarBatch:
+        batch = self.batches.get(schema)
+        if batch is None:
+            batch = self.batches[schema] = ColumnarBatch(schema)
+        return batch
+
+    def _drop(self, count: int) -> None:
+        self.dropped += count
+        if self.metrics is not None:
+            self.metrics.increment("dropped", count, label=f".{self.table_name}")
+
+    def _evict_oldest(self) -> None:
+        batch = max(self.batches.values(), key=len)
+        count = max(int(len(batch) * self.DROP_OLDEST_SHARE), 1)
+        del batch.rows[:count]
+        self.size -= count
+        self._drop(count)
+
+    def _admit(self) -> bool:
+        """Makes room for one record according to the overflow policy."""
+        if self.size < self.max_size:
+            return True
+
+        if self.overflow is OverflowPolicy.DROP_NEWEST:
+            self._drop(1)
+            return False
+
+        self._evict_oldest()
+        return True
+
+    def _wake(self) -> None:
+        if self._wakeup.is_set():
+            return
+
+        if self._loop is None or threading.get_ident() == self._loop_thread:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _appended(self, batch: ColumnarBatch) -> None:
+        self.size += 1
+        if self.size >= self.flush_rows or batch.nbytes >= self.flush_bytes:
+            self._wake()
+
     def insert(self, record: schemas.BaseStructure) -> None:
-        self.queue.put_nowait(record)
+        with self._buffer_lock:
+            if self._admit():
+                batch = self._batch(type(record))
+                batch.append(record)
+                self._appended(batch)
+
+    def insert_row(
+        self, schema: type[schemas.BaseStructure], row: tuple[tp.Any, ...]
+    ) -> None:
+        """Inserts values already encoded in the schema's column order."""
+        with self._buffer_lock:
+            if self._admit():
+                batch = self._batch(schema)
+                batch.append_row(row)
+                self._appended(batch)
 
     async def insert_wait(self, record: schemas.BaseStructure) -> None:
-        await self.queue.put(record)
+        while self.size >= self.max_size:
+            self._flushed.clear()
+            self._wakeup.set()
+            await self._flushed.wait()
+        self.insert(record)
+
+    async def _send(
+        self,
+        column_names: list[str],
+        rows: list[tuple[tp.Any, ...]],
+        settings: dict[str, tp.Any],
+    ) -> None:
+        if http_client is None or self.metrics is None:
+            raise RuntimeError("out of `with_clickhouse()` scope")
+
+        await http_client.insert(
+            self.table_name,
+            list(zip(*rows, strict=True)),
+            column_names=column_names,
+            column_oriented=True,
+            settings=settings,
+        )
 
     async def insert_sync(self, *records: schemas.BaseStructure) -> None:
         if http_client is None or self.metrics is None:
             raise RuntimeError("out of `with_clickhouse()` scope")
 
         try:
-            await http_client.insert(
-                self.table_name,
-                [list(record.model_dump().values()) for record in records],
-                column_names=list(records[0].model_dump(by_alias=True).keys()),
+            batch = ColumnarBatch.from_records(*records)
+            await self._send(
+                batch.column_names,
+                batch.rows,
                 settings={
                     "async_insert": 1,
                     "wait_for_async_insert": 1,
@@ -96,60 +289,130 @@ class Inserter(BaseWorker, metaclass=Singleton["Inserter"]):  # type: ignore
             raise e
 
     async def insert_async(self, *records: schemas.BaseStructure) -> None:
-        if http_client is None or self.metrics is None:
-            raise RuntimeError("out of `with_clickhouse()` scope")
+        if records:
+            await self.insert_batch_async(ColumnarBatch.from_records(*records))
 
-        await http_client.insert(
-            self.table_name,
-            [list(record.model_dump().values()) for record in records],
-            column_names=list(records[0].model_dump(by_alias=True).keys()),
-            settings={"async_insert": 1, "wait_for_async_insert": 0},
+    async def insert_batch_async(self, batch: ColumnarBatch) -> None:
+        await self._send_async(batch.column_names, batch.rows)
+
+    async def _send_async(
+        self, column_names: list[str], rows: list[tuple[tp.Any, ...]]
+    ) -> None:
+        await self._send(
+            column_names, rows, settings={"async_insert": 1, "wait_for_async_insert": 0}
         )
 
-    async def flush(self) -> None:
+    """
+    SPILL
+    """
+
+    def _spill(self, batches: list[ColumnarBatch]) -> None:
+        """Blocking: writes the batches to the spill log, dropping what won't fit."""
+        for batch in batches:
+            try:
+                spilled = self.spill.append((batch.column_names, batch.rows))
+            except OSError:
+                self.logger.exception("failed to spill %s records", len(batch))
+                spilled = False
+
+            if not spilled:
+                self._drop(len(batch))
+            elif self.metrics is not None:
+                self.metrics.increment(
+                    "spilled", len(batch), label=f".{self.table_name}"
+                )
+
+    async def replay(self) -> None:
+        """Sends spilled batches, oldest first, stopping at the first failure."""
+        if not self.spill.bytes:
+            return
+
+        await asyncio.to_thread(self.spill.rotate)
+        for segment in await asyncio.to_thread(self.spill.sealed_segments):
+            # The generator only opens the file once iterated, in the thread
+            frames = await asyncio.to_thread(list, self.spill.read(segment))
+            for column_names, rows in frames:
+                # Delivery is at-least-once: a failure mid-segment resends it all
+                await self._send_async(column_names, rows)
+                if self.metrics is not None:
+                    self.metrics.increment(
+                        "replayed", len(rows), label=f".{self.table_name}"
+                    )
+
+            await asyncio.to_thread(self.spill.remove, segment)
+            if not self.no_logging:
+                self.logger.info("replayed spill segment %s", segment.name)
+
+    """
+    FLUSH
+    """
+
+    async def flush(self) -> bool:
+        """Sends the buffered batches, returns False if some had to be spilled."""
         assert self.metrics is not None
 
         with Timer() as t:
             async with self.lock:
-                batch: list[schemas.BaseStructure] = []
+                # Swapping the containers out is O(1) whatever the backlog size
+                with self._buffer_lock:
+                    batches = [batch for batch in self.batches.values() if batch]
+                    self.batches = {}
+                    self.size = 0
+                self._flushed.set()
 
-                priority_size = self.priority_queue.qsize()
-                for _ in range(priority_size):
-                    batch.append(self.priority_queue.get_nowait())
-
-                size = self.queue.qsize()
-                for _ in range(size):
-                    batch.append(self.queue.get_nowait())
-
-            if not batch:
-                return
+            if not batches:
+                return True
 
+            size = sum(map(len, batches))
             with tracer.start_as_current_span(
                 "flush", attributes={"table_name": self.table_name}
             ):
+                sent = 0
                 try:
-                    await self.insert_async(*batch)
-
-                    if not self.no_logging:
-                        self.logger.info("flushed %s records", len(batch))
-                    self.metrics.increment(self.table_name, len(batch))
+                    for batch in batches:
+                        await self.insert_batch_async(batch)
+                        sent += 1
                 except Exception:
-                    self.logger.exception("failed to flush")
+                    if not self.no_logging:
+                        self.logger.exception("failed to flush, spilling")
+                    await asyncio.to_thread(self._spill, batches[sent:])
+                    return False
+                finally:
+                    self.metrics.observe(
+                        "flush_time", t.current, label=f".{self.table_name}"
+                    )
 
-                    for obj in batch:
-                        self.priority_queue.put_nowait(obj)
+                if not self.no_logging:
+                    self.logger.info("flushed %s records", size)
+                self.metrics.increment(self.table_name, size)
 
-        self.metrics.avg("flush_time", t.total, label=f".{self.table_name}")
+        return True
 
     async def run_once(self) -> None:
         try:
-            await self.flush()
+            if await self.flush():
+                await self.replay()
         except Exception:
             if self.no_logging:
                 return
 
             self.logger.exception("failed to flush insert")
 
+    async def loop(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        while not self._shutting_down:
+            # Sleeps `INTERVAL`, unless the buffer fills up first
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.INTERVAL)
+            self._wakeup.clear()
+
+            with Timer() as t:
+                await self.run_once()
+
+            if self.metrics:
+                self.metrics.observe("worker.run_time", t.total)
+
     @classmethod
     def run(cls) -> None:
         for instance in cls.get_all_instances():
@@ -160,13 +423,14 @@ class Inserter(BaseWorker, metaclass=Singleton["Inserter"]):  # type: ignore
         for instance in cls.get_all_instances():
             instance.stop()
 
+        # Whatever can't be sent now is spilled and replayed on the next start
         with contextlib.suppress(Exception):
             await asyncio.gather(
                 *(instance.flush() for instance in cls.get_all_instances())
             )
 
     def __str__(self) -> str:
-        return f"Inserter<{self.table_name}>(size={self.queue.qsize()})"
+        return f"Inserter<{self.table_name}>(size={self.size}, dropped={self.dropped})"
 
     __repr__ = __str__
 
@@ -0,0 +1,101 @@
+"""
+Mergeable log-bucketed histograms.
+
+Buckets follow the DDSketch mapping: a value `v` lands in bucket
+`ceil(log(v) / log(gamma))`, so every quantile is known within `accuracy`
+relative error whatever the value range, and two histograms with the same
+accuracy merge by adding their bucket counts.
+"""
+
+import math
+import typing as tp
+
+DEFAULT_ACCURACY = 0.01
+# Values below this (zero and negatives included) share the zero bucket
+MIN_VALUE = 1e-9
+
+
+class Histogram:
+    """
+    Example usage:
+
+    histogram = Histogram()
+    histogram.add(0.012)
+    histogram.quantile(0.99)
+    """
+
+    __slots__ = ("accuracy", "_log_gamma", "_buckets", "count", "sum", "min", "max")
+
+    def __init__(self, accuracy: float = DEFAULT_ACCURACY) -> None:
+        self.accuracy = accuracy
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        # Bucket index -> count, index 0 holds values below MIN_VALUE
+        self._buckets: dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        if value < MIN_VALUE:
+            return 0
+        # Shifted so that MIN_VALUE maps above the zero bucket
+        return math.ceil(math.log(value / MIN_VALUE) / self._log_gamma) + 1
+
+    def _upper_bound(self, index: int) -> float:
+        if index == 0:
+            return MIN_VALUE
+        return MIN_VALUE * math.exp((index - 1) * self._log_gamma)
+
+    def add(self, value: float, count: int = 1) -> None:
+        index = self._index(value)
+        self._buckets[index] = self._buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram") -> None:
+        if other.accuracy != self.accuracy:
+            raise ValueError("Histograms with different accuracy can't be merged")
+
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile `q` in [0, 1], 0.0 when empty."""
+        if not self.count:
+            return 0.0
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                if index == 0:
+                    return 0.0
+                # Midpoint of the bucket in relative terms, clamped to the range
+                value = self._upper_bound(index) * 2 / (1 + math.exp(self._log_gamma))
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def buckets(self) -> tuple[list[float], list[int]]:
+        """Non-empty buckets as `(upper bounds, counts)`, in increasing order."""
+        indices = sorted(self._buckets)
+        return (
+            [self._upper_bound(index) for index in indices],
+            [self._buckets[index] for index in indices],
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> tp.Iterator[tuple[float, int]]:
+        return iter(zip(*self.buckets(), strict=True))
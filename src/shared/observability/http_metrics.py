@@ -0,0 +1,108 @@
+"""
+HTTP request metrics.
+
+A pure ASGI middleware (no `BaseHTTPMiddleware`, so no extra task or body
+buffering per request) that records, per method and route template:
+
+- `http.latency` histogram and `http.status.<N>xx` counts,
+- `http.request_bytes` / `http.response_bytes` histograms,
+- `http.in_flight` gauge,
+- `http.middleware_overhead`, the middleware's own time.
+
+Responses get a `Server-Timing` header with the db / llm / cache breakdown
+collected in `request_timings`.
+"""
+
+import time
+import typing as tp
+
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.timing import request_timings, server_timing_header
+
+Scope = tp.MutableMapping[str, tp.Any]
+Message = tp.MutableMapping[str, tp.Any]
+Receive = tp.Callable[[], tp.Awaitable[Message]]
+Send = tp.Callable[[Message], tp.Awaitable[None]]
+ASGIApp = tp.Callable[[Scope, Receive, Send], tp.Awaitable[None]]
+
+# Requests that matched no route share one label, raw paths would explode it
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class HTTPMetricsMiddleware:
+    """
+    Example usage:
+
+    app.add_middleware(HTTPMetricsMiddleware)
+    """
+
+    metrics = MetricsStorage("http")
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.in_flight = 0
+
+    @staticmethod
+    def _route(scope: Scope) -> str:
+        # Set by FastAPI on the shared scope once the router matched
+        route = scope.get("route")
+        return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+    @staticmethod
+    def _content_length(scope: Scope) -> int:
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                return int(value) if value.isdigit() else 0
+        return 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: dict[str, float] = {}
+        token = request_timings.set(timings)
+        status = 500
+        response_bytes = 0
+        # Own time spent in `send_wrapper`, subtracted from the app time
+        send_overhead = 0.0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_bytes, send_overhead
+
+            began = time.perf_counter()
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, began - start)
+                headers = [*message.get("headers", ()), (b"server-timing", header)]
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            send_overhead += time.perf_counter() - began
+
+            await send(message)
+
+        self.in_flight += 1
+        self.metrics.set("in_flight", self.in_flight)
+        app_start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            app_end = time.perf_counter()
+            request_timings.reset(token)
+            self.in_flight -= 1
+
+            label = f".{scope['method']} {self._route(scope)}"
+            self.metrics.set("in_flight", self.in_flight)
+            self.metrics.observe("latency", app_end - start, label=label)
+            self.metrics.increment(f"status.{status // 100}xx", label=label)
+            self.metrics.observe(
+                "request_bytes", self._content_length(scope), label=label
+            )
+            self.metrics.observe("response_bytes", response_bytes, label=label)
+
+            self.metrics.observe(
+                "middleware_overhead",
+                (app_start - start) + send_overhead + (time.perf_counter() - app_end),
+            )
@@ -1,13 +1,20 @@
+import atexit
 import logging
+import queue
+import random
 import socket
+import time
+import typing as tp
 from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
 
 import colorlog
-from opentelemetry.trace import INVALID_SPAN, get_current_span
+from opentelemetry.trace import get_current_span
 
-from src.shared.config import shared_config
+from src.shared.config import logging_config, shared_config
 from src.shared.observability import schemas
 from src.shared.observability.ch_utils import Inserter
+from src.shared.observability.metrics import MetricsStorage
 
 LOG_COLORS = {
     "DEBUG": "cyan",
@@ -19,44 +26,152 @@ LOG_COLORS = {
 
 
 class ClickHouseHandler(logging.Handler):
+    """
+    Writes records to `operation.logs`. Runs on the log listener thread, so
+    the trace context is read from the ids captured by `LogQueueHandler`.
+    """
+
     inserter = Inserter("operation.logs", no_logging=True)
 
     def __init__(self) -> None:
         super().__init__()
         self.fqdn = socket.getfqdn()
 
-    def process_record(self, record: logging.LogRecord) -> schemas.Log:
-        span = get_current_span()
-
-        span_id = ""
-        trace_id = ""
-        if span is not INVALID_SPAN:
-            context = span.get_span_context()
-            span_id = hex(context.span_id)
-            trace_id = hex(context.trace_id)
-
-        return schemas.Log(
-            timestamp=datetime.fromtimestamp(record.created, UTC),
-            severity_text=record.levelname,
-            severity_number=record.levelno,
-            body=self.format(record),
-            trace_id=trace_id or "",
-            span_id=span_id or "",
-            pod_name=self.fqdn,
-            app_env=shared_config.app_env,
-            stage=shared_config.stage,
-            logger_name=record.name,
-            format_message=record.msg,
-            file_name=record.filename,
-            func_name=record.funcName,
-            lineno=record.lineno or 0,
+    def process_record(self, record: logging.LogRecord) -> tuple[tp.Any, ...]:
+        """Encodes the record in `schemas.Log` field order."""
+        trace_id = getattr(record, "trace_id", 0)
+        span_id = getattr(record, "span_id", 0)
+
+        return (
+            datetime.fromtimestamp(record.created, UTC),
+            record.levelname,
+            record.levelno,
+            self.format(record),
+            hex(trace_id) if trace_id else "",
+            hex(span_id) if span_id else "",
+            self.fqdn,
+            shared_config.app_env,
+            shared_config.stage,
+            record.name,
+            str(getattr(record, "template", record.msg)),
+            record.filename,
+            record.funcName,
+            record.lineno or 0,
         )
 
     def emit(self, record: logging.LogRecord) -> None:
-        self.inserter.insert(self.process_record(record))
+        self.inserter.insert_row(schemas.Log, self.process_record(record))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops records on the calling thread, before anything is formatted.
+    Records below WARNING are sampled per logger name prefix, and every logger
+    gets a token bucket so a hot loop can't flood the pipeline. ERROR and
+    CRITICAL records always pass, incidents are when they matter most.
+    """
+
+    metrics = MetricsStorage("logging")
+
+    def __init__(
+        self,
+        sample_rates: tp.Mapping[str, float],
+        rate_per_second: float,
+        burst: int,
+    ) -> None:
+        super().__init__()
+        # Longest prefix first, so the most specific rate wins
+        self.sample_rates = sorted(sample_rates.items(), key=lambda x: -len(x[0]))
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+
+        self._rates: dict[str, float] = {}
+        # Logger name -> [tokens, last refill]
+        self._buckets: dict[str, list[float]] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rates.get(name)
+        if rate is None:
+            rate = self._rates[name] = next(
+                (r for prefix, r in self.sample_rates if name.startswith(prefix)), 1.0
+            )
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        name = record.name
+        if record.levelno < logging.WARNING and self.sample_rates:
+            rate = self._rate(name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+
+        current = time.monotonic()
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [float(self.burst), current]
+
+        tokens = min(
+            bucket[0] + (current - bucket[1]) * self.rate_per_second, self.burst
+        )
+        bucket[1] = current
+        if tokens < 1.0:
+            bucket[0] = tokens
+            self.metrics.increment("rate_limited", label=f".{name}")
+            return False
+
+        bucket[0] = tokens - 1.0
+        return True
+
+
+# Immutable and safe to render on any thread
+_PLAIN_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. With plain arguments only, `msg` and
+    `args` travel unformatted and are interpolated on the listener thread, so
+    the calling coroutine pays for the record and a queue put only.
+
+    Any other argument is rendered on the calling thread: an ORM row can't be
+    `repr`'d away from its session, and a mutable object must be logged as it
+    was at the call. The template is kept in `record.template`.
+    """
+
+    metrics = MetricsStorage("logging")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span_context = get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = span_context.trace_id
+            record.span_id = span_context.span_id
+
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, tp.Mapping) else args
+            if not all(isinstance(value, _PLAIN_ARGS) for value in values):
+                record.template = record.msg
+                record.msg = record.getMessage()
+                record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.metrics.increment("dropped")
+
+
+_listener: QueueListener | None = None
 
 
 def configure_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
     console_handler = colorlog.StreamHandler()
 
     log_format = "%(log_color)s%(levelname)-8s%(reset)s | %(asctime)s | %(name)s:%(funcName)s:%(lineno)d | %(message)s"  # noqa: E501
@@ -72,17 +187,31 @@ def configure_logging() -> None:
     )
     console_handler.setFormatter(formatter)
 
-    handlers = [
-        console_handler,
-        ClickHouseHandler(),
-    ]
+    # Formatting, console writes and ClickHouse rows happen on the listener
+    records: queue.Queue[logging.LogRecord] = queue.Queue(logging_config.queue_size)
+    _listener = QueueListener(
+        records, console_handler, ClickHouseHandler(), respect_handler_level=True
+    )
+
+    queue_handler = LogQueueHandler(records)
+    queue_handler.addFilter(
+        SamplingFilter(
+            logging_config.sample_rates,
+            rate_per_second=logging_config.rate_limit_per_second,
+            burst=logging_config.rate_limit_burst,
+        )
+    )
 
     logging.getLogger("pyrogram").setLevel(logging.INFO)
     logging.getLogger("clickhouse_connect").setLevel(logging.INFO)
 
     logging.basicConfig(
-        level=shared_config.log_level,
+        level=shared_config.effective_log_level,
         format="%(levelname)-8s | %(asctime)s | %(name)s:%(funcName)s:%(lineno)d | %(message)s",  # noqa: E501
         datefmt=date_format,
-        handlers=handlers,
+        handlers=[queue_handler],
     )
+
+    _listener.start()
+    # Drains what is still queued on interpreter exit
+    atexit.register(_listener.stop)
@@ -3,110 +3,241 @@ import collections
 import contextlib
 import logging
 import threading
+import time
 import typing as tp
 from types import TracebackType
 
 from src.shared.config import shared_config
 from src.shared.observability import schemas
 from src.shared.observability.ch_utils import Inserter
+from src.shared.observability.histogram import Histogram
 from src.shared.time import Timer, now
 
 
 class _MetricObject:
+    __slots__ = ("value", "count", "label", "updated")
+
     def __init__(self) -> None:
         self.value = 0.0
         self.count = 0
         self.label = ""
+        # Set by gauges only: the latest write wins when shards are merged
+        self.updated = 0
 
     def get_value(self) -> float:
         return self.value / (self.count or 1)
 
+    def merge(self, other: "_MetricObject") -> None:
+        if other.updated or self.updated:
+            if other.updated >= self.updated:
+                self.value, self.updated = other.value, other.updated
+        else:
+            self.value += other.value
+            self.count += other.count
+        self.label = other.label
+
+
+class _Shard:
+    """
+    Accumulators of one thread; its lock is only contended by the flush.
+
+    The lock is not reentrant: code that may run while the thread holds it
+    (GC callbacks, signal handlers) must not record metrics.
+    """
+
+    __slots__ = ("lock", "metrics", "histograms", "thread")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: collections.defaultdict[str, _MetricObject] = (
+            collections.defaultdict(_MetricObject)
+        )
+        self.histograms: dict[str, tuple[Histogram, str]] = {}
+        self.thread = threading.current_thread()
+
 
 class MetricsStorage:
     """
-    Allows to set or increment metrics.
+    Allows to set or increment metrics, or observe values into histograms.
+
+    Every thread accumulates into its own shard, merged on flush. Histograms
+    are written to `operation.histograms` as bucket arrays, and their count
+    and quantiles to `operation.metrics` as `<key>.count` / `<key>.p99`.
 
     Example usage:
 
     metrics = MetricsStorage("test_metrics")
     metrics.increment("foo")
+    metrics.observe("latency", 0.012)
     """
 
     INTERVAL = 15
+    QUANTILES: tp.Sequence[float] = (0.5, 0.95, 0.99)
 
-    _storage: collections.defaultdict[str, _MetricObject] = collections.defaultdict(
-        _MetricObject
-    )
-    _lock = threading.Lock()
+    _shards: list[_Shard] = []
+    _shards_lock = threading.Lock()
+    _local = threading.local()
+    # Full key -> quantiles, for storages overriding the default
+    _quantiles: dict[str, tuple[float, ...]] = {}
     _task: asyncio.Task[tp.Any] | None = None
     _inserter = Inserter("operation.metrics")
+    _histogram_inserter = Inserter("operation.histograms")
 
     logger = logging.getLogger("deus-vult.metrics")
 
-    def __init__(self, metric_prefix: str = "") -> None:
+    def __init__(
+        self, metric_prefix: str = "", quantiles: tp.Sequence[float] | None = None
+    ) -> None:
         self.metric_prefix = metric_prefix
+        self.quantiles = quantiles
 
     def get_full_key(self, key: str = "", label: str = "") -> str:
         if not self.metric_prefix:
             return key
         return f"{self.metric_prefix}.{key}{label}"
 
+    @classmethod
+    def _shard(cls) -> _Shard:
+        shard: _Shard | None = getattr(cls._local, "shard", None)
+        if shard is None:
+            shard = cls._local.shard = _Shard()
+            with cls._shards_lock:
+                cls._shards.append(shard)
+        return shard
+
     def increment(self, key: str = "", delta: float = 1.0, label: str = "") -> None:
-        with self._lock:
-            metric = self._storage[self.get_full_key(key, label=label)]
+        shard = self._shard()
+        with shard.lock:
+            metric = shard.metrics[self.get_full_key(key, label=label)]
             metric.value += delta
             metric.label = label
 
     def avg(
         self, key: str = "", value: float = 1.0, count: int = 1, label: str = ""
     ) -> None:
-        with self._lock:
-            metric = self._storage[self.get_full_key(key, label=label)]
+        shard = self._shard()
+        with shard.lock:
+            metric = shard.metrics[self.get_full_key(key, label=label)]
             metric.value += value
             metric.count += count
             metric.label = label
 
-    def set(self, key: str = "", value: float = 1.0) -> None:
-        with self._lock:
-            metric = self._storage[self.get_full_key(key)]
+    def set(self, key: str = "", value: float = 1.0, label: str = "") -> None:
+        shard = self._shard()
+        with shard.lock:
+            metric = shard.metrics[self.get_full_key(key, label=label)]
             metric.value = value
+            metric.updated = time.monotonic_ns()
+            metric.label = label
+
+    def observe(self, key: str = "", value: float = 0.0, label: str = "") -> None:
+        """Adds the value to the histogram of the key."""
+        full_key = self.get_full_key(key, label=label)
+        shard = self._shard()
+        with shard.lock:
+            entry = shard.histograms.get(full_key)
+            if entry is None:
+                entry = shard.histograms[full_key] = (Histogram(), label)
+                # Quantiles are per storage, remembered with the key
+                if self.quantiles is not None:
+                    self._quantiles[full_key] = tuple(self.quantiles)
+            entry[0].add(value)
+
+    @classmethod
+    def _collect(
+        cls,
+    ) -> tuple[dict[str, _MetricObject], dict[str, tuple[Histogram, str]]]:
+        """Swaps every shard out and merges them."""
+        with cls._shards_lock:
+            shards = list(cls._shards)
+            # Shards of finished threads are merged one last time
+            cls._shards = [shard for shard in shards if shard.thread.is_alive()]
+
+        metrics: dict[str, _MetricObject] = {}
+        histograms: dict[str, tuple[Histogram, str]] = {}
+        for shard in shards:
+            with shard.lock:
+                shard_metrics, shard.metrics = (
+                    shard.metrics,
+                    collections.defaultdict(_MetricObject),
+                )
+                shard_histograms, shard.histograms = shard.histograms, {}
+
+            for key, metric in shard_metrics.items():
+                if key in metrics:
+                    metrics[key].merge(metric)
+                else:
+                    metrics[key] = metric
+            for key, (histogram, label) in shard_histograms.items():
+                if key in histograms:
+                    histograms[key][0].merge(histogram)
+                else:
+                    histograms[key] = (histogram, label)
+
+        return metrics, histograms
 
     @classmethod
     async def flush(cls) -> None:
         data: list[schemas.Metric] = []
+        histogram_data: list[schemas.HistogramMetric] = []
 
         _now = now()
-        with cls._lock:
-            for key, metric in cls._storage.items():
-                if metric.label:
-                    key = key.removesuffix(metric.label)
-
-                data.append(
-                    schemas.Metric(
-                        app_env=shared_config.app_env,
-                        stage=shared_config.stage,
-                        date=_now,
-                        key=key,
-                        value=metric.get_value(),
-                        label=metric.label,
-                    )
-                )
-            cls._storage.clear()
+        metrics, histograms = cls._collect()
 
-        try:
-            data.append(
-                schemas.Metric(
+        def metric(key: str, value: float, label: str = "") -> schemas.Metric:
+            return schemas.Metric(
+                app_env=shared_config.app_env,
+                stage=shared_config.stage,
+                date=_now,
+                key=key,
+                value=value,
+                label=label,
+            )
+
+        for key, metric_object in metrics.items():
+            if metric_object.label:
+                key = key.removesuffix(metric_object.label)
+            data.append(metric(key, metric_object.get_value(), metric_object.label))
+
+        for key, (histogram, label) in histograms.items():
+            if label:
+                key = key.removesuffix(label)
+
+            full_key = f"{key}{label}"
+            data.append(metric(f"{key}.count", histogram.count, label))
+            for q in cls._quantiles.get(full_key, cls.QUANTILES):
+                data.append(metric(f"{key}.p{q * 100:g}", histogram.quantile(q), label))
+
+            upper_bounds, counts = histogram.buckets()
+            histogram_data.append(
+                schemas.HistogramMetric(
                     app_env=shared_config.app_env,
                     stage=shared_config.stage,
                     date=_now,
-                    key="system.running_tasks",
-                    value=len(asyncio.all_tasks(asyncio.get_running_loop())),
+                    key=key,
+                    label=label,
+                    count=histogram.count,
+                    sum=histogram.sum,
+                    min=histogram.min,
+                    max=histogram.max,
+                    bucket_upper_bounds=upper_bounds,
+                    bucket_counts=counts,
+                )
+            )
+
+        try:
+            data.append(
+                metric(
+                    "system.running_tasks",
+                    len(asyncio.all_tasks(asyncio.get_running_loop())),
                 )
             )
         except Exception:
             cls.logger.fatal("failed to prepare metrics data", exc_info=True)
 
         await cls._inserter.insert_async(*data)
+        if histogram_data:
+            await cls._histogram_inserter.insert_async(*histogram_data)
 
     @classmethod
     async def loop(cls) -> None:
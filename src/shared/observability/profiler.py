@@ -0,0 +1,152 @@
+"""
+Continuous sampling profiler.
+
+A daemon thread snapshots every Python thread's stack `sample_rate` times a
+second and counts them as folded stacks (`module:func;module:func`, root
+first). Every `flush_interval` the counts go to `operation.profiles`, one row
+per distinct stack and thread, ready to be merged into a flamegraph.
+"""
+
+import collections
+import socket
+import sys
+import threading
+import time
+import types
+import typing as tp
+from datetime import UTC, datetime
+
+from src.shared.config import profiling_config, shared_config
+from src.shared.observability import schemas
+from src.shared.observability.ch_utils import Inserter
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.worker import BaseWorker
+
+# (thread name, folded stack)
+StackKey = tuple[str, str]
+
+
+class SamplingProfiler(BaseWorker):
+    """
+    Example usage:
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    """
+
+    metrics = MetricsStorage("profiler")
+    inserter = Inserter("operation.profiles", no_logging=True)
+    fqdn = socket.getfqdn()
+
+    def __init__(
+        self,
+        sample_rate: float = profiling_config.sample_rate,
+        flush_interval: int = profiling_config.flush_interval,
+        max_depth: int = profiling_config.max_depth,
+    ) -> None:
+        super().__init__()
+        self.INTERVAL = flush_interval
+        self.sample_rate = sample_rate
+        self.max_depth = max_depth
+
+        self._counts: collections.Counter[StackKey] = collections.Counter()
+        self._lock = threading.Lock()
+        self._sampler: threading.Thread | None = None
+        self._interval_start = datetime.now(UTC)
+        # Code object -> "module:qualname", frames repeat across samples
+        self._labels: dict[types.CodeType, str] = {}
+
+    def _label(self, frame: types.FrameType) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            label = self._labels[code] = f"{module}:{code.co_qualname}"
+        return label
+
+    def _fold(self, frame: types.FrameType | None) -> str:
+        labels: list[str] = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._label(frame))
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def sample(self) -> None:
+        """Takes one snapshot of every thread but the sampler itself."""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = [
+            (names.get(ident, str(ident)), self._fold(frame))
+            for ident, frame in sys._current_frames().items()
+            if ident != own
+        ]
+        with self._lock:
+            self._counts.update(stacks)
+
+    def _sample_loop(self) -> None:
+        interval = 1 / self.sample_rate
+        next_at = time.monotonic()
+        while not self._shutting_down:
+            started = time.perf_counter()
+            self.sample()
+            self.metrics.observe("sample_time", time.perf_counter() - started)
+
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. GIL contention): skip, don't burst
+                next_at = time.monotonic()
+
+    async def run_once(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, collections.Counter()
+        date, self._interval_start = self._interval_start, datetime.now(UTC)
+
+        for (thread_name, stack), samples in counts.items():
+            self.inserter.insert_row(
+                schemas.Profile,
+                (
+                    shared_config.app_env,
+                    shared_config.stage,
+                    date,
+                    self.fqdn,
+                    thread_name,
+                    stack,
+                    samples,
+                    self.sample_rate,
+                ),
+            )
+        self.metrics.increment("stacks", len(counts))
+
+    def start(self) -> None:
+        super().start()
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name="profiler-sampler", daemon=True
+        )
+        self._sampler.start()
+
+
+def build_flamegraph(rows: tp.Iterable[schemas.ProfileStack]) -> dict[str, tp.Any]:
+    """
+    Merges folded stacks into a `{"name", "value", "children"}` tree, the
+    format d3-flamegraph and speedscope import.
+    """
+    root: dict[str, tp.Any] = {"name": "root", "value": 0, "children": {}}
+    for row in rows:
+        root["value"] += row.samples
+        node = root
+        for label in row.stack.split(";"):
+            node = node["children"].setdefault(
+                label, {"name": label, "value": 0, "children": {}}
+            )
+            node["value"] += row.samples
+
+    def freeze(node: dict[str, tp.Any]) -> dict[str, tp.Any]:
+        children = sorted(node["children"].values(), key=lambda x: -x["value"])
+        return {**node, "children": [freeze(child) for child in children]}
+
+    # Stacks are at most `max_depth` deep, the recursion is bounded by it
+    return freeze(root)
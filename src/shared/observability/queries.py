@@ -0,0 +1,163 @@
+"""
+Per unit of work query accounting.
+
+The outermost `UnitOfWork` of a context (a request, an event handler) opens a
+`QueryStats`; engine hooks count every statement, its rows and time into it.
+Identical statements repeated past a threshold are reported as likely N+1
+patterns. The summary goes to the current span and to metrics on exit.
+Tasks spawned inside inherit the context variable but open their own stats.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import typing as tp
+from collections.abc import Generator
+
+from opentelemetry.trace import get_current_span
+
+from src.shared.observability.metrics import MetricsStorage
+
+logger = logging.getLogger("deus-vult.database.queries")
+
+current_query_stats: contextvars.ContextVar["QueryStats | None"] = (
+    contextvars.ContextVar("current_query_stats", default=None)
+)
+
+
+def _current_task() -> asyncio.Task[tp.Any] | None:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode or under `query_budget` when the budget is exceeded."""
+
+
+class QueryStats:
+    """
+    Example usage:
+
+    stats = current_query_stats.get()
+    stats.record(statement, rows=3, elapsed=0.002, threshold=10, strict=False)
+    """
+
+    __slots__ = (
+        "statements",
+        "rows",
+        "time",
+        "shapes",
+        "n_plus_one",
+        "max_statements",
+        "max_repeats",
+        "owner",
+    )
+
+    metrics = MetricsStorage("database.queries")
+
+    def __init__(
+        self, max_statements: int | None = None, max_repeats: int | None = None
+    ) -> None:
+        self.statements = 0
+        self.rows = 0
+        self.time = 0.0
+        # Parameterized statement text -> executions; compiled statements are
+        # cached, so the same shape is usually the same string object
+        self.shapes: dict[str, int] = {}
+        self.n_plus_one: list[str] = []
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        # Task that opened the stats, the only one allowed to share them
+        self.owner = _current_task()
+
+    def record(
+        self, statement: str, rows: int, elapsed: float, threshold: int, strict: bool
+    ) -> None:
+        self.statements += 1
+        self.rows += rows
+        self.time += elapsed
+
+        count = self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        if self.max_repeats is not None:
+            threshold, strict = self.max_repeats + 1, True
+
+        if count == threshold:
+            self.n_plus_one.append(statement)
+            if strict:
+                raise QueryBudgetExceeded(
+                    f"Statement executed {count} times, likely N+1:\n{statement}"
+                )
+
+        if self.max_statements is not None and self.statements > self.max_statements:
+            raise QueryBudgetExceeded(
+                f"More than {self.max_statements} statements executed"
+            )
+
+    def report(self) -> None:
+        if not self.statements:
+            return
+
+        span = get_current_span()
+        if span.is_recording():
+            span.set_attributes(
+                {
+                    "db.statements": self.statements,
+                    "db.rows": self.rows,
+                    "db.time_ms": round(self.time * 1000, 3),
+                    "db.n_plus_one": len(self.n_plus_one),
+                }
+            )
+
+        self.metrics.observe("statements", self.statements)
+        self.metrics.observe("rows", self.rows)
+        self.metrics.observe("time", self.time)
+        if self.n_plus_one:
+            self.metrics.increment("n_plus_one", len(self.n_plus_one))
+            for statement in self.n_plus_one:
+                logger.warning(
+                    "Likely N+1: statement executed %s times in one unit of work: %s",
+                    self.shapes[statement],
+                    statement,
+                )
+
+
+def begin_query_stats() -> contextvars.Token["QueryStats | None"] | None:
+    """Opens stats for the context unless an outer scope of the task has them."""
+    stats = current_query_stats.get()
+    if stats is not None and stats.owner is _current_task():
+        return None
+    return current_query_stats.set(QueryStats())
+
+
+def end_query_stats(token: contextvars.Token["QueryStats | None"] | None) -> None:
+    if token is None:
+        return
+
+    stats = current_query_stats.get()
+    current_query_stats.reset(token)
+    if stats is not None:
+        stats.report()
+
+
+@contextlib.contextmanager
+def query_budget(
+    max_statements: int | None = None, max_repeats: int | None = None
+) -> Generator[QueryStats]:
+    """
+    Fails with `QueryBudgetExceeded` as soon as the code inside runs more than
+    `max_statements` statements or one statement more than `max_repeats` times.
+
+    Example usage:
+
+    with query_budget(max_statements=3, max_repeats=1):
+        await service.craft_from_recipes(user, orders)
+    """
+    stats = QueryStats(max_statements=max_statements, max_repeats=max_repeats)
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
@@ -46,6 +46,38 @@ class Metric(BaseStructure):
     label: str = ""
 
 
+class HistogramMetric(BaseStructure):
+    app_env: str
+    stage: str
+    date: datetime.datetime
+    key: str
+    label: str = ""
+    count: int
+    sum: float
+    min: float
+    max: float
+    # Non-empty log buckets, see `src.shared.observability.histogram`
+    bucket_upper_bounds: list[float]
+    bucket_counts: list[int]
+
+
+class Profile(BaseStructure):
+    app_env: str
+    stage: str
+    date: datetime.datetime
+    pod_name: str
+    thread_name: str
+    # Folded stack, root first: "module:func;module:func"
+    stack: str
+    samples: int
+    sample_rate: float
+
+
+class ProfileStack(BaseStructure):
+    stack: str
+    samples: int
+
+
 class Log(BaseStructure):
     # OTEL format
     timestamp: datetime.datetime = Field(..., serialization_alias="Timestamp")
@@ -0,0 +1,167 @@
+"""
+Local append-only spill for observability batches.
+
+Batches that could not be sent to ClickHouse are framed into segment files
+and replayed once it is reachable again, so an outage costs disk instead of
+memory.
+"""
+
+import logging
+import os
+import pickle
+import stat
+import struct
+import threading
+import time
+import typing as tp
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger("deus-vult.ch.spill")
+
+
+def _is_private(directory: Path) -> bool:
+    """
+    Whether only this user (or root) can have written files into the
+    directory: it is owner-only, and no parent is writable by others unless
+    sticky, like `/tmp`.
+    """
+    uid = os.getuid()
+    info = directory.lstat()
+    if stat.S_ISLNK(info.st_mode) or info.st_uid != uid:
+        return False
+    if info.st_mode & 0o077:
+        # Created by an older version or a loose umask, but ours
+        directory.chmod(0o700)
+
+    for parent in directory.absolute().parents:
+        info = parent.stat()
+        if info.st_uid not in (uid, 0):
+            return False
+        if info.st_mode & 0o022 and not info.st_mode & stat.S_ISVTX:
+            return False
+    return True
+
+
+class SpillLog:
+    """
+    Segment files of `(length, crc32, pickle)` frames, one log per table.
+
+    Appends go to the active segment; `rotate()` seals it so it can be replayed
+    and removed while new spills keep going to a fresh one. A torn or corrupt
+    frame ends the segment, everything before it is still replayed.
+
+    Frames are unpickled, so the directory must be private to this user: in
+    one others could write to, nothing is spilled or replayed.
+
+    Example usage:
+
+    spill.append((column_names, rows))
+    for segment in spill.sealed_segments():
+        for column_names, rows in spill.read(segment): ...
+        spill.remove(segment)
+    """
+
+    HEADER = struct.Struct("<II")
+    SUFFIX = ".seg"
+
+    def __init__(
+        self,
+        directory: str | Path,
+        name: str,
+        max_bytes: int,
+        segment_bytes: int = 16 * 1024 * 1024,
+    ) -> None:
+        self.directory = Path(directory)
+        self.name = name
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+
+        self._lock = threading.Lock()
+        self._active: Path | None = None
+        self._active_bytes = 0
+        self._trusted: bool | None = None
+        self._bytes = sum(path.stat().st_size for path in self._segments())
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def _is_trusted(self) -> bool:
+        if self._trusted is None:
+            if not self.directory.is_dir():
+                return False
+            self._trusted = _is_private(self.directory)
+            if not self._trusted:
+                logger.error(
+                    "Spill directory %s is writable by other users, spilling is "
+                    "disabled",
+                    self.directory,
+                )
+        return self._trusted
+
+    def _segments(self) -> list[Path]:
+        if not self._is_trusted():
+            return []
+        # Segment names embed a monotonic timestamp, so name order is age order
+        return sorted(self.directory.glob(f"{self.name}.*{self.SUFFIX}"))
+
+    def append(self, payload: tp.Any) -> bool:
+        """Durably appends a frame, returns False if the log is full."""
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        frame = self.HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self._lock:
+            if self._bytes + len(frame) > self.max_bytes:
+                return False
+
+            if self._active is None or self._active_bytes >= self.segment_bytes:
+                self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+                if not self._is_trusted():
+                    return False
+                self._active = (
+                    self.directory / f"{self.name}.{time.time_ns():020d}{self.SUFFIX}"
+                )
+                self._active_bytes = 0
+
+            with open(self._active, "ab") as file:
+                file.write(frame)
+                file.flush()
+                os.fsync(file.fileno())
+
+            self._active_bytes += len(frame)
+            self._bytes += len(frame)
+        return True
+
+    def rotate(self) -> None:
+        """Seals the active segment, new appends start a fresh one."""
+        with self._lock:
+            self._active = None
+            self._active_bytes = 0
+
+    def sealed_segments(self) -> list[Path]:
+        with self._lock:
+            return [path for path in self._segments() if path != self._active]
+
+    def read(self, path: Path) -> tp.Iterator[tp.Any]:
+        with open(path, "rb") as file:
+            while header := file.read(self.HEADER.size):
+                if len(header) < self.HEADER.size:
+                    break
+
+                length, checksum = self.HEADER.unpack(header)
+                data = file.read(length)
+                if len(data) < length or zlib.crc32(data) != checksum:
+                    logger.warning("Truncated spill frame in %s, skipping rest", path)
+                    break
+
+                yield pickle.loads(data)
+
+    def remove(self, path: Path) -> None:
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            self._bytes = max(self._bytes - size, 0)
@@ -0,0 +1,18 @@
+CREATE TABLE operation.histograms
+(
+    app_env LowCardinality(String),
+    stage LowCardinality(String),
+    date DateTime64,
+    key LowCardinality(String),
+    label String DEFAULT '',
+
+    count UInt64,
+    sum Float64,
+    min Float64,
+    max Float64,
+    bucket_upper_bounds Array(Float64) CODEC(ZSTD(1)),
+    bucket_counts Array(UInt64) CODEC(ZSTD(1))
+)
+ENGINE = MergeTree()
+ORDER BY (app_env, stage, key, date)
+TTL toDateTime(date) + INTERVAL 60 DAY
@@ -0,0 +1,15 @@
+CREATE TABLE operation.profiles
+(
+    app_env LowCardinality(String),
+    stage LowCardinality(String),
+    date DateTime64,
+    pod_name LowCardinality(String),
+    thread_name LowCardinality(String),
+
+    stack String CODEC(ZSTD(3)),
+    samples UInt32,
+    sample_rate Float32
+)
+ENGINE = MergeTree()
+ORDER BY (app_env, stage, date)
+TTL toDateTime(date) + INTERVAL 14 DAY
@@ -1,20 +1,158 @@
+import asyncio
+import collections
+import contextlib
+import gc
+import logging
 import os
+import re
+import sys
+import threading
+import time
+import traceback
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
 
 import psutil
 
 from src.shared.observability.metrics import MetricsStorage
 from src.shared.worker import BaseWorker
 
+# "Task-12", "worker-loop-3" -> "Task", "worker-loop"
+_TASK_SUFFIX = re.compile(r"[-_.]?\d+$")
+
 
 class SystemUsageMonitoring(BaseWorker):
+    """
+    Process and event loop health, flushed as `system.usage.*` metrics:
+
+    - CPU and RSS of the process;
+    - `loop_lag`: how late a periodic `sleep` wakes up, sampled every
+      `LAG_INTERVAL`;
+    - `slow_callbacks`: stalls longer than `SLOW_CALLBACK`, detected by a
+      watchdog thread which logs the loop thread's stack while it is blocked;
+    - `tasks` per name prefix, or per coroutine for default-named tasks;
+    - `gc_pause` per generation;
+    - threads and default executor utilization.
+    """
+
     INTERVAL = 15
+    LAG_INTERVAL = 0.1
+    SLOW_CALLBACK = 0.25
 
+    logger = logging.getLogger("deus-vult.system_usage")
     metrics = MetricsStorage("system.usage")
 
     def __init__(self) -> None:
         super().__init__()
         self.process = psutil.Process(os.getpid())
 
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._lag_task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        # Last time the loop got to run the lag sampler
+        self._heartbeat = time.monotonic()
+        self._gc_started_at = 0.0
+        # (generation, seconds), drained into histograms by `run_once`
+        self._gc_pauses: collections.deque[tuple[int, float]] = collections.deque(
+            maxlen=10_000
+        )
+
+    """
+    LOOP LAG
+    """
+
+    async def _sample_lag(self) -> None:
+        assert self._loop is not None
+        while not self._shutting_down:
+            expected = self._loop.time() + self.LAG_INTERVAL
+            await asyncio.sleep(self.LAG_INTERVAL)
+            self._heartbeat = time.monotonic()
+            self.metrics.observe("loop_lag", max(self._loop.time() - expected, 0.0))
+
+    def _watch(self) -> None:
+        """Watchdog thread: captures the loop's stack while it is stalled."""
+        stalled_since: float | None = None
+        while not self._shutting_down:
+            time.sleep(self.LAG_INTERVAL / 2)
+            stalled = time.monotonic() - self._heartbeat - self.LAG_INTERVAL
+
+            if stalled < self.SLOW_CALLBACK:
+                if stalled_since is not None:
+                    self.metrics.observe(
+                        "slow_callback_duration", time.monotonic() - stalled_since
+                    )
+                    stalled_since = None
+                continue
+
+            if stalled_since is not None:
+                continue
+
+            stalled_since = time.monotonic() - stalled
+            self.metrics.increment("slow_callbacks")
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            if frame is not None:
+                self.logger.warning(
+                    "Event loop blocked for over %.0f ms in:\n%s",
+                    self.SLOW_CALLBACK * 1000,
+                    "".join(traceback.format_stack(frame)),
+                )
+
+    """
+    GC
+    """
+
+    def _on_gc(self, phase: str, info: dict[str, tp.Any]) -> None:
+        # A collection can run while this thread holds its metrics shard lock,
+        # so nothing here may touch `MetricsStorage`
+        if phase == "start":
+            self._gc_started_at = time.perf_counter()
+        elif self._gc_started_at:
+            self._gc_pauses.append(
+                (info["generation"], time.perf_counter() - self._gc_started_at)
+            )
+            self._gc_started_at = 0.0
+
+    def _report_gc(self) -> None:
+        while self._gc_pauses:
+            generation, pause = self._gc_pauses.popleft()
+            self.metrics.observe("gc_pause", pause, label=f".gen{generation}")
+
+    """
+    SNAPSHOTS
+    """
+
+    @staticmethod
+    def _task_prefix(task: asyncio.Task[tp.Any]) -> str:
+        name = task.get_name()
+        if name.startswith("Task-"):
+            coro = task.get_coro()
+            return getattr(coro, "__qualname__", "Task")
+        return _TASK_SUFFIX.sub("", name)
+
+    def _report_tasks(self) -> None:
+        assert self._loop is not None
+        counts = collections.Counter(
+            self._task_prefix(task) for task in asyncio.all_tasks(self._loop)
+        )
+        for prefix, count in counts.items():
+            self.metrics.set("tasks", count, label=f".{prefix}")
+
+    def _report_threads(self) -> None:
+        self.metrics.set("threads", threading.active_count())
+
+        # Private, but the only way to see the pool behind `asyncio.to_thread`
+        executor = getattr(self._loop, "_default_executor", None)
+        if isinstance(executor, ThreadPoolExecutor):
+            threads = len(executor._threads)
+            idle = executor._idle_semaphore._value
+            self.metrics.set("executor.threads", threads)
+            self.metrics.set("executor.queued", executor._work_queue.qsize())
+            self.metrics.set(
+                "executor.utilization",
+                (threads - idle) / max(executor._max_workers, 1),
+            )
+
     async def run_once(self) -> None:
         try:
             assert self.metrics
@@ -26,3 +164,31 @@ class SystemUsageMonitoring(BaseWorker):
 
         self.metrics.set("cpu", cpu_percent)
         self.metrics.set("memory", memory_used)
+
+        self._report_tasks()
+        self._report_threads()
+        self._report_gc()
+
+    """
+    LIFECYCLE
+    """
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+
+        super().start()
+        self._lag_task = asyncio.create_task(self._sample_lag(), name="loop-lag")
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        gc.callbacks.append(self._on_gc)
+
+    def stop(self) -> None:
+        super().stop()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        with contextlib.suppress(ValueError):
+            gc.callbacks.remove(self._on_gc)
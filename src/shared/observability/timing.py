@@ -0,0 +1,48 @@
+"""
+Per-request time breakdown.
+
+Code paths that wait on a backend (database, LLM, cache) add their elapsed
+time under a short name; the HTTP middleware reports the totals in the
+`Server-Timing` header. Outside a request nothing is recorded.
+"""
+
+import contextlib
+import contextvars
+import time
+from collections.abc import Generator
+
+request_timings: contextvars.ContextVar[dict[str, float] | None] = (
+    contextvars.ContextVar("request_timings", default=None)
+)
+
+
+def add_timing(name: str, seconds: float) -> None:
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed(name: str) -> Generator[None]:
+    """
+    Example usage:
+
+    with timed("llm"):
+        response = await agent.run(query)
+    """
+    if request_timings.get() is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+
+def server_timing_header(timings: dict[str, float], total: float) -> bytes:
+    """Formats the timings (seconds) as a `Server-Timing` value, in ms."""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
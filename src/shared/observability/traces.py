@@ -1,25 +1,33 @@
+import collections
 import contextlib
+import enum
 import functools
 import inspect
 import json
 import socket
 import sys
+import threading
+import types
 import typing as tp
 from collections.abc import Generator
 
 import pydantic
 from opentelemetry.context.context import Context
 from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
-from opentelemetry.sdk.trace.export import (  # type: ignore
-    SimpleSpanProcessor,
-    SpanExporter,
-    SpanExportResult,
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.trace import (
+    Link,
+    SpanKind,
+    Tracer,
+    TraceState,
+    get_current_span,
+    get_tracer,
+    set_tracer_provider,
 )
-from opentelemetry.trace import Tracer, get_tracer, set_tracer_provider
 from opentelemetry.trace.status import StatusCode
-from opentelemetry.util.types import AttributeValue
+from opentelemetry.util.types import Attributes, AttributeValue
 
-from src.shared.config import shared_config
+from src.shared.config import shared_config, tracing_config
 from src.shared.observability import schemas
 
 if tp.TYPE_CHECKING:
@@ -31,6 +39,7 @@ __all__ = [
     "tracer",
     "traced_function",
     "async_traced_function",
+    "set_tracing_enabled",
 ]
 
 _STATUS_CODE = {
@@ -39,66 +48,234 @@ _STATUS_CODE = {
     StatusCode.ERROR: "ERROR",
 }
 
+# Trace ids are compared on their lower 64 bits, like `TraceIdRatioBased`
+_TRACE_ID_MASK = 0xFFFFFFFFFFFFFFFF
+
 tracer: Tracer = get_tracer("deus-vult")
-F = tp.TypeVar("F", bound=tp.Callable[..., tp.Any])
 
 
-def _serialize_argument(value: tp.Any) -> AttributeValue:
-    if isinstance(value, str | bool | int | float):
+def _stringify(attributes: tp.Mapping[str, tp.Any] | None) -> dict[str, str]:
+    if not attributes:
+        return {}
+    return {key: str(value) for key, value in attributes.items()}
+
+
+def _serialize_argument(value: tp.Any, max_length: int) -> AttributeValue:
+    if isinstance(value, bool | int | float):
         return value
 
-    if isinstance(value, list | dict | tuple):
-        with contextlib.suppress(Exception):
-            return json.dumps(value)
+    if isinstance(value, enum.Enum):
+        value = value.value
+    elif isinstance(value, list | dict | tuple):
+        try:
+            value = json.dumps(value, default=str)
+        except Exception:
+            value = repr(value)
+    elif isinstance(value, pydantic.BaseModel):
+        value = value.model_dump_json()
+    elif not isinstance(value, str):
+        value = repr(value)
+
+    text = str(value)
+    return text if len(text) <= max_length else text[:max_length] + "..."
+
+
+"""
+TRACED FUNCTIONS
+"""
+
 
-    if isinstance(value, pydantic.BaseModel):
-        return value.model_dump_json()
+class _TracingSwitch:
+    # Checked by every traced function before doing anything else
+    enabled = True
 
-    return repr(value)
 
+_switch = _TracingSwitch()
 
-@contextlib.contextmanager
-def _trace_function_args(  # type: ignore
-    signature: inspect.Signature, func: F, *args, **kwargs
-) -> Generator[None]:
-    bound = signature.bind(*args, **kwargs)
-    bound.apply_defaults()
+# Traced argument names, values and length cap
+SpanArguments = tuple[tuple[str, ...], tuple[tp.Any, ...], int]
+# Span id -> traced arguments, serialized only once the span is exported
+_span_arguments: dict[int, SpanArguments] = {}
+
+# Recorded by default; anything else needs to be allow-listed with `record=`
+_SAFE_ARGUMENT_TYPES = (str, int, float, bool, enum.Enum)
+MAX_ARGUMENT_LENGTH = 256
+
+
+def set_tracing_enabled(enabled: bool) -> None:
+    """Turns every traced function into a plain call (`False`) or back."""
+    _switch.enabled = enabled
+
+
+def _is_safe_annotation(annotation: tp.Any) -> bool:
+    origin = tp.get_origin(annotation)
+    if origin is tp.Literal:
+        return True
+    if origin is tp.Union or origin is types.UnionType:
+        return all(
+            arg is type(None) or _is_safe_annotation(arg)
+            for arg in tp.get_args(annotation)
+        )
+    return isinstance(annotation, type) and issubclass(annotation, _SAFE_ARGUMENT_TYPES)
+
+
+def _recorded_arguments(
+    func: tp.Callable[..., tp.Any], record: tp.Iterable[str] | None
+) -> tuple[tuple[str, int, tp.Any], ...]:
+    """
+    `(name, position, default)` of the arguments worth recording: the
+    allow-listed ones, or by default those annotated with plain scalar types.
+    ORM rows, messages and other heavy objects are left out.
+    """
+    try:
+        signature = inspect.signature(func, eval_str=True)
+    except Exception:
+        # Unresolvable (e.g. `TYPE_CHECKING`-only) annotations
+        signature = inspect.signature(func)
+
+    allowed = set(record) if record is not None else None
+    recorded: list[tuple[str, int, tp.Any]] = []
+    for position, (name, parameter) in enumerate(signature.parameters.items()):
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        if parameter.kind is parameter.KEYWORD_ONLY:
+            position = -1
+
+        if allowed is not None:
+            if name not in allowed:
+                continue
+        elif name in ("self", "cls") or not _is_safe_annotation(parameter.annotation):
+            continue
+
+        default = parameter.default
+        if default is parameter.empty:
+            default = None
+        recorded.append((name, position, default))
+
+    return tuple(recorded)
+
+
+def _start_span(
+    name: str,
+    recorded: tuple[tuple[str, int, tp.Any], ...],
+    max_length: int,
+    args: tuple[tp.Any, ...],
+    kwargs: dict[str, tp.Any],
+) -> contextlib.AbstractContextManager[tp.Any]:
+    span_cm = tracer.start_as_current_span(name)
+    if not recorded:
+        return span_cm
+
+    @contextlib.contextmanager
+    def _with_arguments() -> Generator[None]:
+        with span_cm as span:
+            if span.is_recording():
+                # Only references are kept here, see `BatchingSpanProcessor`
+                _span_arguments[span.get_span_context().span_id] = (
+                    tuple(name for name, _, _ in recorded),
+                    tuple(
+                        args[position]
+                        if 0 <= position < len(args)
+                        else kwargs.get(name, default)
+                        for name, position, default in recorded
+                    ),
+                    max_length,
+                )
+            yield
+
+    return _with_arguments()
+
+
+def _serialize_span_arguments(arguments: SpanArguments) -> dict[str, str]:
+    names, values, max_length = arguments
+    return {
+        name: str(_serialize_argument(value, max_length))
+        for name, value in zip(names, values, strict=True)
+    }
+
+
+@tp.overload
+def traced_function[F: tp.Callable[..., tp.Any]](func: F) -> F: ...
+
+
+@tp.overload
+def traced_function[F: tp.Callable[..., tp.Any]](
+    *, record: tp.Iterable[str] | None = None, max_length: int = MAX_ARGUMENT_LENGTH
+) -> tp.Callable[[F], F]: ...
+
+
+def traced_function[F: tp.Callable[..., tp.Any]](
+    func: F | None = None,
+    *,
+    record: tp.Iterable[str] | None = None,
+    max_length: int = MAX_ARGUMENT_LENGTH,
+) -> F | tp.Callable[[F], F]:
+    """
+    Runs the function in a span. See `async_traced_function` for arguments.
+    """
+
+    def decorator(func: F) -> F:
+        name = func.__qualname__
+        recorded = _recorded_arguments(func, record)
+
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):  # type: ignore
+            if not _switch.enabled:
+                return func(*args, **kwargs)
+
+            with _start_span(name, recorded, max_length, args, kwargs):
+                return func(*args, **kwargs)
+
+        return tp.cast(F, _wrapper)
 
-    self = bound.arguments.get("self")
-    if self is not None:
-        func_name = f"{self.__class__.__name__}.{func.__name__}"
-    else:
-        func_name = func.__name__
+    return decorator if func is None else decorator(func)
 
-    with tracer.start_as_current_span(
-        func_name,
-        attributes={
-            key: _serialize_argument(value) for key, value in bound.arguments.items()
-        },
-    ):
-        yield
 
+@tp.overload
+def async_traced_function[F: tp.Callable[..., tp.Any]](func: F) -> F: ...
 
-def traced_function(func: F) -> F:
-    signature = inspect.signature(func)
 
-    @functools.wraps(func)
-    def _wrapper(*args, **kwargs):  # type: ignore
-        with _trace_function_args(signature, func, *args, **kwargs):
-            return func(*args, **kwargs)
+@tp.overload
+def async_traced_function[F: tp.Callable[..., tp.Any]](
+    *, record: tp.Iterable[str] | None = None, max_length: int = MAX_ARGUMENT_LENGTH
+) -> tp.Callable[[F], F]: ...
 
-    return tp.cast(F, _wrapper)
 
+def async_traced_function[F: tp.Callable[..., tp.Any]](
+    func: F | None = None,
+    *,
+    record: tp.Iterable[str] | None = None,
+    max_length: int = MAX_ARGUMENT_LENGTH,
+) -> F | tp.Callable[[F], F]:
+    """
+    Runs the coroutine function in a span named after its qualified name.
 
-def async_traced_function(func: F) -> F:
-    signature = inspect.signature(func)
+    Arguments to record are resolved once, at decoration: `record` lists them
+    explicitly, by default scalar-annotated ones are taken. Values are only
+    referenced while the span runs and serialized (capped to `max_length`)
+    if the span gets exported.
 
-    @functools.wraps(func)
-    async def _wrapper(*args, **kwargs):  # type: ignore
-        with _trace_function_args(signature, func, *args, **kwargs):
-            return await func(*args, **kwargs)
+    Example usage:
 
-    return tp.cast(F, _wrapper)
+    @async_traced_function
+    @async_traced_function(record=("user_id", "payload"))
+    """
+
+    def decorator(func: F) -> F:
+        name = func.__qualname__
+        recorded = _recorded_arguments(func, record)
+
+        @functools.wraps(func)
+        async def _wrapper(*args, **kwargs):  # type: ignore
+            if not _switch.enabled:
+                return await func(*args, **kwargs)
+
+            with _start_span(name, recorded, max_length, args, kwargs):
+                return await func(*args, **kwargs)
+
+        return tp.cast(F, _wrapper)
+
+    return decorator if func is None else decorator(func)
 
 
 class ConsoleSpanProcessor(SpanProcessor):
@@ -134,74 +311,234 @@ class ConsoleSpanProcessor(SpanProcessor):
         return True
 
 
-class InserterExporter(SpanExporter):
-    inserter: tp.Optional["Inserter"] = None  # round imports
+class HeadSampler(Sampler):
+    """
+    Decides once per trace, at its root span, deterministically from the trace
+    id. Children follow their parent. Unsampled traces are still recorded so
+    `BatchingSpanProcessor` can keep them if they fail or turn out slow; a
+    zero ratio drops the trace altogether.
+    """
+
+    def __init__(self, ratio: float, overrides: tp.Mapping[str, float]) -> None:
+        self.ratio = ratio
+        # Longest prefix first, so the most specific override wins
+        self.overrides = sorted(overrides.items(), key=lambda x: -len(x[0]))
+        self._ratios: dict[str, float] = {}
+
+    def _ratio(self, name: str) -> float:
+        ratio = self._ratios.get(name)
+        if ratio is None:
+            ratio = next(
+                (r for prefix, r in self.overrides if name.startswith(prefix)),
+                self.ratio,
+            )
+            if len(self._ratios) < 4096:
+                self._ratios[name] = ratio
+        return ratio
+
+    def should_sample(
+        self,
+        parent_context: Context | None,
+        trace_id: int,
+        name: str,
+        kind: SpanKind | None = None,
+        attributes: Attributes = None,
+        links: tp.Sequence[Link] | None = None,
+        trace_state: TraceState | None = None,
+    ) -> SamplingResult:
+        parent = get_current_span(parent_context)
+        parent_context_ = parent.get_span_context()
+        if parent_context_.is_valid:
+            if not parent.is_recording():
+                return SamplingResult(Decision.DROP)
+            sampled = parent_context_.trace_flags.sampled
+        else:
+            ratio = self._ratio(name)
+            if ratio <= 0:
+                return SamplingResult(Decision.DROP)
+            sampled = (trace_id & _TRACE_ID_MASK) < ratio * (_TRACE_ID_MASK + 1)
+
+        return SamplingResult(
+            Decision.RECORD_AND_SAMPLE if sampled else Decision.RECORD_ONLY,
+            attributes,
+        )
+
+    def get_description(self) -> str:
+        return f"HeadSampler{{ratio={self.ratio}}}"
+
+
+# Ended span with the traced arguments of its function, if any
+PendingSpan = tuple[ReadableSpan, SpanArguments | None]
+
+
+class BatchingSpanProcessor(SpanProcessor):
+    """
+    Holds the ended spans of a trace until its root ends, then either drops
+    them or encodes them straight into the inserter's columnar buffer, which
+    batches the writes. A trace is kept when head-sampled, when any span
+    failed, or when the root took at least `slow_ns`.
+    """
+
     fqdn = socket.getfqdn()
 
-    @staticmethod
-    def _insure_attributes(attributes: tp.Mapping[str, tp.Any]) -> dict[str, str]:
-        return {key: str(value) for key, value in attributes.items()}
-
-    def export(self, spans: tp.Sequence[ReadableSpan]) -> SpanExportResult:
-        if self.inserter is None:
-            raise RuntimeError("Inserter is not initialized")
-
-        for span in spans:
-            if not span.context:
-                raise RuntimeError("Span context is not initialized")
-
-            assert span.start_time is not None
-            assert span.end_time is not None
-
-            trace = schemas.Trace(
-                timestamp=span.start_time,
-                trace_id=hex(span.context.trace_id),
-                span_id=hex(span.context.span_id),
-                parent_span_id=hex(span.parent.span_id) if span.parent else "",
-                trace_state=repr(span.context.trace_state),
-                span_name=span.name,
-                span_kind=str(span.kind),
-                service_name=self.fqdn,
-                resource_attributes=self._insure_attributes(span.resource.attributes),
-                span_attributes=self._insure_attributes(span.attributes or {}),
-                duration=span.end_time - span.start_time,
-                status_code=_STATUS_CODE[span.status.status_code],
-                status_message=span.status.description or "",
-                events_timestamps=[event.timestamp for event in span.events],
-                events_names=[event.name for event in span.events],
-                events_attributes=[
-                    self._insure_attributes(event.attributes or {})
-                    for event in span.events
-                ],
-                links_trace_ids=[hex(link.context.trace_id) for link in span.links],
-                links_span_ids=[hex(link.context.span_id) for link in span.links],
-                links_trace_states=[
-                    repr(link.context.trace_state) for link in span.links
-                ],
-                links_attributes=[
-                    self._insure_attributes(link.attributes or {})
-                    for link in span.links
-                ],
-                app_env=shared_config.app_env,
-                stage=shared_config.stage,
-            )
+    def __init__(
+        self,
+        inserter: "Inserter",
+        slow_ns: int,
+        sample_errors: bool = True,
+        max_pending_traces: int = 10_000,
+    ) -> None:
+        self.inserter = inserter
+        self.slow_ns = slow_ns
+        self.sample_errors = sample_errors
+        self.max_pending_traces = max_pending_traces
+
+        self._pending: collections.OrderedDict[int, list[PendingSpan]] = (
+            collections.OrderedDict()
+        )
+        # Outcome of finished traces, for spans ending after their root
+        self._decided: collections.OrderedDict[int, bool] = collections.OrderedDict()
+        self._resource_attributes: dict[int, dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def on_start(
+        self, span: ReadableSpan, parent_context: Context | None = None
+    ) -> None:
+        return
 
-            self.inserter.insert(trace)
+    def _keep(self, root: ReadableSpan, spans: list[PendingSpan]) -> bool:
+        assert root.context is not None
+        if root.context.trace_flags.sampled:
+            return True
 
-        return SpanExportResult.SUCCESS
+        assert root.end_time is not None and root.start_time is not None
+        if root.end_time - root.start_time >= self.slow_ns:
+            return True
+
+        return self.sample_errors and any(
+            span.status.status_code is StatusCode.ERROR for span, _ in spans
+        )
+
+    def _remember(self, trace_id: int, keep: bool) -> None:
+        self._decided[trace_id] = keep
+        if len(self._decided) > self.max_pending_traces:
+            self._decided.popitem(last=False)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        context = span.context
+        if context is None:
+            return
+
+        trace_id = context.trace_id
+        pending = (span, _span_arguments.pop(context.span_id, None))
+        with self._lock:
+            keep = self._decided.get(trace_id)
+            if keep is None and span.parent is not None and not span.parent.is_remote:
+                self._pending.setdefault(trace_id, []).append(pending)
+                if len(self._pending) <= self.max_pending_traces:
+                    return
+
+                # A root that never ends: settle its trace on the head decision
+                trace_id, spans = self._pending.popitem(last=False)
+                keep = self._head_sampled(spans)
+            elif keep is None:
+                spans = self._pending.pop(trace_id, [])
+                spans.append(pending)
+                keep = self._keep(span, spans)
+            else:
+                spans = [pending]
+
+            self._remember(trace_id, keep)
+
+        if keep:
+            self._write(spans)
+
+    @staticmethod
+    def _head_sampled(spans: list[PendingSpan]) -> bool:
+        return any(
+            span.context.trace_flags.sampled for span, _ in spans if span.context
+        )
+
+    def _write(self, spans: list[PendingSpan]) -> None:
+        for span, arguments in spans:
+            self.inserter.insert_row(schemas.Trace, self._encode(span, arguments))
+
+    def _resource(self, span: ReadableSpan) -> dict[str, str]:
+        # A provider has a single resource, encode it once
+        attributes = self._resource_attributes.get(id(span.resource))
+        if attributes is None:
+            attributes = _stringify(span.resource.attributes)
+            self._resource_attributes[id(span.resource)] = attributes
+        return attributes
+
+    def _encode(
+        self, span: ReadableSpan, arguments: SpanArguments | None = None
+    ) -> tuple[tp.Any, ...]:
+        """Encodes the span in `schemas.Trace` field order."""
+        context = span.context
+        assert context is not None
+        assert span.start_time is not None and span.end_time is not None
+
+        attributes = _stringify(span.attributes)
+        if arguments is not None:
+            attributes.update(_serialize_span_arguments(arguments))
+
+        events = span.events
+        links = span.links
+        return (
+            span.start_time,
+            hex(context.trace_id),
+            hex(context.span_id),
+            hex(span.parent.span_id) if span.parent else "",
+            repr(context.trace_state),
+            span.name,
+            str(span.kind),
+            self.fqdn,
+            self._resource(span),
+            attributes,
+            span.end_time - span.start_time,
+            _STATUS_CODE[span.status.status_code],
+            span.status.description or "",
+            [event.timestamp for event in events],
+            [event.name for event in events],
+            [_stringify(event.attributes) for event in events],
+            [hex(link.context.trace_id) for link in links],
+            [hex(link.context.span_id) for link in links],
+            [repr(link.context.trace_state) for link in links],
+            [_stringify(link.attributes) for link in links],
+            shared_config.app_env,
+            shared_config.stage,
+        )
 
     def shutdown(self) -> None:
-        # All shutdown and force_flush operations will be handled
-        # on the Inserter side on exit.
-        return
+        self.force_flush()
 
     def force_flush(self, timeout_millis: int = 30000) -> bool:
+        # Unfinished traces are written on their head decision, the inserter
+        # takes care of sending its buffer on exit.
+        with self._lock:
+            pending, self._pending = self._pending, collections.OrderedDict()
+
+        for spans in pending.values():
+            if self._head_sampled(spans):
+                self._write(spans)
         return True
 
 
 def configure_tracing(inserter_class: type["Inserter"]) -> None:
-    InserterExporter.inserter = inserter_class("operation.traces")
-    provider = TracerProvider()
-
-    provider.add_span_processor(SimpleSpanProcessor(InserterExporter()))
+    set_tracing_enabled(tracing_config.enabled)
+    provider = TracerProvider(
+        sampler=HeadSampler(
+            tracing_config.sample_ratio, tracing_config.sample_overrides
+        )
+    )
+
+    provider.add_span_processor(
+        BatchingSpanProcessor(
+            inserter_class("operation.traces"),
+            slow_ns=tracing_config.slow_trace_ms * 1_000_000,
+            sample_errors=tracing_config.sample_errors,
+            max_pending_traces=tracing_config.max_pending_traces,
+        )
+    )
     set_tracer_provider(provider)
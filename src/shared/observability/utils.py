@@ -1,11 +1,13 @@
 import contextlib
 import typing as tp
 
+from src.shared.config import profiling_config
 from src.shared.observability.ch_utils import Inserter, clickhouse_default
 from src.shared.observability.logging_utils import (
     configure_logging as _configure_logging,
 )
 from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.profiler import SamplingProfiler
 from src.shared.observability.system_usage import SystemUsageMonitoring
 from src.shared.observability.traces import configure_tracing
 
@@ -19,7 +21,16 @@ def configure_logging() -> None:
 async def with_observability() -> tp.AsyncGenerator[None, None]:
     system_usage_monitoring = SystemUsageMonitoring()
     system_usage_monitoring.start()
+    # Opt-in, samples every thread's stack
+    profiler = SamplingProfiler() if profiling_config.enabled else None
+    if profiler is not None:
+        profiler.start()
 
-    async with clickhouse_default():
-        async with MetricsStorage():
-            yield
+    try:
+        async with clickhouse_default():
+            async with MetricsStorage():
+                yield
+    finally:
+        system_usage_monitoring.stop()
+        if profiler is not None:
+            profiler.stop()
@@ -5,11 +5,17 @@ from contextlib import asynccontextmanager
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.shared.database import WRITES_INFO_KEY
+from src.shared.observability.queries import begin_query_stats, end_query_stats
 from src.shared.types import SessionFactory
 
 current_uow: contextvars.ContextVar["UnitOfWork"] = contextvars.ContextVar(
     "current_uow"
 )
+# Set once a primary UoW committed writes; later reads in the context stay on it
+read_your_writes: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "read_your_writes", default=False
+)
 
 logger = logging.getLogger("deus-vult.uow")
 
@@ -17,8 +23,13 @@ logger = logging.getLogger("deus-vult.uow")
 class UnitOfWork:
     """Manages a single session and transaction for a unit of work."""
 
-    def __init__(self, session_factory: SessionFactory):
+    def __init__(
+        self,
+        session_factory: SessionFactory,
+        readonly_session_factory: SessionFactory | None = None,
+    ):
         self._session_factory = session_factory
+        self._readonly_session_factory = readonly_session_factory
         self._session: AsyncSession | None = None
         self._context_token: contextvars.Token[UnitOfWork] | None = None
 
@@ -31,36 +42,118 @@ class UnitOfWork:
             )
         return self._session
 
+    @property
+    def has_writes(self) -> bool:
+        """Whether the active session issued any INSERT/UPDATE/DELETE."""
+        return self._session is not None and bool(
+            self._session.info.get(WRITES_INFO_KEY)
+        )
+
+    def _select_session_factory(self, readonly: bool) -> SessionFactory:
+        if not readonly or self._readonly_session_factory is None:
+            return self._session_factory
+
+        if read_your_writes.get():
+            logger.debug("UoW pinned to primary after a write in this context.")
+            return self._session_factory
+
+        return self._readonly_session_factory
+
+    def _should_join(self, ambient: "UnitOfWork | None", readonly: bool) -> bool:
+        if ambient is None or ambient._session is None:
+            return False
+
+        if not readonly:
+            return True
+
+        # Reads stay on the ambient session when they must see its pending
+        # writes, or when there is no replica to offload them to.
+        return ambient.has_writes or self._readonly_session_factory is None
+
+    @asynccontextmanager
+    async def _join(
+        self, ambient: "UnitOfWork", savepoint: bool
+    ) -> AsyncIterator["UnitOfWork"]:
+        """Runs a nested unit of work on the ambient session."""
+        session = await ambient.get_session()
+
+        # A separate instance keeps services sharing `self` from clobbering
+        # each other's sessions.
+        nested = UnitOfWork(self._session_factory, self._readonly_session_factory)
+        nested._session = session
+        token = current_uow.set(nested)
+        logger.debug("UoW joined ambient session %s (savepoint=%s)", session, savepoint)
+        try:
+            if savepoint:
+                async with session.begin_nested():
+                    yield nested
+            else:
+                yield nested
+        finally:
+            nested._session = None
+            current_uow.reset(token)
+
     @asynccontextmanager
-    async def start(self) -> AsyncIterator["UnitOfWork"]:
-        """Starts a new transaction context for this Unit of Work."""
+    async def start(
+        self, readonly: bool = False, independent: bool = False
+    ) -> AsyncIterator["UnitOfWork"]:
+        """
+        Starts a new transaction context for this Unit of Work.
+
+        Inside an active UoW the ambient session is reused and the nested work
+        runs in a SAVEPOINT, so it holds no extra pooled connection.
+
+        Args:
+            readonly: Route the session to a read replica when one is configured.
+                If the ambient UoW already has uncommitted writes, its session is
+                reused so the reads can see them.
+            independent: Always open a separate session and transaction that
+                commits on its own, regardless of the ambient UoW outcome.
+        """
+        ambient = None if independent else current_uow.get(None)
+        if self._should_join(ambient, readonly):
+            assert ambient is not None
+            async with self._join(ambient, savepoint=not readonly) as nested:
+                yield nested
+            return
 
         self._context_token = current_uow.set(self)
         logger.debug("UoW context started, token set: %s", self._context_token)
+        # Statements of nested and independent units of work add up here
+        stats_token = begin_query_stats()
+
+        session_factory = self._select_session_factory(readonly)
+        try:
+            async with session_factory() as session:
+                self._session = session
+                logger.debug("UoW acquired session: %s", session)
+                try:
+                    yield self  # The UoW instance itself
+                    logger.debug(
+                        "UoW exiting cleanly, session %s will commit.", session
+                    )
+                except Exception:
+                    logger.error(
+                        "UoW caught exception, session %s will roll back.",
+                        session,
+                        exc_info=True,
+                    )
+                    raise
+                finally:
+                    logger.debug("UoW cleaning up (token: %s)...", self._context_token)
+                    self._session = None
+                    if self._context_token:
+                        try:
+                            current_uow.reset(self._context_token)
+                            logger.debug("UoW context variable reset.")
+                        except ValueError:
+                            logger.warning(
+                                "Failed to reset UoW (token: %s)",
+                                self._context_token,
+                            )
+                        self._context_token = None
+        finally:
+            end_query_stats(stats_token)
 
-        async with self._session_factory() as session:
-            self._session = session
-            logger.debug("UoW acquired session: %s", session)
-            try:
-                yield self  # The UoW instance itself
-                logger.debug("UoW exiting cleanly, session %s will commit.", session)
-            except Exception:
-                logger.error(
-                    "UoW caught exception, session %s will roll back.",
-                    session,
-                    exc_info=True,
-                )
-                raise
-            finally:
-                logger.debug("UoW cleaning up (token: %s)...", self._context_token)
-                self._session = None
-                if self._context_token:
-                    try:
-                        current_uow.reset(self._context_token)
-                        logger.debug("UoW context variable reset.")
-                    except ValueError:
-                        logger.warning(
-                            "Failed to reset UoW (token: %s)",
-                            self._context_token,
-                        )
-                    self._context_token = None
+        if session.info.get(WRITES_INFO_KEY):
+            read_your_writes.set(True)
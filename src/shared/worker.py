@@ -35,7 +35,7 @@ class BaseWorker:
                     await self.run_once()
 
                 if self.metrics:
-                    self.metrics.avg("worker.run_time", t.total)
+                    self.metrics.observe("worker.run_time", t.total)
 
                 delay = random.uniform(0, self.RANDOM_DELAY)
                 sleep_time = self.INTERVAL - t.total + delay
@@ -0,0 +1,112 @@
+"""
+Fixtures for tests against a real Postgres, configured through the usual
+`POSTGRES_*` variables; those tests are skipped when it can't be reached.
+"""
+
+import random
+import uuid
+from collections.abc import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col
+
+import src.containers  # noqa: F401  # registers every table
+from src.api.craft.elements.elements_constants import INIT_ELEMENTS
+from src.api.craft.elements.elements_schemas import ElementTable
+from src.api.craft.progress.progress_schemas import DiscoveryTable, ProgressTable
+from src.api.craft.recipes.recipes_schemas import RecipeTable
+from src.api.inventory.inventory_schemas import InventoryItemTable, InventoryTable
+from src.api.users.users_schemas import UserTable
+from src.shared.config import PostgresConfig
+from src.shared.database import Database
+
+db_config = PostgresConfig()  # type: ignore
+
+
+@pytest_asyncio.fixture(scope="function")
+async def database() -> AsyncGenerator[Database]:
+    database = Database(db_config)
+    try:
+        await database.create_all()
+    except OSError:
+        await database.close()
+        pytest.skip("Postgres is not available")
+    yield database
+    await database.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def elements(database: Database) -> AsyncGenerator[list[int]]:
+    """
+    Ascending ids of six fresh elements, removed afterwards together with the
+    recipes and progress referencing them. Initial elements are created too.
+    """
+    async with database.session() as session:
+        for element in INIT_ELEMENTS:
+            await session.execute(
+                insert(ElementTable)
+                .values(**element.model_dump())
+                .on_conflict_do_nothing(index_elements=["object_id"])
+            )
+        created = [
+            ElementTable(name=f"test-{uuid.uuid4().hex[:16]}", emoji="🧪")
+            for _ in range(6)
+        ]
+        session.add_all(created)
+        await session.flush()
+        element_ids = sorted(element.object_id for element in created)
+
+    yield element_ids
+
+    async with database.session() as session:
+        recipe_ids = select(RecipeTable.object_id).where(
+            or_(
+                col(RecipeTable.element_a_id).in_(element_ids),
+                col(RecipeTable.element_b_id).in_(element_ids),
+                col(RecipeTable.result_id).in_(element_ids),
+            )
+        )
+        await session.execute(
+            delete(ProgressTable).where(col(ProgressTable.recipe_id).in_(recipe_ids))
+        )
+        await session.execute(
+            delete(RecipeTable).where(col(RecipeTable.object_id).in_(recipe_ids))
+        )
+        await session.execute(
+            delete(ElementTable).where(col(ElementTable.object_id).in_(element_ids))
+        )
+
+
+@pytest_asyncio.fixture(scope="function")
+async def user(database: Database) -> AsyncGenerator[UserTable]:
+    """A fresh user, removed afterwards with its inventory and progress."""
+    user = UserTable(object_id=random.randint(10**9, 2 * 10**9), first_name="Test")
+    async with database.session() as session:
+        session.add(user)
+
+    yield user
+
+    async with database.session() as session:
+        inventory_ids = select(InventoryTable.object_id).where(
+            InventoryTable.user_id == user.object_id
+        )
+        await session.execute(
+            delete(InventoryItemTable).where(
+                col(InventoryItemTable.inventory_id).in_(inventory_ids)
+            )
+        )
+        await session.execute(
+            delete(InventoryTable).where(InventoryTable.user_id == user.object_id)
+        )
+        await session.execute(
+            delete(ProgressTable).where(ProgressTable.object_id == user.object_id)
+        )
+        await session.execute(
+            delete(DiscoveryTable).where(DiscoveryTable.user_id == user.object_id)
+        )
+        await session.execute(
+            delete(UserTable).where(UserTable.object_id == user.object_id)
+        )
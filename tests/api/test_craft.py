@@ -11,6 +11,7 @@ from app import app as app
 from src import Container
 from src.api.craft.elements.elements_constants import STARTING_ELEMENTS
 from src.api.craft.elements.elements_schemas import ElementTable
+from src.api.inventory.inventory_schemas import InventoryItemTable, InventorySnapshot
 from src.api.users.users_schemas import UserPublic
 from src.shared.config import shared_config
 
@@ -55,6 +56,32 @@ async def test_get_user(client: AsyncClient) -> None:
         assert item.element.name == start_element.name
 
 
+@pytest.mark.asyncio(loop_scope="function")
+async def test_inventory_snapshot(client: AsyncClient) -> None:
+    # Registers the user and their starting inventory
+    assert (await client.get("/users/me")).status_code == 200
+
+    response = await client.get("/inventory")
+    assert response.status_code == 200
+
+    snapshot = InventorySnapshot.model_validate(response.json())
+    assert snapshot.full
+    assert sorted(
+        sub_type_id
+        for sub_type_id, _ in snapshot.items[InventoryItemTable.ItemType.ELEMENT]
+    ) == sorted(element.object_id for element in STARTING_ELEMENTS)
+
+    response = await client.get(
+        "/inventory", params={"since_version": snapshot.version}
+    )
+    assert response.status_code == 200
+
+    delta = InventorySnapshot.model_validate(response.json())
+    assert not delta.full
+    assert delta.version == snapshot.version
+    assert not delta.items
+
+
 @pytest.mark.asyncio(loop_scope="function")
 async def test_save_empty_recipe(client: AsyncClient) -> None:
     container: Container = app.state.container
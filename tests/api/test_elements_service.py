@@ -0,0 +1,256 @@
+"""
+Crafting from recipes, against a real Postgres (see `conftest.py`) and through
+the endpoints with a stubbed service.
+"""
+
+from collections.abc import AsyncGenerator, Iterable
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col
+
+from src import Container
+from src.api.core.dependencies import get_user
+from src.api.craft import craft_router
+from src.api.craft.craft_constants import MAX_CRAFT_QUANTITY
+from src.api.craft.elements.elements_schemas import (
+    BulkCraftRequest,
+    CraftFromRecipeRequest,
+    ElementResponse,
+)
+from src.api.craft.elements.elements_service import ElementsService
+from src.api.craft.progress.progress_cache import DiscoveryCache
+from src.api.craft.progress.progress_schemas import ProgressTable
+from src.api.craft.progress.progress_service import ProgressService
+from src.api.craft.recipes.recipes_graph import RecipeGraph
+from src.api.craft.recipes.recipes_schemas import RecipePublic, RecipeTable
+from src.api.craft.recipes.recipes_service import RecipesService
+from src.api.inventory.inventory_exceptions import InventoryNotEnoughItemsException
+from src.api.inventory.inventory_schemas import InventoryItemTable, InventoryTable
+from src.api.users.users_schemas import UserTable
+from src.shared.counters import CounterAggregator
+from src.shared.database import Database
+from src.shared.event_bus import EventBus
+from src.shared.uow import UnitOfWork
+
+ELEMENT = InventoryItemTable.ItemType.ELEMENT
+
+
+@pytest_asyncio.fixture(scope="function")
+async def recipe_ids(
+    database: Database, elements: list[int], user: UserTable
+) -> list[int]:
+    """
+    Two discovered recipes, `a + b -> c` costing 2 a and `a + c -> d` costing
+    1 b, for a user holding 5 a and 3 b.
+    """
+    a, b, c, d, *_ = elements
+    recipes = [
+        RecipeTable(
+            element_a_id=a, element_b_id=b, result_id=c, resources_cost={str(a): 2}
+        ),
+        RecipeTable(
+            element_a_id=a, element_b_id=c, result_id=d, resources_cost={str(b): 1}
+        ),
+    ]
+    async with database.session() as session:
+        session.add(
+            InventoryTable(
+                user_id=user.object_id,
+                items=[
+                    InventoryItemTable(type=ELEMENT, sub_type_id=a, amount=5),
+                    InventoryItemTable(type=ELEMENT, sub_type_id=b, amount=3),
+                ],
+            )
+        )
+        for recipe in recipes:
+            await session.execute(insert(RecipeTable).values(**recipe.model_dump()))
+            await session.execute(
+                insert(ProgressTable).values(
+                    object_id=user.object_id, recipe_id=recipe.object_id
+                )
+            )
+    return [recipe.object_id for recipe in recipes]
+
+
+@pytest.fixture
+def service(database: Database) -> ElementsService:
+    uow = UnitOfWork(database.session)
+    return ElementsService(
+        uow,
+        ProgressService(
+            uow, CounterAggregator(database.session), DiscoveryCache(), EventBus()
+        ),
+        RecipesService(uow, EventBus(), RecipeGraph([])),
+        elements_agent=None,  # type: ignore[arg-type]
+    )
+
+
+async def _craft(
+    service: ElementsService, user_id: int, orders: Iterable[tuple[int, int]]
+) -> list[ElementResponse]:
+    async with service.uow.start() as uow:
+        user = await (await uow.get_session()).get(UserTable, user_id)
+        assert user is not None
+        return await service.craft_from_recipes(user, orders)
+
+
+async def _amounts(database: Database, user_id: int) -> dict[int, int]:
+    async with database.session() as session:
+        rows = await session.execute(
+            select(InventoryItemTable.sub_type_id, InventoryItemTable.amount)
+            .join(InventoryTable)
+            .where(InventoryTable.user_id == user_id)
+            .where(col(InventoryItemTable.amount) > 0)
+        )
+        return dict(rows.tuples().all())
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_duplicate_orders_are_merged(
+    database: Database,
+    service: ElementsService,
+    user: UserTable,
+    elements: list[int],
+    recipe_ids: list[int],
+) -> None:
+    a, b, c, d, *_ = elements
+    first, second = recipe_ids
+
+    crafted = await _craft(
+        service, user.object_id, [(first, 1), (second, 1), (first, 1)]
+    )
+
+    assert [(element.object_id, element.quantity) for element in crafted] == [
+        (c, 2),
+        (d, 1),
+    ]
+    assert await _amounts(database, user.object_id) == {a: 1, b: 2, c: 2, d: 1}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_not_enough_items_crafts_nothing(
+    database: Database,
+    service: ElementsService,
+    user: UserTable,
+    elements: list[int],
+    recipe_ids: list[int],
+) -> None:
+    a, b, *_ = elements
+    first, second = recipe_ids
+
+    # Enough a for both crafts of `first`, but 4 b where the user has 3
+    with pytest.raises(InventoryNotEnoughItemsException) as error:
+        await _craft(service, user.object_id, [(first, 2), (second, 4)])
+
+    assert f" {b} x4" in str(error.value)
+    assert f" {a} " not in str(error.value)
+    assert await _amounts(database, user.object_id) == {a: 5, b: 3}
+
+
+def test_bulk_request_validation() -> None:
+    assert BulkCraftRequest(recipes=[(1, MAX_CRAFT_QUANTITY)])
+    assert CraftFromRecipeRequest(recipe_id=1).quantity == 1
+
+    for recipes in (
+        [],
+        [(1, 0)],
+        [(1, -1), (2, 2)],
+        [(1, MAX_CRAFT_QUANTITY), (2, 1)],
+    ):
+        with pytest.raises(ValidationError):
+            BulkCraftRequest(recipes=recipes)
+
+    for quantity in (0, MAX_CRAFT_QUANTITY + 1):
+        with pytest.raises(ValidationError):
+            CraftFromRecipeRequest(recipe_id=1, quantity=quantity)
+
+
+class _ElementsService:
+    """Records the orders the endpoints pass on."""
+
+    def __init__(self) -> None:
+        self.orders: list[list[tuple[int, int]]] = []
+
+    async def craft_from_recipe(
+        self, user: UserTable, recipe_id: int, quantity: int = 1
+    ) -> ElementResponse:
+        (response,) = await self.craft_from_recipes(user, [(recipe_id, quantity)])
+        return response
+
+    async def craft_from_recipes(
+        self, user: UserTable, orders: Iterable[tuple[int, int]]
+    ) -> list[ElementResponse]:
+        orders = list(orders)
+        self.orders.append(orders)
+        recipe = RecipePublic(
+            object_id=1, element_a_id=1, element_b_id=2, result_id=3, resources_cost={}
+        )
+        return [
+            ElementResponse(
+                object_id=3,
+                name="Steam",
+                emoji="💨",
+                recipe=recipe,
+                is_first_discovered=False,
+                is_new=False,
+                quantity=quantity,
+            )
+            for _, quantity in orders
+        ]
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client() -> AsyncGenerator[tuple[AsyncClient, _ElementsService]]:
+    stub = _ElementsService()
+    container = Container()
+    container.wire(modules=[craft_router])
+    app = FastAPI()
+    app.include_router(craft_router.craft_router)
+    app.dependency_overrides[get_user] = lambda: UserTable(
+        object_id=1, first_name="Test"
+    )
+
+    with container.elements_service.override(stub):
+        async with AsyncClient(
+            transport=ASGITransport(app), base_url="http://test"
+        ) as client:
+            yield client, stub
+    container.unwire()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_craft_endpoints_pass_quantities(
+    client: tuple[AsyncClient, _ElementsService],
+) -> None:
+    http, stub = client
+
+    response = await http.post("/craft/recipes/craft", json={"recipe_id": 5})
+    assert response.status_code == 200, response.text
+    response = await http.post(
+        "/craft/recipes/craft", json={"recipe_id": 5, "quantity": 3}
+    )
+    assert response.json()["quantity"] == 3
+    response = await http.post(
+        "/craft/recipes/craft/bulk", json={"recipes": [[5, 2], [6, 1], [5, 1]]}
+    )
+    assert [element["quantity"] for element in response.json()["elements"]] == [
+        2,
+        1,
+        1,
+    ]
+    assert stub.orders == [[(5, 1)], [(5, 3)], [(5, 2), (6, 1), (5, 1)]]
+
+    for path, body in (
+        ("/craft/recipes/craft", {"recipe_id": 5, "quantity": 0}),
+        ("/craft/recipes/craft", {"recipe_id": 5, "quantity": MAX_CRAFT_QUANTITY + 1}),
+        ("/craft/recipes/craft/bulk", {"recipes": [[5, MAX_CRAFT_QUANTITY], [6, 1]]}),
+    ):
+        response = await http.post(path, json=body)
+        assert response.status_code == 422
+    assert len(stub.orders) == 3
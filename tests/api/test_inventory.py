@@ -0,0 +1,221 @@
+"""
+Inventory transfer tests against a real Postgres, see `conftest.py`.
+"""
+
+import asyncio
+import random
+from collections.abc import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select, text
+
+from src.api.inventory.inventory_exceptions import (
+    InventoryBusyException,
+    InventoryNotEnoughItemsException,
+)
+from src.api.inventory.inventory_schemas import (
+    InventoryItemTable,
+    InventoryTable,
+    LockMode,
+    _merge_orders,
+)
+from src.api.users.users_schemas import UserTable
+from src.shared.database import Database, retry_on_contention
+from src.shared.exceptions import NotFoundError
+from src.shared.uow import UnitOfWork
+
+ELEMENT = InventoryItemTable.ItemType.ELEMENT
+LOCK_INVENTORY = text("SELECT 1 FROM inventories WHERE object_id = :id FOR UPDATE")
+
+
+def _item(sub_type_id: int, amount: int = 1) -> InventoryItemTable:
+    return InventoryItemTable(type=ELEMENT, sub_type_id=sub_type_id, amount=amount)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def inventory_id(database: Database) -> AsyncGenerator[int]:
+    """An inventory holding 5 of element 1 and 1 of element 2."""
+    user_id = random.randint(10**9, 2 * 10**9)
+    async with database.session() as session:
+        session.add(UserTable(object_id=user_id, first_name="Test"))
+        inventory = InventoryTable(user_id=user_id, items=[_item(1, 5), _item(2)])
+        session.add(inventory)
+        await session.flush()
+        inventory_id = inventory.object_id
+
+    yield inventory_id
+
+    async with database.session() as session:
+        await session.execute(
+            delete(InventoryItemTable).where(
+                InventoryItemTable.inventory_id == inventory_id
+            )
+        )
+        await session.execute(
+            delete(InventoryTable).where(InventoryTable.object_id == inventory_id)
+        )
+        await session.execute(delete(UserTable).where(UserTable.object_id == user_id))
+
+
+async def _load(uow: UnitOfWork, inventory_id: int) -> InventoryTable:
+    session = await uow.get_session()
+    stmt = select(InventoryTable).where(InventoryTable.object_id == inventory_id)
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def _amounts(database: Database, inventory_id: int) -> dict[int, int]:
+    async with database.session() as session:
+        rows = await session.execute(
+            select(InventoryItemTable.sub_type_id, InventoryItemTable.amount).where(
+                InventoryItemTable.inventory_id == inventory_id
+            )
+        )
+        return dict(rows.tuples().all())
+
+
+async def _version(database: Database, inventory_id: int) -> int:
+    async with database.session() as session:
+        stmt = select(InventoryTable.version).where(
+            InventoryTable.object_id == inventory_id
+        )
+        return (await session.execute(stmt)).scalar_one()
+
+
+def test_merge_orders_folds_consumed_and_produced() -> None:
+    orders = _merge_orders(
+        consume=[_item(1, 2), _item(2), _item(1)],
+        produce=[_item(2, 3), _item(7)],
+    )
+
+    assert orders == {
+        (ELEMENT, 1): (3, -3),
+        (ELEMENT, 2): (1, 2),
+        (ELEMENT, 7): (0, 1),
+    }
+
+
+def test_holds_checks_loaded_amounts() -> None:
+    inventory = InventoryTable(user_id=1, items=[_item(1, 2), _item(2)])
+
+    assert inventory.holds(_item(1), _item(2))
+    assert inventory.holds(_item(1), _item(1))
+    assert not inventory.holds(_item(2), _item(2))
+    assert not inventory.holds(_item(3))
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_transfer_applies_amounts(database: Database, inventory_id: int) -> None:
+    uow = UnitOfWork(database.session)
+    async with uow.start():
+        inventory = await _load(uow, inventory_id)
+        await inventory.transfer(
+            consume=[_item(1, 3), _item(2)], produce=[_item(2, 4), _item(3, 2)]
+        )
+
+    assert await _amounts(database, inventory_id) == {1: 2, 2: 4, 3: 2}
+    assert await _version(database, inventory_id) == 1
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_transfer_produces_new_rows(
+    database: Database, inventory_id: int
+) -> None:
+    uow = UnitOfWork(database.session)
+    async with uow.start():
+        inventory = await _load(uow, inventory_id)
+        await inventory.add_items(_item(9, 2))
+
+    amounts = await _amounts(database, inventory_id)
+    assert amounts[9] == 2
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_transfer_without_enough_items_applies_nothing(
+    database: Database, inventory_id: int
+) -> None:
+    uow = UnitOfWork(database.session)
+    with pytest.raises(InventoryNotEnoughItemsException) as error:
+        async with uow.start():
+            inventory = await _load(uow, inventory_id)
+            await inventory.transfer(
+                consume=[_item(1, 2), _item(2, 2)], produce=[_item(3)]
+            )
+
+    assert "2 x2" in error.value.detail
+    assert await _amounts(database, inventory_id) == {1: 5, 2: 1}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_transfer_to_missing_inventory_raises(database: Database) -> None:
+    missing = InventoryTable(object_id=-1, user_id=-1)
+
+    uow = UnitOfWork(database.session)
+    with pytest.raises(NotFoundError):
+        async with uow.start():
+            await missing.add_items(_item(1))
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_concurrent_transfers_serialize(
+    database: Database, inventory_id: int
+) -> None:
+    async def consume_two() -> None:
+        uow = UnitOfWork(database.session)
+        async with uow.start():
+            inventory = await _load(uow, inventory_id)
+            await inventory.remove_items(_item(1, 2))
+
+    results = await asyncio.gather(
+        *(consume_two() for _ in range(3)), return_exceptions=True
+    )
+
+    failed = [result for result in results if result is not None]
+    assert len(failed) == 1
+    assert isinstance(failed[0], InventoryNotEnoughItemsException)
+    assert (await _amounts(database, inventory_id))[1] == 1
+    assert await _version(database, inventory_id) == 2
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_nowait_transfer_fails_while_locked(
+    database: Database, inventory_id: int
+) -> None:
+    async with database.async_session() as holder:
+        await holder.execute(LOCK_INVENTORY, {"id": inventory_id})
+
+        uow = UnitOfWork(database.session)
+        with pytest.raises(InventoryBusyException):
+            async with uow.start():
+                inventory = await _load(uow, inventory_id)
+                await inventory.remove_items(_item(1), lock=LockMode.NOWAIT)
+
+        await holder.rollback()
+
+    assert (await _amounts(database, inventory_id))[1] == 5
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_retry_on_contention_retries_lock_conflicts(
+    database: Database, inventory_id: int
+) -> None:
+    attempts = 0
+
+    async with database.async_session() as holder:
+        await holder.execute(LOCK_INVENTORY, {"id": inventory_id})
+
+        async with database.session() as session:
+
+            async def lock_nowait() -> int:
+                nonlocal attempts
+                attempts += 1
+                try:
+                    await session.execute(
+                        text(f"{LOCK_INVENTORY.text} NOWAIT"), {"id": inventory_id}
+                    )
+                finally:
+                    # The conflict is released before the retry
+                    await holder.rollback()
+                return attempts
+
+            assert await retry_on_contention(session, lock_nowait) == 2
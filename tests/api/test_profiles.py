@@ -0,0 +1,139 @@
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.api.profiles import profiles_router as profiles
+from src.shared.config import profiling_config
+from src.shared.observability.schemas import ProfileStack
+
+TOKEN = "profiler-token"
+
+
+@pytest.fixture
+def queries(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, Any]]:
+    """Parameters of every ClickHouse query the endpoint runs."""
+    queries: list[dict[str, Any]] = []
+
+    async def fetchall(
+        _schema: Any, _query: str, params: dict[str, Any], **_: Any
+    ) -> list[ProfileStack]:
+        queries.append(params)
+        return [ProfileStack(stack="app:main;db:query", samples=3)]
+
+    monkeypatch.setattr(profiles, "db_fetchall", fetchall)
+    return queries
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(
+    queries: list[dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+) -> AsyncGenerator[AsyncClient]:
+    monkeypatch.setattr(profiling_config, "token_local", TOKEN)
+    monkeypatch.setattr(profiling_config, "token_secret_id", None)
+
+    app = FastAPI()
+    app.include_router(profiles.profiles_router)
+    async with AsyncClient(
+        transport=ASGITransport(app),
+        base_url="http://test",
+        headers={"x-profiler-token": TOKEN},
+    ) as client:
+        yield client
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_token_is_required(
+    client: AsyncClient, queries: list[dict[str, Any]]
+) -> None:
+    params = {"start": "2026-10-19T10:00:00Z", "end": "2026-10-19T11:00:00Z"}
+
+    client.headers.pop("x-profiler-token")
+    response = await client.get("/profiles/flamegraph", params=params)
+    assert response.status_code == 403
+
+    client.headers["x-profiler-token"] = "not-the-token"
+    response = await client.get("/profiles/flamegraph", params=params)
+    assert response.status_code == 403
+    assert queries == []
+
+
+@pytest.mark.asyncio(loop_scope="function")
+@pytest.mark.parametrize(
+    ("params", "start"),
+    [
+        (
+            {"start": "2026-10-19T10:00:00", "end": "2026-10-19T11:00:00+00:00"},
+            datetime(2026, 10, 19, 10, tzinfo=UTC),
+        ),
+        (
+            {"start": "2026-10-19T10:00:00+02:00", "end": "2026-10-19T09:00:00"},
+            datetime(2026, 10, 19, 8, tzinfo=UTC),
+        ),
+    ],
+)
+async def test_naive_timestamps_are_utc(
+    client: AsyncClient,
+    queries: list[dict[str, Any]],
+    params: dict[str, str],
+    start: datetime,
+) -> None:
+    response = await client.get("/profiles/flamegraph", params=params)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["value"] == 3
+    (query,) = queries
+    assert query["start"] == start
+    assert query["end"] - query["start"] == timedelta(hours=1)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_end_defaults_to_now(
+    client: AsyncClient, queries: list[dict[str, Any]]
+) -> None:
+    # Naive start against the aware default end
+    start = datetime.now(UTC).replace(tzinfo=None) - timedelta(hours=1)
+
+    response = await client.get(
+        "/profiles/flamegraph", params={"start": start.isoformat()}
+    )
+
+    assert response.status_code == 200, response.text
+    (query,) = queries
+    assert query["end"] - query["start"] >= timedelta(hours=1)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"start": "2026-10-19T11:00:00", "end": "2026-10-19T10:00:00"},
+        {"start": "2026-10-19T10:00:00Z", "end": "2026-10-19T10:00:00"},
+        {"start": "2026-10-19T10:00:00", "end": "2026-10-20T10:00:01Z"},
+    ],
+)
+async def test_window_is_validated(
+    client: AsyncClient, queries: list[dict[str, Any]], params: dict[str, str]
+) -> None:
+    response = await client.get("/profiles/flamegraph", params=params)
+
+    assert response.status_code == 400
+    assert queries == []
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_folded(client: AsyncClient) -> None:
+    response = await client.get(
+        "/profiles/flamegraph",
+        params={
+            "start": "2026-10-19T10:00:00Z",
+            "end": "2026-10-19T11:00:00Z",
+            "folded": "true",
+        },
+    )
+
+    assert response.text == "app:main;db:query 3"
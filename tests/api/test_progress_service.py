@@ -0,0 +1,213 @@
+"""
+Progress tests against a real Postgres, see `conftest.py`.
+"""
+
+from array import array
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.dialects.postgresql import insert
+
+from src import Container
+from src.api.core.dependencies import get_user
+from src.api.craft import craft_router
+from src.api.craft.progress import progress_cache
+from src.api.craft.progress.progress_cache import (
+    DiscoveryCache,
+    decode_recipe_ids,
+    encode_recipe_ids,
+)
+from src.api.craft.progress.progress_schemas import ProgressTable
+from src.api.craft.progress.progress_service import ProgressService
+from src.api.craft.recipes.recipes_schemas import RecipeTable
+from src.api.users.users_schemas import UserTable
+from src.shared.counters import CounterAggregator
+from src.shared.database import Database
+from src.shared.event_bus import EventBus
+from src.shared.uow import UnitOfWork
+
+
+@pytest_asyncio.fixture(scope="function")
+async def recipes(database: Database, elements: list[int]) -> list[RecipeTable]:
+    a, b, c, d, e, f = elements
+    recipes = [
+        RecipeTable(element_a_id=a, element_b_id=b, result_id=c),
+        RecipeTable(element_a_id=c, element_b_id=d, result_id=e),
+        RecipeTable(element_a_id=d, element_b_id=e, result_id=f),
+    ]
+    async with database.session() as session:
+        for recipe in recipes:
+            await session.execute(insert(RecipeTable).values(**recipe.model_dump()))
+    return recipes
+
+
+@pytest.fixture
+def service(database: Database) -> ProgressService:
+    return ProgressService(
+        UnitOfWork(database.session),
+        CounterAggregator(database.session),
+        DiscoveryCache(),
+        EventBus(),
+    )
+
+
+class _Rollback(Exception):
+    pass
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_discovery_counted_after_commit(
+    service: ProgressService, user: UserTable, recipes: list[RecipeTable]
+) -> None:
+    first, second, _ = recipes
+
+    with pytest.raises(_Rollback):
+        async with service.uow.start():
+            assert await service.discover_recipe(user, first)
+            raise _Rollback
+
+    # Neither cached nor counted: the discovery never happened
+    assert service.counters.pending == 0
+    async with service.uow.start():
+        assert not await service.filter_discovered(user, [first.object_id])
+
+    async with service.uow.start():
+        assert await service.discover_recipe(user, second)
+        assert service.counters.pending == 0
+
+    assert service.counters._deltas == {
+        ("recipes", second.object_id, "discovered_count"): 1
+    }
+
+
+def test_recipe_ids_round_trip() -> None:
+    # Stored in discovery order, possibly repeated by concurrent appends
+    data = encode_recipe_ids([7, 3, 2**40, 3]) + encode_recipe_ids([1])
+
+    assert len(data) == 5 * 8
+    assert decode_recipe_ids(data).tolist() == [1, 3, 7, 2**40]
+    assert decode_recipe_ids(b"").tolist() == []
+
+
+def test_discovery_cache_expires_and_evicts(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(progress_cache.time, "monotonic", lambda: now[0])
+    cache = DiscoveryCache()
+    cache.MAX_USERS = 2
+
+    cache.put(1, array("q", [5]))
+    cache.put(2, array("q", []))
+    cache.add(1, 3)
+    cache.add(9, 3)  # not cached, loaded later with the discovery
+    assert cache.get(1) == array("q", [3, 5])
+
+    # The least recently used entry goes first
+    cache.put(3, array("q", []))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and len(cache) == 2
+
+    now[0] += DiscoveryCache.TTL + 1
+    assert cache.get(1) is None and cache.get(3) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_cache_misses_are_confirmed(
+    database: Database,
+    service: ProgressService,
+    user: UserTable,
+    recipes: list[RecipeTable],
+) -> None:
+    first, second, third = (recipe.object_id for recipe in recipes)
+    async with service.uow.start():
+        assert await service.discover_recipe(user, recipes[0])
+
+    # Discovered "on another instance", after this one cached the set
+    async with database.session() as session:
+        await session.execute(
+            insert(ProgressTable).values(object_id=user.object_id, recipe_id=second)
+        )
+    cached = service.discoveries.get(user.object_id)
+    assert cached is not None and cached.tolist() == [first]
+
+    async with service.uow.start():
+        assert await service.filter_discovered(user, [first, second, third]) == {
+            first,
+            second,
+        }
+    assert service.discoveries.get(user.object_id) == array(
+        "q", sorted([first, second])
+    )
+
+    # Hits only: answered without a unit of work, so without the database
+    assert await service.filter_discovered(user, [first, second]) == {first, second}
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(database: Database, user: UserTable) -> AsyncGenerator[AsyncClient]:
+    container = Container()
+    container.wire(modules=[craft_router])
+    app = FastAPI()
+    app.include_router(craft_router.craft_router)
+    app.dependency_overrides[get_user] = lambda: user
+
+    with container.db.override(database):
+        async with AsyncClient(
+            transport=ASGITransport(app), base_url="http://test"
+        ) as client:
+            yield client
+    container.unwire()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_open_recipes_pages(
+    database: Database, client: AsyncClient, user: UserTable, elements: list[int]
+) -> None:
+    a, b, c, d, e, f = elements
+    # Same counters and timestamps: only the id orders them
+    recipes = [
+        RecipeTable(element_a_id=x, element_b_id=y, result_id=f, resources_cost={})
+        for x, y in ((a, b), (a, c), (b, c), (c, d), (d, e))
+    ]
+    async with database.session() as session:
+        for recipe in recipes:
+            await session.execute(insert(RecipeTable).values(**recipe.model_dump()))
+        # Discovered out of id order, the last one by someone else
+        for recipe in reversed(recipes[:-1]):
+            await session.execute(
+                insert(ProgressTable).values(
+                    object_id=user.object_id, recipe_id=recipe.object_id
+                )
+            )
+    expected = sorted(recipe.object_id for recipe in recipes[:-1])
+
+    pages: list[list[int]] = []
+    params: dict[str, Any] = {"limit": 3}
+    while True:
+        response = await client.get("/craft/recipes/all", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([recipe["object_id"] for recipe in page["recipes"]])
+        if page["next_after_recipe_id"] is None:
+            break
+        params["after_recipe_id"] = page["next_after_recipe_id"]
+
+    assert pages == [expected[:3], expected[3:]]
+    (last,) = page["recipes"]
+    assert last["result_id"] == f and last["discovered_count"] == 0
+    assert last["element_a"]["emoji"] == last["result"]["emoji"] == "🧪"
+
+    response = await client.get(
+        "/craft/recipes/all", params={"compact": True, "limit": 4}
+    )
+    assert response.json() == {
+        "recipes": [
+            [recipe.object_id, recipe.element_a_id, recipe.element_b_id, f]
+            for recipe in sorted(recipes[:-1], key=lambda r: r.object_id)
+        ],
+        "next_after_recipe_id": None,
+    }
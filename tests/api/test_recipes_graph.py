@@ -0,0 +1,78 @@
+import pytest
+
+from src.api.craft.recipes.recipes_graph import RecipeGraph
+
+FIRE, WATER, EARTH, WIND = 1, 2, 3, 4
+STEAM, MUD, CLOUD, SMOKE = 5, 6, 7, 8
+
+
+@pytest.fixture
+def graph() -> RecipeGraph:
+    graph = RecipeGraph([FIRE, WATER, EARTH, WIND])
+    graph.add_recipe(100, FIRE, WATER, STEAM)
+    graph.add_recipe(101, WATER, EARTH, MUD)
+    graph.add_recipe(102, STEAM, STEAM, CLOUD)
+    graph.add_recipe(103, FIRE, WIND, SMOKE)
+    graph.add_recipe(104, SMOKE, WIND, CLOUD)
+    return graph
+
+
+def test_cost(graph: RecipeGraph) -> None:
+    assert graph.cost(FIRE) == {FIRE: 1}
+    assert graph.cost(CLOUD) == {FIRE: 2, WATER: 2}
+    assert graph.pair_cost(STEAM, MUD) == {FIRE: 1, WATER: 2, EARTH: 1}
+    assert not graph.add_recipe(100, FIRE, WATER, STEAM)
+
+
+def test_cost_uses_lowest_recipe_id() -> None:
+    graph = RecipeGraph([FIRE, WATER, EARTH, WIND])
+    graph.add_recipe(103, FIRE, WIND, SMOKE)
+    graph.add_recipe(105, SMOKE, WIND, CLOUD)
+    assert graph.cost(CLOUD) == {FIRE: 1, WIND: 2}
+
+    # An older recipe added late becomes canonical, dependants are recosted
+    graph.add_recipe(100, FIRE, WATER, STEAM)
+    graph.add_recipe(102, STEAM, STEAM, CLOUD)
+    assert graph.cost(CLOUD) == {FIRE: 2, WATER: 2}
+
+
+def test_reachable(graph: RecipeGraph) -> None:
+    assert graph.reachable([FIRE, WATER]) == {FIRE, WATER, STEAM, CLOUD}
+    assert graph.reachable([FIRE, WATER], recipe_ids=[100]) == {FIRE, WATER, STEAM}
+
+
+def test_shortest_path(graph: RecipeGraph) -> None:
+    assert graph.shortest_path(CLOUD, [FIRE, WATER]) == [100, 102]
+    assert graph.shortest_path(CLOUD, [STEAM, SMOKE, WIND]) == [102]
+    assert graph.shortest_path(STEAM, [STEAM]) == []
+    with pytest.raises(ValueError):
+        graph.shortest_path(MUD, [FIRE, WATER])
+
+
+def test_max_crafts(graph: RecipeGraph) -> None:
+    inventory = {FIRE: 5, WATER: 4, EARTH: 1}
+    assert graph.max_crafts([100, 101, 102, 103, 999], inventory) == [
+        (100, 4),
+        (101, 1),
+        (102, 2),
+        (103, 0),
+    ]
+
+
+def test_max_crafts_uses_charged_cost(graph: RecipeGraph) -> None:
+    # Stored cost disagrees with the graph one (e.g. costed before a recipe
+    # of a parent was known), crafting charges the stored one
+    graph.add_recipe(106, STEAM, EARTH, MUD, resources_cost={STEAM: 1, EARTH: 1})
+    assert graph.max_crafts([106], {STEAM: 3, EARTH: 2}) == [(106, 2)]
+    assert graph.max_crafts([106], {FIRE: 3, WATER: 3, EARTH: 2}) == [(106, 0)]
+
+
+def test_max_crafts_skips_free_recipes(graph: RecipeGraph) -> None:
+    # Free rows between, after and instead of priced ones
+    graph.add_recipe(106, FIRE, EARTH, MUD, resources_cost={})
+    graph.add_recipe(107, WIND, EARTH, SMOKE, resources_cost={WIND: 0, EARTH: 1})
+    graph.add_recipe(108, FIRE, FIRE, STEAM, resources_cost={FIRE: 0})
+    inventory = {FIRE: 5, WATER: 4, EARTH: 2}
+
+    assert graph.max_crafts([106, 100, 107, 108], inventory) == [(100, 4), (107, 2)]
+    assert graph.max_crafts([106, 108], inventory) == []
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy.dialects.postgresql import insert
+
+from src.api.craft.elements.elements_constants import FIRE, VOID
+from src.api.craft.recipes.recipes_graph import RecipeGraph
+from src.api.craft.recipes.recipes_schemas import RecipeTable
+from src.api.craft.recipes.recipes_service import RecipesService
+from src.shared.database import Database
+from src.shared.event_bus import EventBus
+from src.shared.uow import UnitOfWork
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_load_missing(database: Database, elements: list[int]) -> None:
+    a, b, c, d, *_ = elements
+    recipes = [
+        # Created "on another instance": in the database, not in the graph
+        RecipeTable(
+            element_a_id=a, element_b_id=b, result_id=c, resources_cost={str(a): 2}
+        ),
+        RecipeTable(
+            element_a_id=a, element_b_id=c, result_id=VOID.object_id, resources_cost={}
+        ),
+        RecipeTable(
+            element_a_id=b, element_b_id=c, result_id=d, resources_cost={str(b): 1}
+        ),
+    ]
+    async with database.session() as session:
+        for recipe in recipes:
+            await session.execute(insert(RecipeTable).values(**recipe.model_dump()))
+    known, void, missing = (recipe.object_id for recipe in recipes)
+
+    graph = RecipeGraph([FIRE.object_id])
+    graph.add_recipe(known, a, b, c, {a: 2})
+    service = RecipesService(UnitOfWork(database.session), EventBus(), graph)
+
+    await service.load_missing([known, void, missing, 2**31 - 1])
+    assert missing in graph and void not in graph and len(graph) == 2
+    assert graph.max_crafts([known, missing], {a: 4, b: 3}) == [
+        (known, 2),
+        (missing, 3),
+    ]
+
+    # Nothing is left to look up, the database isn't queried again
+    service.uow = None  # type: ignore[assignment]
+    await service.load_missing([known, void, missing, 2**31 - 1])
@@ -0,0 +1,175 @@
+import asyncio
+import types
+import typing as tp
+
+import httpx
+import pytest
+
+from src.shared.base_llm import ProviderBase, SupportedModels
+from src.shared.observability.metrics import MetricsStorage
+
+
+class _Provider(ProviderBase):
+    """A provider with no SDK behind it, for the shared call plumbing."""
+
+    kind = SupportedModels.GEMINI
+    sdk_warmups = 0
+
+    @property
+    def provider_name(self) -> tp.Any:
+        return "test"
+
+    @property
+    def provider(self) -> tp.Any:
+        return types.SimpleNamespace(
+            client=self.http_client, base_url="https://llm.test/v1/"
+        )
+
+    @property
+    def model(self) -> tp.Any:
+        raise NotImplementedError
+
+    async def _warmup_sdk(self) -> None:
+        self.sdk_warmups += 1
+        raise ConnectionError("embedding endpoint is down")
+
+    async def embed_content(
+        self, content: str | list[str], task_type: tp.Any | None = None
+    ) -> list[float] | list[list[float]]:
+        return [0.0]
+
+
+def _provider(
+    max_concurrency: int = 8,
+    request_timeout: float = 30.0,
+    warmup_embedding: bool = False,
+) -> _Provider:
+    return _Provider(
+        max_concurrency,
+        request_timeout,
+        max_connections=4,
+        warmup_embedding=warmup_embedding,
+    )
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_call_returns_result() -> None:
+    provider = _provider()
+    MetricsStorage._collect()
+
+    async def call() -> list[int]:
+        return [1, 2]
+
+    assert await provider._call("test", call) == [1, 2]
+    _, histograms = MetricsStorage._collect()
+    assert histograms["llm.time.gemini.test"][0].count == 1
+    assert histograms["llm.queue_time.gemini.test"][0].count == 1
+    await provider.close()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_concurrency_limit() -> None:
+    provider = _provider(max_concurrency=2)
+    running = 0
+    peak = 0
+    release = asyncio.Event()
+
+    async def call() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+
+    calls = [asyncio.create_task(provider._call("test", call)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    assert running == peak == 2
+
+    release.set()
+    await asyncio.gather(*calls)
+    assert peak == 2
+    await provider.close()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_timeouts_and_errors_are_counted() -> None:
+    provider = _provider(max_concurrency=1, request_timeout=0.05)
+    MetricsStorage._collect()
+
+    async def hang() -> None:
+        await asyncio.Event().wait()
+
+    async def fail() -> None:
+        raise ValueError("bad request")
+
+    with pytest.raises(TimeoutError):
+        await provider._call("test", hang)
+
+    # Waiting for a slot counts against the timeout as well
+    async with provider._limit:
+        with pytest.raises(TimeoutError):
+            await provider._call("test", fail)
+
+    with pytest.raises(ValueError):
+        await provider._call("test", fail)
+
+    metrics, _ = MetricsStorage._collect()
+    assert metrics["llm.timeouts.gemini.test"].value == 2
+    assert metrics["llm.errors.gemini.test"].value == 1
+    await provider.close()
+
+
+def _serve(
+    provider: _Provider,
+    handler: tp.Callable[[httpx.Request], tp.Awaitable[httpx.Response]],
+) -> list[httpx.Request]:
+    """Routes the shared client to `handler`, returns the requests it gets."""
+    requests: list[httpx.Request] = []
+
+    async def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return await handler(request)
+
+    provider.http_client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+    return requests
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_warmup_never_raises() -> None:
+    async def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async def hang(request: httpx.Request) -> httpx.Response:
+        await asyncio.Event().wait()
+        raise AssertionError
+
+    async def ok(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404)
+
+    provider = _provider(request_timeout=0.05, warmup_embedding=True)
+    for handler in (refuse, hang):
+        requests = _serve(provider, handler)
+        await provider.warmup()
+        assert [request.method for request in requests] == ["HEAD"]
+        assert provider.sdk_warmups == 0
+        await provider.close()
+
+    # Any status is a warm connection, the failing SDK warmup is swallowed too
+    requests = _serve(provider, ok)
+    await provider.warmup()
+    assert str(requests[0].url) == "https://llm.test/v1/"
+    assert provider.sdk_warmups == 1
+    await provider.close()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_close_closes_shared_client() -> None:
+    provider = _provider()
+    client = provider.http_client
+    assert not client.is_closed
+
+    await provider.close()
+
+    assert client.is_closed
+    with pytest.raises(RuntimeError):
+        await client.get("https://llm.test/")
@@ -0,0 +1,89 @@
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from diskcache import Cache  # type: ignore
+
+from src.shared import cache
+from src.shared.cache import (
+    disk_cache,
+    generate_cache_tag,
+    invalidate,
+    invalidate_prefix,
+)
+
+
+@pytest.fixture
+def disk(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Cache]:
+    instance = Cache(str(tmp_path), tag_index=True)
+    monkeypatch.setattr(cache, "_cache_instance", instance)
+    monkeypatch.setattr(cache.shared_config, "use_disk_cache", True)
+    yield instance
+    instance.close()
+
+
+class _User:
+    object_id = 7
+
+
+def _lookup(user: _User, page: int = 0) -> None:
+    pass
+
+
+def test_generate_cache_tag() -> None:
+    user = _User()
+    assert generate_cache_tag(_lookup, None, (user,), {}) is None
+    assert generate_cache_tag(_lookup, "user:{user.object_id}", (user,), {}) == (
+        "user:7"
+    )
+    assert (
+        generate_cache_tag(_lookup, "user:{user.object_id}:{page}", (user,), {})
+        == "user:7:0"
+    )
+    with pytest.raises(ValueError):
+        generate_cache_tag(_lookup, "user:{user.name}", (user,), {})
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_disk_cache_tag_invalidation(disk: Cache) -> None:
+    calls: list[int] = []
+
+    @disk_cache(key_params=["element_id"], tag="element:{element_id}")
+    async def lookup(element_id: int) -> dict[str, int]:
+        calls.append(element_id)
+        return {"calls": len(calls)}
+
+    assert await lookup(1) == {"calls": 1}
+    assert await lookup(2) == {"calls": 2}
+    assert await lookup(1) == {"calls": 1}
+    assert calls == [1, 2]
+
+    assert invalidate("element:1") == 1
+    assert invalidate("element:1") == 0
+    assert await lookup(1) == {"calls": 3}
+    assert await lookup(2) == {"calls": 2}
+
+
+def test_invalidate_prefix(disk: Cache) -> None:
+    @disk_cache(key_params=["page"])
+    def listing(page: int) -> list[int]:
+        return [page]
+
+    listing(1)
+    listing(2)
+    disk.set("other:func:page=1", b"[]")
+
+    assert invalidate_prefix(f"{listing.__module__}:listing:page=1") == 1
+    assert invalidate_prefix(listing) == 1
+    assert list(disk.iterkeys()) == ["other:func:page=1"]
+
+
+def test_invalidation_is_a_no_op_without_the_disk_cache(
+    disk: Cache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    disk.set("module:func", b"1", tag="tag")
+    monkeypatch.setattr(cache.shared_config, "use_disk_cache", False)
+
+    assert invalidate("tag") == 0
+    assert invalidate_prefix("module") == 0
+    assert len(disk) == 1
@@ -0,0 +1,25 @@
+import contextlib
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.shared.counters import CounterAggregator
+
+
+@contextlib.asynccontextmanager
+async def _unavailable() -> AsyncGenerator[None]:
+    raise ConnectionRefusedError("database is down")
+    yield
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_failed_flush_keeps_deltas_and_backs_off() -> None:
+    aggregator = CounterAggregator(_unavailable)  # type: ignore[arg-type]
+    aggregator.INTERVAL = 0.01
+    aggregator.increment("recipes", 1, "discovered_count", 2)
+
+    await aggregator.run_once()
+    await aggregator.run_once()
+
+    assert aggregator._failures == 2
+    assert aggregator._deltas[("recipes", 1, "discovered_count")] == 2
@@ -0,0 +1,198 @@
+"""
+Replica routing tests.
+
+Most need a second Postgres instance, e.g. `POSTGRES_REPLICA_HOSTS='["localhost:5433"]'`
+with the same credentials and database name as the primary.
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import column, exc, insert, table
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.sql import text
+
+from src.shared.config import PostgresConfig
+from src.shared.database import (
+    Database,
+    InstrumentedQueuePool,
+    ReplicaPool,
+    _install_pool_listeners,
+)
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.uow import UnitOfWork, read_your_writes
+
+db_config = PostgresConfig()  # type: ignore
+
+needs_replica = pytest.mark.skipif(
+    not db_config.replica_hosts, reason="POSTGRES_REPLICA_HOSTS is not configured"
+)
+
+SERVER_PORT = text("SELECT inet_server_port()")
+
+
+@pytest_asyncio.fixture(scope="function")
+async def database() -> AsyncGenerator[Database]:
+    database = Database(db_config)
+    yield database
+    await database.close()
+
+
+def _replica_port() -> int:
+    _, _, port = db_config.replica_hosts[0].partition(":")
+    return int(port or db_config.port)
+
+
+@needs_replica
+@pytest.mark.asyncio(loop_scope="function")
+async def test_readonly_uow_uses_replica(database: Database) -> None:
+    uow = UnitOfWork(database.session, database.readonly_session)
+
+    async with uow.start(readonly=True):
+        session = await uow.get_session()
+        port = (await session.execute(SERVER_PORT)).scalar()
+
+    assert port == _replica_port()
+
+
+@needs_replica
+@pytest.mark.asyncio(loop_scope="function")
+async def test_readonly_uow_sticks_to_primary_after_write(database: Database) -> None:
+    read_your_writes.set(False)
+    uow = UnitOfWork(database.session, database.readonly_session)
+
+    async with uow.start():
+        session = await uow.get_session()
+        await session.execute(text("CREATE TEMPORARY TABLE rw_probe (id int)"))
+        await session.execute(insert(table("rw_probe", column("id"))).values(id=1))
+
+    async with uow.start(readonly=True):
+        session = await uow.get_session()
+        port = (await session.execute(SERVER_PORT)).scalar()
+
+    assert port == db_config.port
+
+
+@needs_replica
+@pytest.mark.asyncio(loop_scope="function")
+async def test_lagging_replica_falls_back_to_primary(database: Database) -> None:
+    database.replica_max_lag = -1.0
+
+    assert await database.pick_replica() is None
+
+
+class _HangingEngine:
+    """An engine whose replica never answers, like one behind a dropped route."""
+
+    connects = 0
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[Any]:
+        self.connects += 1
+        await asyncio.sleep(60)
+        yield
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_unreachable_replica_falls_back_to_primary_quickly() -> None:
+    engine = _HangingEngine()
+    database = Database.__new__(Database)
+    database.replicas = [ReplicaPool(engine, "replica")]  # type: ignore[arg-type]
+    database.replica_max_lag = 5.0
+    database.replica_lag_check_interval = 60.0
+    database.replica_lag_probe_timeout = 0.05
+    database._replica_cursor = iter(range(10))  # type: ignore[assignment]
+
+    started = time.monotonic()
+    assert await database.pick_replica() is None
+    assert time.monotonic() - started < 5
+
+    # Counted as lagging until the next check, without probing again
+    assert await database.pick_replica() is None
+    assert engine.connects == 1
+
+
+@pytest_asyncio.fixture(scope="function")
+async def engine() -> AsyncGenerator[AsyncEngine]:
+    """One pooled connection plus one overflow, pinged whenever reused."""
+    engine = create_async_engine(
+        db_config.db_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.2,
+    )
+    _install_pool_listeners(engine, pre_ping_idle=0.0, label=".test")
+    try:
+        async with engine.connect():
+            pass
+    except OSError:
+        await engine.dispose()
+        pytest.skip("Postgres is not available")
+
+    MetricsStorage._collect()
+    yield engine
+    await engine.dispose()
+
+
+def _pool_metrics() -> dict[str, float]:
+    metrics, histograms = MetricsStorage._collect()
+    values = {
+        key.removeprefix("database.pool."): metric.get_value()
+        for key, metric in metrics.items()
+        if key.startswith("database.pool.") and key.endswith(".test")
+    }
+    histogram = histograms.get("database.pool.checkout_wait.test")
+    if histogram is not None:
+        values["checkout_wait.count"] = histogram[0].count
+        values["checkout_wait.max"] = histogram[0].max
+    return values
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_pool_metrics(engine: AsyncEngine) -> None:
+    first = await engine.connect()
+    second = await engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        await engine.connect()
+
+    metrics = _pool_metrics()
+    assert metrics["in_use.test"] == 2
+    assert metrics["overflow.test"] == 1
+    assert metrics["utilization.test"] == 1.0
+    assert metrics["timeout.test"] == 1
+    assert metrics["checkout_wait.count"] == 3
+    assert metrics["checkout_wait.max"] >= 0.2
+
+    await second.close()
+    await first.close()
+    metrics = _pool_metrics()
+    assert metrics["in_use.test"] == 0
+    assert metrics["overflow.test"] == 0
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stale_idle_connection_is_replaced(
+    engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pings: list[object] = []
+
+    def do_ping(dbapi_connection: object) -> bool:
+        pings.append(dbapi_connection)
+        if len(pings) == 1:
+            raise ConnectionError("server closed the connection")
+        return True
+
+    monkeypatch.setattr(engine.sync_engine.dialect, "do_ping", do_ping)
+
+    # The checkout retries with a fresh connection instead of failing
+    async with engine.connect() as connection:
+        assert (await connection.execute(text("SELECT 1"))).scalar() == 1
+
+    assert _pool_metrics()["stale.test"] == 1
+    assert pings
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from src.shared.observability.histogram import DEFAULT_ACCURACY, Histogram
+
+
+def test_quantiles_within_accuracy() -> None:
+    rng = random.Random(0)
+    values = sorted(rng.lognormvariate(-3, 1) for _ in range(10_000))
+
+    histogram = Histogram()
+    for value in values:
+        histogram.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=DEFAULT_ACCURACY * 2)
+
+
+def test_merge() -> None:
+    left, right, both = Histogram(), Histogram(), Histogram()
+    for value in range(1, 101):
+        (left if value % 2 else right).add(value / 1000)
+        both.add(value / 1000)
+
+    left.merge(right)
+
+    assert left.count == both.count == 100
+    assert left.buckets() == both.buckets()
+    assert left.quantile(0.99) == both.quantile(0.99)
+    assert (left.min, left.max) == (0.001, 0.1)
+
+
+def test_empty_and_zero() -> None:
+    histogram = Histogram()
+    assert histogram.quantile(0.99) == 0.0
+
+    histogram.add(0.0, count=3)
+    assert histogram.quantile(0.5) == 0.0
+    assert histogram.buckets()[1] == [3]
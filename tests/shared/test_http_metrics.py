@@ -0,0 +1,74 @@
+import typing as tp
+
+import pytest
+
+from src.shared.observability import http_metrics
+from src.shared.observability.http_metrics import HTTPMetricsMiddleware
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.timing import add_timing
+
+REQUESTS = 10
+
+
+class _Route:
+    path = "/api/items/{item_id}"
+
+
+async def _app(scope: dict[str, tp.Any], receive: tp.Any, send: tp.Any) -> None:
+    scope["route"] = _Route()
+    add_timing("db", 0.002)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _scope() -> dict[str, tp.Any]:
+    return {"type": "http", "method": "GET", "path": "/api/items/1", "headers": []}
+
+
+async def _receive() -> dict[str, tp.Any]:
+    return {"type": "http.request", "body": b""}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_server_timing_header() -> None:
+    messages: list[dict[str, tp.Any]] = []
+
+    async def send(message: dict[str, tp.Any]) -> None:
+        messages.append(message)
+
+    await HTTPMetricsMiddleware(_app)(_scope(), _receive, send)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"server-timing"].startswith(b"db;dur=2.0, total;dur=")
+    assert messages[1]["body"] == b"ok"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_overhead_excludes_app_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Every reading advances a microsecond, the app itself takes a second
+    clock = [0.0]
+
+    def perf_counter() -> float:
+        clock[0] += 1e-6
+        return clock[0]
+
+    async def slow_app(scope: dict[str, tp.Any], receive: tp.Any, send: tp.Any) -> None:
+        clock[0] += 1.0
+        await _app(scope, receive, send)
+
+    async def send(message: dict[str, tp.Any]) -> None:
+        clock[0] += 1.0  # a slow client isn't the middleware's time either
+
+    monkeypatch.setattr(http_metrics.time, "perf_counter", perf_counter)
+    middleware = HTTPMetricsMiddleware(slow_app)
+    MetricsStorage._collect()
+
+    for _ in range(REQUESTS):
+        await middleware(_scope(), _receive, send)
+
+    _, histograms = MetricsStorage._collect()
+    overhead, _ = histograms["http.middleware_overhead"]
+    latency, _ = histograms["http.latency.GET /api/items/{item_id}"]
+    assert overhead.count == latency.count == REQUESTS
+    assert latency.min >= 3.0
+    assert 0 < overhead.max < 1e-4
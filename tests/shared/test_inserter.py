@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import typing as tp
+
+import pytest
+
+from src.shared.observability.ch_utils import Inserter, OverflowPolicy
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.schemas import ProfileStack
+
+ROWS = 50_000
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_insert_from_thread_while_flushing() -> None:
+    inserter = Inserter("test.concurrent_inserts", max_size=ROWS)
+    inserter.metrics = MetricsStorage("test")
+    sent: list[tuple[tp.Any, ...]] = []
+
+    async def send(
+        column_names: list[str],
+        rows: list[tuple[tp.Any, ...]],
+        settings: dict[str, tp.Any],
+    ) -> None:
+        sent.extend(rows)
+
+    inserter._send = send  # type: ignore[method-assign]
+
+    def produce() -> None:
+        for i in range(ROWS):
+            inserter.insert_row(ProfileStack, ("a;b", i))
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    while thread.is_alive():
+        assert await inserter.flush()
+        await asyncio.sleep(0)
+    thread.join()
+    assert await inserter.flush()
+
+    assert sorted(samples for _, samples in sent) == list(range(ROWS))
+    assert inserter.size == 0
+    assert inserter.dropped == 0
+
+
+def _dropped(storage: MetricsStorage, table_name: str) -> float:
+    metrics, _ = storage._collect()
+    metric = metrics.get(f"{storage.metric_prefix}.dropped.{table_name}")
+    return metric.value if metric is not None else 0.0
+
+
+def test_drop_newest_at_capacity() -> None:
+    inserter = Inserter("test.drop_newest", max_size=10)
+    inserter.metrics = MetricsStorage("test.overflow")
+
+    for i in range(15):
+        inserter.insert_row(ProfileStack, ("a;b", i))
+
+    (batch,) = inserter.batches.values()
+    assert [samples for _, samples in batch.rows] == list(range(10))
+    assert inserter.size == 10
+    assert inserter.dropped == 5
+    assert _dropped(inserter.metrics, "test.drop_newest") == 5
+
+
+def test_drop_oldest_at_capacity() -> None:
+    inserter = Inserter(
+        "test.drop_oldest", max_size=20, overflow=OverflowPolicy.DROP_OLDEST
+    )
+    inserter.metrics = MetricsStorage("test.overflow")
+
+    for i in range(25):
+        inserter.insert_row(ProfileStack, ("a;b", i))
+
+    # A tenth of the buffer goes at once, the newest records always get in
+    (batch,) = inserter.batches.values()
+    assert [samples for _, samples in batch.rows] == list(range(6, 25))
+    assert inserter.size == 19
+    assert inserter.dropped == 6
+    assert _dropped(inserter.metrics, "test.drop_oldest") == 6
@@ -0,0 +1,117 @@
+import logging
+import queue
+import typing as tp
+
+import pytest
+
+from src.shared.observability import logging_utils
+from src.shared.observability.logging_utils import LogQueueHandler, SamplingFilter
+from src.shared.observability.metrics import MetricsStorage
+
+
+def _record(
+    name: str = "deus-vult.test",
+    level: int = logging.INFO,
+    msg: str = "message %s",
+    args: tp.Any = ("arg",),
+) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def _metric(key: str) -> float:
+    metrics, _ = MetricsStorage._collect()
+    metric = metrics.get(key)
+    return metric.value if metric is not None else 0.0
+
+
+class _Row:
+    """Stands in for an ORM row, whose repr must not run off the caller."""
+
+    def __init__(self) -> None:
+        self.state = "before"
+
+    def __repr__(self) -> str:
+        return f"<Row {self.state}>"
+
+
+def test_sampling_by_prefix(monkeypatch: pytest.MonkeyPatch) -> None:
+    sampling = SamplingFilter(
+        {"deus-vult": 0.5, "deus-vult.noisy": 0.0},
+        rate_per_second=1000,
+        burst=1000,
+    )
+    monkeypatch.setattr(logging_utils.random, "random", lambda: 0.4)
+
+    assert sampling.filter(_record("deus-vult.api"))
+    assert not sampling.filter(_record("deus-vult.noisy.loop"))
+    # Only records below WARNING are sampled
+    assert sampling.filter(_record("deus-vult.noisy.loop", logging.WARNING))
+
+    monkeypatch.setattr(logging_utils.random, "random", lambda: 0.6)
+    assert not sampling.filter(_record("deus-vult.api"))
+    assert sampling.filter(_record("other"))
+
+
+def test_token_bucket(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(logging_utils.time, "monotonic", lambda: now[0])
+    sampling = SamplingFilter({}, rate_per_second=2, burst=3)
+    _metric("logging.rate_limited.hot")
+
+    assert [sampling.filter(_record("hot")) for _ in range(4)] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    # Buckets are per logger
+    assert sampling.filter(_record("cold"))
+    # Errors are never rate limited
+    assert sampling.filter(_record("hot", logging.ERROR))
+    assert sampling.filter(_record("hot", logging.CRITICAL))
+
+    now[0] += 0.5  # refills one token
+    assert sampling.filter(_record("hot"))
+    assert not sampling.filter(_record("hot"))
+    assert _metric("logging.rate_limited.hot") == 2
+
+
+def test_queue_full_drops() -> None:
+    records: queue.Queue[logging.LogRecord] = queue.Queue(1)
+    handler = LogQueueHandler(records)
+    _metric("logging.dropped")
+
+    handler.handle(_record())
+    handler.handle(_record())
+    handler.handle(_record())
+
+    assert records.qsize() == 1
+    assert _metric("logging.dropped") == 2
+
+
+def test_plain_args_are_formatted_later() -> None:
+    records: queue.Queue[logging.LogRecord] = queue.Queue()
+    handler = LogQueueHandler(records)
+
+    handler.handle(_record(msg="%s %d %r %s", args=("a", 1, 2.5, None)))
+    handler.handle(_record(msg="%(user)s", args=({"user": 1},)))
+
+    first, second = records.get_nowait(), records.get_nowait()
+    assert first.msg == "%s %d %r %s" and first.args == ("a", 1, 2.5, None)
+    assert first.getMessage() == "a 1 2.5 None"
+    assert second.getMessage() == "1"
+
+
+def test_objects_are_formatted_on_the_caller() -> None:
+    records: queue.Queue[logging.LogRecord] = queue.Queue()
+    handler = LogQueueHandler(records)
+    row = _Row()
+
+    handler.handle(_record(msg="loaded %r for %s", args=(row, "user")))
+    handler.handle(_record(msg="%(row)r", args=({"row": row},)))
+    row.state = "after"
+
+    first, second = records.get_nowait(), records.get_nowait()
+    assert first.msg == "loaded <Row before> for user" and first.args is None
+    assert first.template == "loaded %r for %s"  # type: ignore[attr-defined]
+    assert second.getMessage() == "<Row before>"
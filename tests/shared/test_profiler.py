@@ -0,0 +1,63 @@
+import threading
+
+from src.shared.observability.profiler import SamplingProfiler, build_flamegraph
+from src.shared.observability.schemas import ProfileStack
+
+SAMPLES = 200
+
+
+def _busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_samples_other_threads() -> None:
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy, args=(stop,), name="busy")
+    thread.start()
+    try:
+        profiler = SamplingProfiler(sample_rate=100, max_depth=8)
+        profiler.sample()
+    finally:
+        stop.set()
+        thread.join()
+
+    stacks = [stack for name, stack in profiler._counts if name == "busy"]
+    assert len(stacks) == 1
+    assert f"{__name__}:_busy" in stacks[0].split(";")
+    assert len(stacks[0].split(";")) <= 8
+
+
+def test_repeated_samples_reuse_state() -> None:
+    """A steady workload costs no new labels and no new stack keys per sample."""
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy, args=(stop,), name="busy")
+    thread.start()
+    try:
+        profiler = SamplingProfiler()
+        profiler.sample()
+        labels = dict(profiler._labels)
+        for _ in range(SAMPLES):
+            profiler.sample()
+    finally:
+        stop.set()
+        thread.join()
+
+    # Only `_busy`'s own frames may differ between samples (e.g. inside `sum`)
+    assert len(profiler._labels) <= len(labels) + 2
+    busy = sum(count for (name, _), count in profiler._counts.items() if name == "busy")
+    assert busy == SAMPLES + 1
+
+
+def test_build_flamegraph() -> None:
+    tree = build_flamegraph(
+        [
+            ProfileStack(stack="app:main;db:query", samples=3),
+            ProfileStack(stack="app:main;cache:get", samples=1),
+        ]
+    )
+
+    assert tree["value"] == 4
+    (main,) = tree["children"]
+    assert main["name"] == "app:main" and main["value"] == 4
+    assert [child["name"] for child in main["children"]] == ["db:query", "cache:get"]
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from src.shared.observability.queries import (
+    QueryBudgetExceeded,
+    QueryStats,
+    begin_query_stats,
+    current_query_stats,
+    end_query_stats,
+    query_budget,
+)
+
+SELECT_USER = "SELECT users.id FROM users WHERE users.id = $1"
+SELECT_ITEMS = "SELECT items.id FROM items WHERE items.inventory_id = $1"
+
+
+def test_counts_and_flags_repeated_shapes() -> None:
+    stats = QueryStats()
+    stats.record(SELECT_USER, rows=1, elapsed=0.001, threshold=3, strict=False)
+    for _ in range(4):
+        stats.record(SELECT_ITEMS, rows=2, elapsed=0.001, threshold=3, strict=False)
+
+    assert stats.statements == 5
+    assert stats.rows == 9
+    assert stats.n_plus_one == [SELECT_ITEMS]
+
+
+def test_strict_mode_raises_at_threshold() -> None:
+    stats = QueryStats()
+    stats.record(SELECT_ITEMS, rows=0, elapsed=0.0, threshold=2, strict=True)
+    with pytest.raises(QueryBudgetExceeded):
+        stats.record(SELECT_ITEMS, rows=0, elapsed=0.0, threshold=2, strict=True)
+
+
+def test_query_budget() -> None:
+    with query_budget(max_statements=2) as stats:
+        assert current_query_stats.get() is stats
+        stats.record(SELECT_USER, rows=1, elapsed=0.0, threshold=10, strict=False)
+        stats.record(SELECT_ITEMS, rows=1, elapsed=0.0, threshold=10, strict=False)
+        with pytest.raises(QueryBudgetExceeded):
+            stats.record(SELECT_ITEMS, rows=1, elapsed=0.0, threshold=10, strict=False)
+
+    assert current_query_stats.get() is None
+
+    with query_budget(max_repeats=1) as stats:
+        stats.record(SELECT_ITEMS, rows=1, elapsed=0.0, threshold=10, strict=False)
+        with pytest.raises(QueryBudgetExceeded):
+            stats.record(SELECT_ITEMS, rows=1, elapsed=0.0, threshold=10, strict=False)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_spawned_task_opens_own_stats() -> None:
+    token = begin_query_stats()
+    outer = current_query_stats.get()
+    assert token is not None and outer is not None
+    # Nested units of work of the same task share the stats
+    assert begin_query_stats() is None
+
+    async def spawned() -> QueryStats | None:
+        inner_token = begin_query_stats()
+        assert inner_token is not None
+        stats = current_query_stats.get()
+        assert stats is not None
+        stats.record(SELECT_USER, rows=1, elapsed=0.0, threshold=10, strict=False)
+        end_query_stats(inner_token)
+        return stats
+
+    task = asyncio.create_task(spawned())
+    end_query_stats(token)
+    inner = await task
+
+    assert inner is not outer
+    assert inner is not None and inner.statements == 1
+    assert outer.statements == 0
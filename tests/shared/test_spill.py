@@ -0,0 +1,126 @@
+import typing as tp
+from pathlib import Path
+
+import pytest
+
+from src.shared.observability.ch_utils import Inserter
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.schemas import ProfileStack
+from src.shared.observability.spill import SpillLog
+
+
+class _ClickHouse:
+    """Stands in for `Inserter._send`, failing while `down`."""
+
+    def __init__(self) -> None:
+        self.down = False
+        self.rows: list[tuple[tp.Any, ...]] = []
+
+    async def __call__(
+        self,
+        column_names: list[str],
+        rows: list[tuple[tp.Any, ...]],
+        settings: dict[str, tp.Any],
+    ) -> None:
+        if self.down:
+            raise ConnectionError("ClickHouse is down")
+        assert column_names == ["stack", "samples"]
+        self.rows.extend(rows)
+
+
+def _inserter(
+    name: str, directory: Path, max_bytes: int = 1024 * 1024
+) -> tuple[Inserter, _ClickHouse]:
+    inserter = Inserter(name, no_logging=True)
+    inserter.metrics = MetricsStorage("test")
+    inserter.spill = SpillLog(directory, name, max_bytes=max_bytes)
+    clickhouse = _ClickHouse()
+    inserter._send = clickhouse  # type: ignore[method-assign]
+    return inserter, clickhouse
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_failed_flush_spills_then_replays(tmp_path: Path) -> None:
+    directory = tmp_path / "spill"
+    inserter, clickhouse = _inserter("test.spill_replay", directory)
+    clickhouse.down = True
+    inserter.insert_row(ProfileStack, ("a;b", 1))
+    inserter.insert_row(ProfileStack, ("a;c", 2))
+
+    await inserter.run_once()
+    assert inserter.spill.bytes > 0 and inserter.dropped == 0
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+    # Nothing is replayed until a flush goes through
+    inserter.insert_row(ProfileStack, ("a;d", 3))
+    await inserter.run_once()
+    assert clickhouse.rows == []
+
+    clickhouse.down = False
+    inserter.insert_row(ProfileStack, ("a;e", 4))
+    await inserter.run_once()
+
+    assert clickhouse.rows == [("a;e", 4), ("a;b", 1), ("a;c", 2), ("a;d", 3)]
+    assert inserter.spill.bytes == 0
+    assert list(directory.iterdir()) == []
+
+
+def test_corrupt_frame_ends_segment(tmp_path: Path) -> None:
+    spill = SpillLog(tmp_path, "test", max_bytes=1024 * 1024)
+    for frame in ("first", "second", "third"):
+        assert spill.append(frame)
+    spill.rotate()
+
+    (segment,) = spill.sealed_segments()
+    data = bytearray(segment.read_bytes())
+    length, _ = spill.HEADER.unpack_from(data)
+    first_size = spill.HEADER.size + length
+    data[first_size + spill.HEADER.size] ^= 0xFF
+    segment.write_bytes(data)
+
+    assert list(spill.read(segment)) == ["first"]
+
+    # A torn tail is skipped the same way
+    segment.write_bytes(data[: first_size + 3])
+    assert list(spill.read(segment)) == ["first"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_spill_max_bytes(tmp_path: Path) -> None:
+    inserter, clickhouse = _inserter("test.spill_full", tmp_path, max_bytes=200)
+    clickhouse.down = True
+
+    inserter.insert_row(ProfileStack, ("a" * 50, 1))
+    await inserter.run_once()
+    spilled = inserter.spill.bytes
+    assert 0 < spilled <= 200
+
+    # Another batch doesn't fit: it is dropped and counted, the log kept
+    inserter.insert_row(ProfileStack, ("b" * 150, 2))
+    await inserter.run_once()
+    assert inserter.spill.bytes == spilled
+    assert inserter.dropped == 1
+
+    # Replayed segments free the space again
+    clickhouse.down = False
+    await inserter.run_once()
+    assert clickhouse.rows == [("a" * 50, 1)]
+    assert inserter.spill.bytes == 0
+
+
+def test_shared_directory_is_not_used(tmp_path: Path) -> None:
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    directory = shared / "spill"
+
+    assert not SpillLog(directory, "test", max_bytes=1024).append("frame")
+
+    # Planted segments aren't replayed either
+    (directory / "test.00000000000000000001.seg").write_bytes(b"planted")
+    spill = SpillLog(directory, "test", max_bytes=1024)
+    assert spill.bytes == 0 and spill.sealed_segments() == []
+
+    # Sticky directories like /tmp are fine
+    shared.chmod(0o1777)
+    assert SpillLog(directory, "test", max_bytes=1024).append("frame")
@@ -0,0 +1,33 @@
+import gc
+import threading
+
+from src.shared.observability.metrics import MetricsStorage
+from src.shared.observability.system_usage import SystemUsageMonitoring
+
+KEYS = 5_000
+
+
+def test_gc_callback_does_not_deadlock_metrics() -> None:
+    monitor = SystemUsageMonitoring()
+    metrics = MetricsStorage("gc_probe")
+
+    def allocate() -> None:
+        # New keys allocate under the shard lock, collections fire inside it
+        for i in range(KEYS):
+            metrics.increment(f"k{i}")
+
+    threshold = gc.get_threshold()
+    gc.set_threshold(10)
+    gc.callbacks.append(monitor._on_gc)
+    try:
+        thread = threading.Thread(target=allocate, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+    finally:
+        gc.callbacks.remove(monitor._on_gc)
+        gc.set_threshold(*threshold)
+
+    assert monitor._gc_pauses
+    monitor._report_gc()
+    assert not monitor._gc_pauses
@@ -0,0 +1,300 @@
+import typing as tp
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+from opentelemetry.sdk.trace.sampling import Decision
+from opentelemetry.trace import Tracer, get_current_span, set_span_in_context
+from opentelemetry.trace.status import Status, StatusCode
+
+from src.shared.observability import schemas, traces
+from src.shared.observability.traces import (
+    BatchingSpanProcessor,
+    HeadSampler,
+    _recorded_arguments,
+    async_traced_function,
+    set_tracing_enabled,
+    traced_function,
+)
+
+# Lower 64 bits under half the range: kept at ratio 0.5
+SAMPLED = (0xABC << 64) | 1
+UNSAMPLED = (0xABC << 64) | (1 << 63) + 1
+SLOW_NS = 60 * 10**9
+START_NS = 10**18
+
+
+class _Rows:
+    """Stands in for the inserter, keeping the encoded rows."""
+
+    def __init__(self) -> None:
+        self.rows: list[tuple[tp.Any, ...]] = []
+
+    def insert_row(
+        self, schema: type[schemas.BaseStructure], row: tuple[tp.Any, ...]
+    ) -> None:
+        assert schema is schemas.Trace
+        self.rows.append(row)
+
+    def span_names(self) -> list[str]:
+        return [row[5] for row in self.rows]
+
+
+class _TraceIds(RandomIdGenerator):
+    def __init__(self) -> None:
+        self.next_trace_id = SAMPLED
+
+    def generate_trace_id(self) -> int:
+        return self.next_trace_id
+
+
+class _Tracing:
+    def __init__(self, ratio: float, max_pending_traces: int = 100) -> None:
+        self.ids = _TraceIds()
+        self.rows = _Rows()
+        self.processor = BatchingSpanProcessor(
+            self.rows,  # type: ignore[arg-type]
+            slow_ns=SLOW_NS,
+            max_pending_traces=max_pending_traces,
+        )
+        provider = TracerProvider(sampler=HeadSampler(ratio, {}), id_generator=self.ids)
+        provider.add_span_processor(self.processor)
+        self.tracer: Tracer = provider.get_tracer("test")
+
+
+def _decision(sampler: HeadSampler, name: str, trace_id: int) -> Decision:
+    return sampler.should_sample(None, trace_id, name).decision
+
+
+def test_ratio_is_deterministic() -> None:
+    sampler = HeadSampler(0.5, {})
+
+    for _ in range(3):
+        assert _decision(sampler, "root", SAMPLED) is Decision.RECORD_AND_SAMPLE
+        assert _decision(sampler, "root", UNSAMPLED) is Decision.RECORD_ONLY
+
+    assert _decision(HeadSampler(1.0, {}), "root", UNSAMPLED) is (
+        Decision.RECORD_AND_SAMPLE
+    )
+
+
+def test_longest_prefix_override_wins() -> None:
+    sampler = HeadSampler(0.0, {"api": 1.0, "api.health": 0.0, "api.health.deep": 0.5})
+
+    assert _decision(sampler, "worker", SAMPLED) is Decision.DROP
+    assert _decision(sampler, "api.users", UNSAMPLED) is Decision.RECORD_AND_SAMPLE
+    assert _decision(sampler, "api.health", SAMPLED) is Decision.DROP
+    assert _decision(sampler, "api.health.deep", SAMPLED) is (
+        Decision.RECORD_AND_SAMPLE
+    )
+    assert _decision(sampler, "api.health.deep", UNSAMPLED) is Decision.RECORD_ONLY
+
+
+def test_zero_ratio_drops_whole_trace() -> None:
+    tracing = _Tracing(0.0)
+
+    with tracing.tracer.start_as_current_span("root") as root:
+        with tracing.tracer.start_as_current_span("child") as child:
+            assert not root.is_recording()
+            assert not child.is_recording()
+
+    assert tracing.rows.rows == []
+    assert not tracing.processor._pending
+
+
+def test_children_follow_root_decision() -> None:
+    tracing = _Tracing(0.5)
+
+    for trace_id in (SAMPLED, UNSAMPLED):
+        tracing.ids.next_trace_id = trace_id
+        with tracing.tracer.start_as_current_span("root") as root:
+            with tracing.tracer.start_as_current_span("child") as child:
+                assert child.is_recording()
+                assert (
+                    child.get_span_context().trace_flags.sampled
+                    == root.get_span_context().trace_flags.sampled
+                    == (trace_id == SAMPLED)
+                )
+
+    # Fast and successful, the unsampled trace is not written
+    assert tracing.rows.span_names() == ["child", "root"]
+
+
+def test_unsampled_trace_kept_when_slow() -> None:
+    tracing = _Tracing(0.5)
+    tracing.ids.next_trace_id = UNSAMPLED
+
+    root = tracing.tracer.start_span("fast", start_time=START_NS)
+    root.end(end_time=START_NS + SLOW_NS - 1)
+    tracing.ids.next_trace_id = UNSAMPLED + 2
+    root = tracing.tracer.start_span("slow", start_time=START_NS)
+    root.end(end_time=START_NS + SLOW_NS)
+
+    assert tracing.rows.span_names() == ["slow"]
+
+
+def test_unsampled_trace_kept_on_error() -> None:
+    tracing = _Tracing(0.5)
+    tracing.ids.next_trace_id = UNSAMPLED
+
+    with tracing.tracer.start_as_current_span("root"):
+        with tracing.tracer.start_as_current_span("failing") as child:
+            child.set_status(Status(StatusCode.ERROR, "boom"))
+        with tracing.tracer.start_as_current_span("ok"):
+            pass
+
+    assert tracing.rows.span_names() == ["failing", "ok", "root"]
+    assert tracing.rows.rows[0][11:13] == ("ERROR", "boom")
+
+
+def test_late_spans_follow_trace_outcome() -> None:
+    tracing = _Tracing(0.5)
+
+    for trace_id in (SAMPLED, UNSAMPLED):
+        tracing.ids.next_trace_id = trace_id
+        with tracing.tracer.start_as_current_span("root"):
+            late = tracing.tracer.start_span("late")
+        late.end()
+
+    # The late child of the dropped trace is dropped as well
+    assert tracing.rows.span_names() == ["root", "late"]
+    assert not tracing.processor._pending
+
+
+def test_unended_roots_settle_on_head_decision() -> None:
+    tracing = _Tracing(0.5, max_pending_traces=2)
+    roots = []
+
+    for index, trace_id in enumerate((SAMPLED, UNSAMPLED, SAMPLED + 2)):
+        tracing.ids.next_trace_id = trace_id
+        root = tracing.tracer.start_span(f"root{index}")
+        with tracing.tracer.start_as_current_span(
+            f"child{index}", context=set_span_in_context(root)
+        ):
+            pass
+        roots.append(root)
+
+    # The oldest pending trace is written on its head decision
+    assert tracing.rows.span_names() == ["child0"]
+    assert list(tracing.processor._pending) == [UNSAMPLED, SAMPLED + 2]
+
+    # and its root, ending later, follows that decision
+    roots[0].end()
+    assert tracing.rows.span_names() == ["child0", "root0"]
+
+    tracing.processor.force_flush()
+    assert tracing.rows.span_names() == ["child0", "root0", "child2"]
+    assert not tracing.processor._pending
+
+
+def test_encode_matches_trace_schema() -> None:
+    tracing = _Tracing(1.0)
+
+    with tracing.tracer.start_as_current_span("root", attributes={"user_id": 7}):
+        with tracing.tracer.start_as_current_span("child") as child:
+            child.add_event("retry", {"attempt": 2})
+            child.set_status(Status(StatusCode.ERROR, "boom"))
+
+    (child_row, root_row) = tracing.rows.rows
+    fields = list(schemas.Trace.model_fields)
+    assert len(child_row) == len(fields)
+
+    trace = schemas.Trace(**dict(zip(fields, child_row, strict=True)))
+    context = child.get_span_context()
+    assert trace.trace_id == hex(context.trace_id)
+    assert trace.span_id == hex(context.span_id)
+    assert trace.parent_span_id == root_row[2]
+    assert trace.span_name == "child"
+    assert trace.status_code == "ERROR"
+    assert trace.status_message == "boom"
+    assert trace.events_names == ["retry"]
+    assert trace.events_attributes == [{"attempt": "2"}]
+    assert trace.duration >= 0
+
+    root = schemas.Trace(**dict(zip(fields, root_row, strict=True)))
+    assert root.parent_span_id == ""
+    assert root.span_attributes == {"user_id": "7"}
+
+
+class _Payload:
+    """A heavy argument, counting how often it gets serialized."""
+
+    reprs = 0
+
+    def __repr__(self) -> str:
+        _Payload.reprs += 1
+        return "<Payload>"
+
+
+class _Service:
+    def handle(
+        self,
+        user_id: int,
+        name: str | None,
+        kind: tp.Literal["a", "b"],
+        payload: _Payload,
+        *args: tp.Any,
+        page: int = 0,
+        **kwargs: tp.Any,
+    ) -> None:
+        pass
+
+
+@pytest.fixture
+def tracing(monkeypatch: pytest.MonkeyPatch) -> _Tracing:
+    tracing = _Tracing(0.5)
+    monkeypatch.setattr(traces, "tracer", tracing.tracer)
+    monkeypatch.setattr(traces._switch, "enabled", True)
+    _Payload.reprs = 0
+    return tracing
+
+
+def test_scalar_arguments_recorded_by_default() -> None:
+    assert _recorded_arguments(_Service.handle, None) == (
+        ("user_id", 1, None),
+        ("name", 2, None),
+        ("kind", 3, None),
+        ("page", -1, 0),
+    )
+
+
+def test_allow_listed_arguments_recorded() -> None:
+    assert _recorded_arguments(_Service.handle, ("payload", "page", "args")) == (
+        ("payload", 4, None),
+        ("page", -1, 0),
+    )
+
+
+def test_arguments_serialized_for_exported_spans(tracing: _Tracing) -> None:
+    @traced_function(record=("user_id", "payload", "page"), max_length=8)
+    def handle(user_id: int, payload: _Payload | str, page: int = 0) -> None:
+        pass
+
+    handle(1, _Payload(), page=2)
+    tracing.ids.next_trace_id = UNSAMPLED
+    handle(2, _Payload())
+    tracing.ids.next_trace_id = SAMPLED + 2
+    handle(3, "x" * 20)
+
+    attributes = [row[9] for row in tracing.rows.rows]
+    assert attributes == [
+        {"user_id": "1", "payload": "<Payload...", "page": "2"},
+        {"user_id": "3", "payload": "xxxxxxxx...", "page": "0"},
+    ]
+    # The dropped trace never serialized its arguments
+    assert _Payload.reprs == 1
+    assert traces._span_arguments == {}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_disabled_tracing_calls_through(tracing: _Tracing) -> None:
+    @async_traced_function
+    async def handle(user_id: int) -> bool:
+        return get_current_span().get_span_context().is_valid
+
+    assert await handle(1)
+    set_tracing_enabled(False)
+    assert not await handle(2)
+
+    assert tracing.rows.span_names() == [handle.__qualname__]
+    assert traces._span_arguments == {}